@@ -1,28 +1,94 @@
-
 from flask import Flask
 from flask_cors import CORS
 
+import database
+from config import config_by_name, DevelopmentConfig
 from routes.auth import auth_bp
 from routes.courses import courses_bp
 from routes.flashcards import flashcards_bp
 from routes.blogs import blogs_bp
 from routes.admin import admin_bp
 from routes.exams import exams_bp 
+from routes.search import search_bp
+from services.metrics import init_metrics
+from services.indexes import init_indexes
+from services.auth import init_auth
+from services.materials import materials_cli
+from services.stats import init_stats, stop_stats
+from services.question_jobs import init_question_jobs, question_jobs
+from services.analytics import analytics_cli
+from services.passwords import init_passwords, hasher
+from services.http_cache import init_http_cache
+from services.decks import flashcards_cli
+from services.search import search_cli
+from services.question_bank import questions_cli
+from services.announcements import announcements_cli
+from services.enrollments import enrollments_cli
+from services.user_cleanup import init_user_cleanup, stop_user_cleanup
+from services.exam_attempts import init_exam_attempts, stop_exam_attempts
+
+
+def create_app(config=None):
+    """
+    config: tên ('development' | 'production'), class cấu hình hoặc dict ghi đè.
+    Mặc định đọc APP_ENV, không có thì dùng DevelopmentConfig.
+    """
+    app = Flask(__name__)
+    if config is None or isinstance(config, str):
+        import os
+        config = config_by_name.get(config or os.getenv('APP_ENV', 'development'), DevelopmentConfig)
+    if isinstance(config, dict):
+        app.config.from_object(DevelopmentConfig)
+        app.config.update(config)
+    else:
+        app.config.from_object(config)
+
+    # Chỉ ghi nhận cấu hình, kết nối MongoDB được tạo khi process dùng tới lần đầu
+    database.configure(app.config)
+    # Đăng ký trước các hook khác để đo trọn request, và trước khi MongoClient được tạo
+    init_metrics(app)
+    CORS(app, resources={r"/*": {"origins": app.config['CORS_ORIGINS']}}, supports_credentials=True)
+
+    app.register_blueprint(auth_bp, url_prefix='/api/auth')
+    app.register_blueprint(courses_bp, url_prefix='/api/courses')
+    app.register_blueprint(flashcards_bp, url_prefix='/api/flashcards')
+    app.register_blueprint(blogs_bp, url_prefix='/api/blogs')
+    app.register_blueprint(admin_bp, url_prefix='/api/admin')
+    app.register_blueprint(exams_bp, url_prefix='/api/exams')
+    app.register_blueprint(search_bp, url_prefix='/api/search')
+
+    init_auth(app)
+    init_indexes(app)
+    app.cli.add_command(materials_cli)
+    init_stats(app)
+    init_question_jobs(app)
+    app.cli.add_command(analytics_cli)
+    init_passwords(app)
+    init_http_cache(app)
+    app.cli.add_command(flashcards_cli)
+    app.cli.add_command(search_cli)
+    app.cli.add_command(questions_cli)
+    app.cli.add_command(announcements_cli)
+    app.cli.add_command(enrollments_cli)
+    init_user_cleanup(app)
+    init_exam_attempts(app)
+
+    @app.route('/')
+    def home():
+        return "English Course Backend API is running!"
+
+    return app
 
-app = Flask(__name__)
-app.config['SECRET_KEY'] = 'chuoi-bi-mat-khong-duoc-tiet-lo-123456'
-CORS(app, resources={r"/*": {"origins": "http://localhost:5173"}}, supports_credentials=True)
 
-app.register_blueprint(auth_bp, url_prefix='/api/auth')
-app.register_blueprint(courses_bp, url_prefix='/api/courses')
-app.register_blueprint(flashcards_bp, url_prefix='/api/flashcards')
-app.register_blueprint(blogs_bp, url_prefix='/api/blogs')
-app.register_blueprint(admin_bp, url_prefix='/api/admin')
-app.register_blueprint(exams_bp, url_prefix='/api/exams')
+def shutdown_app(app):
+    """Dừng các thread nền và đóng pool kết nối MongoDB của process hiện tại"""
+    stop_stats(app)
+    stop_user_cleanup(app)
+    stop_exam_attempts(app)
+    question_jobs.shutdown()
+    hasher.shutdown()
+    database.close_db()
 
-@app.route('/')
-def home():
-    return "English Course Backend API is running!"
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5001)
\ No newline at end of file
+    create_app('development').run(debug=True, port=5001)
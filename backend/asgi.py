@@ -0,0 +1,29 @@
+# Entry point cho chế độ bất đồng bộ (ASGI):
+#   uvicorn asgi:app --workers 4
+#   WORKER_CLASS=uvicorn.workers.UvicornWorker gunicorn -c gunicorn.conf.py asgi:app
+# Các endpoint trong routes/async_api.py chạy trên event loop với AsyncMongoClient (một worker
+# giữ được hàng nghìn request đang chờ MongoDB); mọi endpoint khác do app Flask xử lý trên thread pool.
+import asyncio
+
+import database
+from app import create_app, shutdown_app
+from routes.async_api import courses_router, exams_router, auth_router, admin_router
+from services.aio import AsyncApp
+
+
+def create_asgi_app(config=None):
+    flask_app = create_app(config)
+
+    async def on_shutdown():
+        await database.close_async_db()
+        await asyncio.to_thread(shutdown_app, flask_app)
+
+    app = AsyncApp(flask_app, flask_app.config, on_shutdown)
+    app.register(courses_router, url_prefix='/api/courses')
+    app.register(exams_router, url_prefix='/api/exams')
+    app.register(auth_router, url_prefix='/api/auth')
+    app.register(admin_router, url_prefix='/api/admin')
+    return app
+
+
+app = create_asgi_app('production')
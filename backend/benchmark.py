@@ -0,0 +1,189 @@
+# --- FILE: backend/benchmark.py ---
+# Đo tải các endpoint chính trên dữ liệu sinh bởi generate_data.py.
+#   python benchmark.py --requests 200 --concurrency 8 --output bench.json
+#   python benchmark.py --base-url http://localhost:8000 ...     (đo server thật qua HTTP)
+#   python benchmark.py --baseline bench-old.json ...            (so sánh p95 với lần chạy trước)
+# Mặc định chạy trong process qua Flask test client (không tính chi phí mạng/WSGI server).
+# Kết quả là JSON: p50/p95/p99/mean/max (ms), throughput (req/s) và số lỗi của từng endpoint.
+# Lưu ý: exams.submit ghi thêm bản ghi vào results, nên chạy trên DB dữ liệu giả chứ không phải DB thật.
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import datetime
+import json
+import random
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+import database
+
+# (tên, method, path; {exam}/{course}/{deck} được thay bằng id ngẫu nhiên, cần đăng nhập?, body)
+SCENARIOS = [
+    ('courses.list', 'GET', '/api/courses', False, None),
+    ('courses.detail', 'GET', '/api/courses/{course}', True, None),
+    ('blogs.feed', 'GET', '/api/blogs?limit=20', False, None),
+    ('exams.list', 'GET', '/api/exams?limit=50', False, None),
+    ('exams.start', 'POST', '/api/exams/{exam}/start', True, {'password': '123'}),
+    ('exams.submit', 'POST', '/api/exams/{exam}/submit', True, {'answers': {'0': 0, '1': 1}, 'duration_taken': 600}),
+    ('exams.history', 'GET', '/api/exams/history', True, None),
+    ('flashcards.list', 'GET', '/api/flashcards', False, None),
+    ('flashcards.cards', 'GET', '/api/flashcards/{deck}/cards?limit=50', False, None),
+    ('flashcards.due', 'GET', '/api/flashcards/review/due?limit=20', True, None),
+    ('auth.me', 'GET', '/api/auth/me', True, None),
+    ('search', 'GET', '/api/search?q=ngu+phap', False, None),
+    ('admin.stats', 'GET', '/api/admin/stats', 'admin', None),
+]
+
+
+def percentile(sorted_values, p):
+    """Percentile theo nearest-rank trên danh sách đã sắp xếp"""
+    if not sorted_values: return None
+    rank = max(1, int(round(p / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class TestClientTransport:
+    def __init__(self):
+        from app import create_app
+        self.app = create_app({'STATS_RECONCILE_INTERVAL': 0})
+
+    def request(self, method, path, headers, body):
+        with self.app.test_client() as client:
+            response = client.open(path, method=method, headers=headers, json=body)
+            response.get_data()  # tiêu thụ hết response stream
+            return response.status_code, response.get_json(silent=True)
+
+
+class HttpTransport:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method, path, headers, body):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                     headers={**headers, 'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(req, timeout=30) as response:
+                payload = response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            payload, status = e.read(), e.code
+        try:
+            return status, json.loads(payload)
+        except ValueError:
+            return status, None
+
+
+def login(transport, username):
+    status, payload = transport.request('POST', '/api/auth/login', {}, {'username': username, 'password': '123'})
+    if status != 200: sys.exit(f'Không đăng nhập được {username} ({status}); chạy generate_data.py trước')
+    return {'Authorization': f"Bearer {payload['token']}"}
+
+
+def sample_ids(db, n=200):
+    """Lấy mẫu id có thật để các request không rơi vào 404"""
+    pick = lambda name, query=None: [str(d['_id']) for d in db[name].aggregate(
+        ([{'$match': query}] if query else []) + [{'$sample': {'size': n}}, {'$project': {'_id': 1}}])]
+    return {'course': pick('courses'), 'exam': pick('exams'), 'deck': pick('flashcards')}
+
+
+def run_scenario(transport, scenario, ids, auth, requests, concurrency, rng):
+    name, method, template, needs_auth, body = scenario
+    headers = auth.get(needs_auth) if needs_auth else {}
+
+    def one(_):
+        path = template.format(**{k: rng.choice(v) if v else 'none' for k, v in ids.items()})
+        start = time.perf_counter()
+        status, _ = transport.request(method, path, headers, body)
+        return (time.perf_counter() - start) * 1000, status
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - started
+    latencies = sorted(ms for ms, _ in samples)
+    errors = sum(1 for _, status in samples if status >= 400)
+    return {
+        'endpoint': name, 'method': method, 'path': template, 'requests': requests,
+        'errors': errors, 'throughput_rps': round(requests / wall, 2),
+        'p50_ms': round(percentile(latencies, 50), 3), 'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3), 'mean_ms': round(sum(latencies) / len(latencies), 3),
+        'max_ms': round(latencies[-1], 3),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    """Thêm p95_change_pct so với file kết quả cũ (âm = nhanh hơn)"""
+    with open(baseline_path, encoding='utf-8') as f:
+        old = {r['endpoint']: r for r in json.load(f)['results']}
+    for r in results:
+        prev = old.get(r['endpoint'])
+        if prev and prev.get('p95_ms'):
+            r['p95_change_pct'] = round((r['p95_ms'] - prev['p95_ms']) / prev['p95_ms'] * 100, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Đo p50/p95/p99 và throughput từng endpoint')
+    parser.add_argument('--requests', type=int, default=200, help='số request mỗi endpoint')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--warmup', type=int, default=10, help='số request làm nóng (không tính)')
+    parser.add_argument('--only', help='chỉ chạy các endpoint có tên chứa chuỗi này (phân cách bằng dấu phẩy)')
+    parser.add_argument('--base-url', help='đo server đang chạy thay vì Flask test client')
+    parser.add_argument('--user', default='user0')
+    parser.add_argument('--output', help='ghi JSON ra file (mặc định in ra stdout)')
+    parser.add_argument('--baseline', help='file JSON của lần chạy trước để so sánh')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    transport = HttpTransport(args.base_url) if args.base_url else TestClientTransport()
+    db = database.get_database()
+    ids = sample_ids(db)
+    auth = {True: login(transport, args.user), 'admin': login(transport, 'admin')}
+    scenarios = SCENARIOS
+    if args.only:
+        keys = args.only.split(',')
+        scenarios = [s for s in SCENARIOS if any(k in s[0] for k in keys)]
+
+    rng = random.Random(args.seed)
+    results = []
+    for scenario in scenarios:
+        if args.warmup:
+            run_scenario(transport, scenario, ids, auth, args.warmup, 1, rng)
+        result = run_scenario(transport, scenario, ids, auth, args.requests, args.concurrency, rng)
+        results.append(result)
+        print(f"{result['endpoint']:<20} p50={result['p50_ms']:>8}ms p95={result['p95_ms']:>8}ms "
+              f"p99={result['p99_ms']:>8}ms {result['throughput_rps']:>8} req/s lỗi={result['errors']}",
+              file=sys.stderr)
+    if args.baseline:
+        compare(results, args.baseline)
+
+    report = {
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'git_revision': git_revision(),
+        'transport': args.base_url or 'flask-test-client',
+        'requests': args.requests,
+        'concurrency': args.concurrency,
+        'dataset': {name: db[name].estimated_document_count()
+                    for name in ('users', 'courses', 'exams', 'results', 'flashcard_cards', 'blogs')},
+        'results': results,
+    }
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+from dotenv import load_dotenv
+import os
+
+load_dotenv()
+
+
+def _env_bool(name, default):
+    return os.getenv(name, str(default)).lower() in ('1', 'true', 'yes')
+
+
+class Config:
+    SECRET_KEY = os.getenv('SECRET_KEY', 'chuoi-bi-mat-khong-duoc-tiet-lo-123456')
+    CORS_ORIGINS = os.getenv('CORS_ORIGINS', 'http://localhost:5173').split(',')
+
+    # MongoDB (đọc bởi database.configure)
+    MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017/')
+    MONGO_DB_NAME = os.getenv('MONGO_DB_NAME', 'english_course_db')
+    MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', 100))
+    MONGO_MIN_POOL_SIZE = int(os.getenv('MONGO_MIN_POOL_SIZE', 0))
+    MONGO_CONNECT_TIMEOUT_MS = int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', 5000))
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000))
+    MONGO_SOCKET_TIMEOUT_MS = int(os.getenv('MONGO_SOCKET_TIMEOUT_MS', 30000))
+    # Lệnh MongoDB chậm hơn ngưỡng này (ms) được ghi log cảnh báo
+    MONGO_SLOW_QUERY_MS = int(os.getenv('MONGO_SLOW_QUERY_MS', 100))
+    # Token cho Prometheus scrape /api/admin/metrics (không có thì chỉ admin xem được)
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+    AUTO_CREATE_INDEXES = _env_bool('AUTO_CREATE_INDEXES', True)
+    STATS_RECONCILE_INTERVAL = int(os.getenv('STATS_RECONCILE_INTERVAL', 600))
+    # Chu kỳ (giây) worker nền nhận job dọn dữ liệu của tài khoản đã xóa, 0 để tắt
+    USER_CLEANUP_INTERVAL = int(os.getenv('USER_CLEANUP_INTERVAL', 30))
+    # Autosave bài thi: chu kỳ (giây) ghi buffer xuống MongoDB, 0 để ghi ngay từng lần lưu
+    AUTOSAVE_FLUSH_INTERVAL = float(os.getenv('AUTOSAVE_FLUSH_INTERVAL', 2))
+    # Chu kỳ (giây) nộp các bài thi quá giờ mà client không nộp, 0 để tắt (chạy `flask attempts expire`)
+    EXAM_EXPIRE_INTERVAL = int(os.getenv('EXAM_EXPIRE_INTERVAL', 60))
+    QUESTION_LLM = os.getenv('QUESTION_LLM')
+    QUESTION_WORKERS = int(os.getenv('QUESTION_WORKERS', 2))
+    QUESTION_MAX_PENDING = int(os.getenv('QUESTION_MAX_PENDING', 20))
+    # Job sinh câu hỏi chưa xong sau chừng này giây bị coi là gián đoạn (đánh dấu failed khi khởi động), 0 để tắt
+    QUESTION_JOB_TIMEOUT = int(os.getenv('QUESTION_JOB_TIMEOUT', 1800))
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', os.cpu_count() or 2))
+    PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', 64))
+    # Chế độ ASGI: số thread chạy các endpoint Flask chưa có bản async
+    ASGI_WSGI_THREADS = int(os.getenv('ASGI_WSGI_THREADS', 32))
+    # Body tối đa (byte) của request vào route async (đọc hết vào bộ nhớ trước khi chạy view), vượt thì 413
+    ASGI_MAX_BODY = int(os.getenv('ASGI_MAX_BODY', 32 * 1024 * 1024))
+
+
+class DevelopmentConfig(Config):
+    DEBUG = True
+
+
+class ProductionConfig(Config):
+    DEBUG = False
+    # Nhiều worker cùng tạo index lúc khởi động là thừa: chạy `flask indexes apply` khi deploy
+    AUTO_CREATE_INDEXES = _env_bool('AUTO_CREATE_INDEXES', False)
+
+
+config_by_name = {
+    'development': DevelopmentConfig,
+    'production': ProductionConfig,
+}
@@ -1,11 +1,134 @@
+from pymongo import MongoClient, AsyncMongoClient
+import os
+import threading
 
-from pymongo import MongoClient
+# Kết nối MongoDB được tạo "lười" (lần đầu dùng) và riêng cho từng process:
+# server pre-fork (gunicorn) fork worker sau khi import app, nếu dùng chung MongoClient
+# của process cha thì pool kết nối và thread nền của pymongo bị hỏng trong process con.
+# Cấu hình lấy từ biến môi trường, create_app() ghi đè bằng app.config qua configure().
+_settings = {
+    'MONGO_URI': os.getenv('MONGO_URI', 'mongodb://localhost:27017/'),
+    'MONGO_DB_NAME': os.getenv('MONGO_DB_NAME', 'english_course_db'),
+    'MONGO_MAX_POOL_SIZE': int(os.getenv('MONGO_MAX_POOL_SIZE', 100)),
+    'MONGO_MIN_POOL_SIZE': int(os.getenv('MONGO_MIN_POOL_SIZE', 0)),
+    'MONGO_CONNECT_TIMEOUT_MS': int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', 5000)),
+    'MONGO_SERVER_SELECTION_TIMEOUT_MS': int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000)),
+    'MONGO_SOCKET_TIMEOUT_MS': int(os.getenv('MONGO_SOCKET_TIMEOUT_MS', 30000)),
+}
+_client = None
+_client_pid = None
+_async_client = None
+_async_client_pid = None
+# pymongo chỉ nhận event listener lúc tạo client
+_listeners = []
+_lock = threading.Lock()
 
-# Kết nối đến MongoDB chạy ở localhost, cổng mặc định 27017
-# Tên database là 'english_course_db'
-client = MongoClient('mongodb://localhost:27017/')
-db = client['english_course_db']
+
+def configure(config):
+    """Nhận các khóa MONGO_* từ app.config; client hiện tại (nếu có) được đóng để dùng cấu hình mới"""
+    changed = False
+    for key in _settings:
+        if key in config and config[key] != _settings[key]:
+            _settings[key] = config[key]
+            changed = True
+    if changed:
+        close_db()
+
+
+def get_client():
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _lock:
+            if _client is None or _client_pid != pid:
+                # Client kế thừa từ process cha (sau fork) bị bỏ đi, không close vì nó thuộc process cha
+                _client = MongoClient(
+                    _settings['MONGO_URI'],
+                    maxPoolSize=_settings['MONGO_MAX_POOL_SIZE'],
+                    minPoolSize=_settings['MONGO_MIN_POOL_SIZE'],
+                    connectTimeoutMS=_settings['MONGO_CONNECT_TIMEOUT_MS'],
+                    serverSelectionTimeoutMS=_settings['MONGO_SERVER_SELECTION_TIMEOUT_MS'],
+                    socketTimeoutMS=_settings['MONGO_SOCKET_TIMEOUT_MS'],
+                    event_listeners=list(_listeners),
+                )
+                _client_pid = pid
+    return _client
+
+
+def get_async_client():
+    """AsyncMongoClient cho chế độ ASGI (asgi.py); gắn với event loop của process, tạo lần đầu khi dùng"""
+    global _async_client, _async_client_pid
+    pid = os.getpid()
+    if _async_client is None or _async_client_pid != pid:
+        _async_client = AsyncMongoClient(
+            _settings['MONGO_URI'],
+            maxPoolSize=_settings['MONGO_MAX_POOL_SIZE'],
+            minPoolSize=_settings['MONGO_MIN_POOL_SIZE'],
+            connectTimeoutMS=_settings['MONGO_CONNECT_TIMEOUT_MS'],
+            serverSelectionTimeoutMS=_settings['MONGO_SERVER_SELECTION_TIMEOUT_MS'],
+            socketTimeoutMS=_settings['MONGO_SOCKET_TIMEOUT_MS'],
+            event_listeners=list(_listeners),
+        )
+        _async_client_pid = pid
+    return _async_client
+
+
+async def close_async_db():
+    global _async_client, _async_client_pid
+    if _async_client is not None and _async_client_pid == os.getpid():
+        await _async_client.close()
+    _async_client = None
+    _async_client_pid = None
+
+
+def add_listener(listener):
+    """Đăng ký pymongo event listener; client hiện tại (nếu có) được đóng để tạo lại kèm listener"""
+    if listener in _listeners: return
+    _listeners.append(listener)
+    close_db()
+
+
+def get_database():
+    """Đối tượng Database thật của pymongo cho process hiện tại (cần cho GridFSBucket, ...)"""
+    return get_client()[_settings['MONGO_DB_NAME']]
+
+
+def close_db():
+    """Đóng pool kết nối của process hiện tại (gọi khi worker tắt)"""
+    global _client, _client_pid
+    with _lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
+
+
+class _LazyDatabase:
+    """Proxy của Database: các module giữ `db = get_db()` từ lúc import vẫn dùng được sau fork"""
+
+    def __getattr__(self, name):
+        return getattr(get_database(), name)
+
+    def __getitem__(self, name):
+        return get_database()[name]
+
+
+class _LazyAsyncDatabase:
+    """Như _LazyDatabase nhưng cho AsyncMongoClient (các hàm *_async trong services)"""
+
+    def __getattr__(self, name):
+        return getattr(get_async_client()[_settings['MONGO_DB_NAME']], name)
+
+    def __getitem__(self, name):
+        return get_async_client()[_settings['MONGO_DB_NAME']][name]
+
+
+db = _LazyDatabase()
+async_db = _LazyAsyncDatabase()
 
 def get_db():
     """Hàm helper để các file khác lấy kết nối database"""
-    return db
\ No newline at end of file
+    return db
+
+def get_async_db():
+    return async_db
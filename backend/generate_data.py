@@ -0,0 +1,225 @@
+# --- FILE: backend/generate_data.py ---
+# Sinh dữ liệu giả với quy mô tùy chọn để đo hiệu năng (seed_data.py chỉ có vài bản ghi demo).
+# Ví dụ quy mô "production":
+#   python generate_data.py --drop --users 100000 --exams 5000 --results 2000000 \
+#       --decks 200 --cards-per-deck 3000 --blogs 20000 --comments 10
+# Mọi tài khoản sinh ra có mật khẩu "123": admin, teacher0.., user0..
+# Dữ liệu được ghi theo lô bằng insert_many(ordered=False); index và dữ liệu tổng hợp
+# (stats, analytics, search) được dựng lại một lần ở cuối thay vì cập nhật từng bản ghi.
+from bson.objectid import ObjectId
+from werkzeug.security import generate_password_hash
+import argparse
+import datetime
+import random
+import time
+
+import database
+
+WORDS = ('grammar', 'vocabulary', 'listening', 'speaking', 'reading', 'writing', 'IELTS', 'TOEIC',
+         'ngữ pháp', 'từ vựng', 'luyện đề', 'giao tiếp', 'phát âm', 'công sở', 'du lịch', 'cơ bản',
+         'nâng cao', 'chiến thuật', 'bài tập', 'kinh nghiệm')
+LEVELS = ('Beginner', 'Intermediate', 'Advanced')
+COLLECTIONS = ('users', 'courses', 'enrollments', 'announcements', 'exams', 'questions', 'results', 'flashcards',
+               'flashcard_cards', 'blogs', 'attempt_counters', 'exam_analytics', 'exam_best', 'leaderboards', 'stats',
+               'search_index')
+
+
+def phrase(rng, n):
+    return ' '.join(rng.choice(WORDS) for _ in range(n))
+
+
+def random_time(rng, now, days):
+    return now - datetime.timedelta(seconds=rng.randint(0, days * 86400))
+
+
+def insert_batched(collection, docs, batch_size):
+    """Ghi một iterable document theo lô; trả về số bản ghi đã ghi"""
+    batch, total = [], 0
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            collection.insert_many(batch, ordered=False)
+            total += len(batch)
+            batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+        total += len(batch)
+    return total
+
+
+def generate(db, args):
+    rng = random.Random(args.seed)
+    now = datetime.datetime.now()
+    # Băm một lần: scrypt cho 100k tài khoản sẽ mất hàng giờ
+    password = generate_password_hash('123')
+    report = {}
+
+    def timed(name, docs):
+        start = time.perf_counter()
+        report[name] = insert_batched(db[name], docs, args.batch_size)
+        print(f'✅ {name}: {report[name]} bản ghi ({time.perf_counter() - start:.1f}s)')
+
+    admin_id = ObjectId()
+    teachers = [(ObjectId(), f'teacher{i}') for i in range(args.teachers)]
+    users = [(ObjectId(), f'user{i}') for i in range(args.users)]
+    course_ids = [ObjectId() for _ in range(args.courses)]
+
+    def user_docs():
+        yield {'_id': admin_id, 'username': 'admin', 'password': password, 'role': 'admin', 'created_at': now}
+        for oid, name in teachers:
+            yield {'_id': oid, 'username': name, 'password': password, 'role': 'teacher',
+                   'created_at': random_time(rng, now, 365)}
+        for oid, name in users:
+            yield {'_id': oid, 'username': name, 'password': password, 'role': 'user',
+                   'created_at': random_time(rng, now, 365)}
+    timed('users', user_docs())
+
+    # (course_id, user_id, username) mỗi học viên 0-3 khóa; enrollment_count tính sẵn cho courses
+    enrollments = [(course_id, oid, name) for oid, name in users
+                   for course_id in rng.sample(course_ids, min(len(course_ids), rng.randint(0, 3)))]
+    enrollment_counts = {}
+    for course_id, _, _ in enrollments:
+        enrollment_counts[course_id] = enrollment_counts.get(course_id, 0) + 1
+    course_teachers = {oid: rng.choice(teachers) for oid in course_ids}
+
+    def course_docs():
+        for oid, (teacher_id, teacher_name) in course_teachers.items():
+            yield {'_id': oid, 'title': phrase(rng, 4).capitalize(), 'description': phrase(rng, 25),
+                   'price': rng.randrange(1_000_000, 10_000_000, 100_000), 'schedule': 'Thứ 2 - 4 - 6 (19:00 - 21:00)',
+                   'level': rng.choice(LEVELS), 'instructor_id': str(teacher_id), 'instructor_name': teacher_name,
+                   'enrollment_count': enrollment_counts.get(oid, 0), 'materials': []}
+    timed('courses', course_docs())
+
+    def enrollment_docs():
+        for course_id, user_id, username in enrollments:
+            yield {'course_id': str(course_id), 'user_id': str(user_id), 'username': username,
+                   'enrolled_at': random_time(rng, now, 180)}
+    timed('enrollments', enrollment_docs())
+
+    def announcement_docs():
+        for oid, (teacher_id, teacher_name) in course_teachers.items():
+            for _ in range(rng.randint(0, args.announcements)):
+                yield {'course_id': str(oid), 'content': phrase(rng, 12), 'date': random_time(rng, now, 90),
+                       'sender': teacher_name, 'sender_id': str(teacher_id)}
+    timed('announcements', announcement_docs())
+
+    # exam id -> (title, creator_id, đáp án) để sinh kết quả thi khớp với đề
+    exams = []
+
+    # Câu hỏi nằm trong ngân hàng `questions`, đề chỉ giữ question_ids (xem services/question_bank.py)
+    exam_questions = []
+
+    def question_docs():
+        for i in range(args.exams):
+            teacher_id, teacher_name = rng.choice(teachers)
+            questions = [{'_id': ObjectId(), 'question': phrase(rng, 10) + '?',
+                          'options': [phrase(rng, 2) for _ in range(4)], 'correct_index': rng.randrange(4),
+                          'creator_id': str(teacher_id), 'created_at': now}
+                         for _ in range(rng.randint(args.min_questions, args.max_questions))]
+            exam_questions.append((teacher_id, teacher_name, questions))
+            yield from questions
+    timed('questions', question_docs())
+
+    def exam_docs():
+        for i, (teacher_id, teacher_name, questions) in enumerate(exam_questions):
+            oid = ObjectId()
+            title = f'Đề {i} - {phrase(rng, 3)}'
+            exams.append((oid, title, str(teacher_id), [q['correct_index'] for q in questions]))
+            yield {'_id': oid, 'title': title, 'description': phrase(rng, 15),
+                   'duration': rng.choice((15, 30, 45, 60, 90)),
+                   'question_ids': [str(q['_id']) for q in questions], 'question_count': len(questions),
+                   'password': '' if rng.random() > 0.1 else '123',
+                   'creator_id': str(teacher_id), 'creator_name': teacher_name}
+    timed('exams', exam_docs())
+
+    def result_docs():
+        if not exams or not users: return
+        for _ in range(args.results):
+            exam_id, title, creator_id, answer_key = rng.choice(exams)
+            user_id, username = rng.choice(users)
+            skill = rng.random()
+            question_correct = [rng.random() < 0.3 + 0.6 * skill for _ in answer_key]
+            yield {'user_id': str(user_id), 'username': username, 'exam_id': str(exam_id), 'exam_title': title,
+                   'creator_id': creator_id, 'score': sum(question_correct), 'total_questions': len(answer_key),
+                   'duration_taken': rng.randint(60, 5400), 'attempt_number': 1,
+                   'question_correct': question_correct, 'timestamp': random_time(rng, now, 180)}
+    timed('results', result_docs())
+
+    deck_ids = [ObjectId() for _ in range(args.decks)]
+
+    def deck_docs():
+        for i, oid in enumerate(deck_ids):
+            yield {'_id': oid, 'title': f'Bộ thẻ {i} - {phrase(rng, 2)}', 'card_count': args.cards_per_deck}
+    timed('flashcards', deck_docs())
+
+    def card_docs():
+        for oid in deck_ids:
+            for position in range(1, args.cards_per_deck + 1):
+                yield {'deck_id': str(oid), 'position': position, 'front': phrase(rng, 1),
+                       'back': phrase(rng, 2), 'example': phrase(rng, 8)}
+    timed('flashcard_cards', card_docs())
+
+    def blog_docs():
+        authors = teachers + users[:1000]
+        if not authors: return
+        for _ in range(args.blogs):
+            author_id, author = rng.choice(authors)
+            created_at = random_time(rng, now, 365)
+            comments = []
+            for _ in range(rng.randint(0, args.comments)):
+                commenter_id, commenter = rng.choice(authors)
+                comments.append({'user_id': str(commenter_id), 'author': commenter, 'content': phrase(rng, 12),
+                                 'created_at': created_at + datetime.timedelta(minutes=rng.randint(1, 10000))})
+            yield {'title': phrase(rng, 6).capitalize(), 'content': phrase(rng, 150), 'author': author,
+                   'author_id': str(author_id), 'created_at': created_at, 'likes': rng.randint(0, 500),
+                   'comments': comments}
+    timed('blogs', blog_docs())
+    return report
+
+
+def rebuild_derived():
+    """Index và dữ liệu tổng hợp, chạy sau khi nạp xong (nhanh hơn cập nhật theo từng bản ghi)"""
+    from services.indexes import apply_indexes
+    from services.stats import reconcile
+    from services.analytics import rebuild
+    from services.search import reindex
+    for name, step in (('indexes', apply_indexes), ('stats', reconcile), ('analytics', rebuild), ('search', reindex)):
+        start = time.perf_counter()
+        step()
+        print(f'✅ {name} ({time.perf_counter() - start:.1f}s)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sinh dữ liệu giả quy mô lớn')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--teachers', type=int, default=50)
+    parser.add_argument('--courses', type=int, default=200)
+    parser.add_argument('--announcements', type=int, default=5, help='tối đa mỗi khóa học')
+    parser.add_argument('--exams', type=int, default=100)
+    parser.add_argument('--min-questions', type=int, default=10)
+    parser.add_argument('--max-questions', type=int, default=60)
+    parser.add_argument('--results', type=int, default=20000)
+    parser.add_argument('--decks', type=int, default=20)
+    parser.add_argument('--cards-per-deck', type=int, default=500)
+    parser.add_argument('--blogs', type=int, default=1000)
+    parser.add_argument('--comments', type=int, default=10, help='tối đa mỗi bài viết')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--drop', action='store_true', help='xóa dữ liệu cũ trước khi sinh')
+    parser.add_argument('--skip-derived', action='store_true', help='không dựng index/stats/analytics/search')
+    args = parser.parse_args()
+    if args.teachers < 1: parser.error('--teachers phải >= 1')
+
+    db = database.get_database()
+    if args.drop:
+        for name in COLLECTIONS:
+            db[name].drop()
+    start = time.perf_counter()
+    generate(db, args)
+    if not args.skip_derived:
+        rebuild_derived()
+    print(f'\n🎉 Xong sau {time.perf_counter() - start:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
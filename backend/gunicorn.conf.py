@@ -0,0 +1,25 @@
+# Cấu hình gunicorn: nhiều worker process (pre-fork), mỗi worker nhiều thread.
+# Các giá trị đọc từ biến môi trường để chỉnh khi deploy mà không sửa code.
+import multiprocessing
+import os
+
+bind = os.getenv('BIND', '0.0.0.0:5001')
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+# Chế độ ASGI (asgi:app): WORKER_CLASS=uvicorn.workers.UvicornWorker
+worker_class = os.getenv('WORKER_CLASS', 'gthread')
+threads = int(os.getenv('WEB_THREADS', 8))
+timeout = int(os.getenv('WEB_TIMEOUT', 60))
+graceful_timeout = int(os.getenv('WEB_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+# Không preload: app (và MongoClient) được tạo trong từng worker sau khi fork
+preload_app = False
+accesslog = '-'
+
+
+def worker_exit(server, worker):
+    # Worker tắt (SIGTERM / reload): dừng thread nền, đóng pool kết nối MongoDB.
+    # Worker ASGI tự dọn dẹp qua sự kiện lifespan.shutdown của asgi.py
+    if 'uvicorn' in server.cfg.worker_class_str: return
+    from wsgi import app
+    from app import shutdown_app
+    shutdown_app(app)
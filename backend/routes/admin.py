@@ -1,44 +1,98 @@
 # --- FILE: backend/routes/admin.py ---
-from flask import Blueprint, jsonify, request, current_app
+from flask import Blueprint, jsonify, request, current_app, Response
 from database import get_db
+from services.stats import bump as bump_stats, get_counts, get_growth
+from services.auth import get_current_user, invalidate_user
+from services.passwords import hasher
+from services.metrics import render_metrics
+from services.user_cleanup import enqueue as enqueue_cleanup, get_status as get_cleanup_status
+from services.pagination import (
+    parse_limit, stream_json_list, stream_json_page, keyset_filter, encode_keyset_cursor, CursorError, DEFAULT_PAGE_SIZE
+)
 from bson.objectid import ObjectId
-from werkzeug.security import generate_password_hash
+from pymongo.errors import DuplicateKeyError, BulkWriteError
 import datetime
-import jwt
+import hmac
+import re
 
 admin_bp = Blueprint('admin', __name__)
 db = get_db()
 
 def is_admin():
-    token = None
-    if 'Authorization' in request.headers:
-        token = request.headers['Authorization'].split(" ")[1]
-    if not token: return False
-    try:
-        payload = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
-        user = db.users.find_one({'_id': ObjectId(payload['user_id'])})
-        return user and user.get('role') == 'admin'
-    except:
-        return False
+    user = get_current_user()
+    return bool(user) and user.get('role') == 'admin'
 
 @admin_bp.route('/stats', methods=['GET'])
 def get_stats():
     if not is_admin(): return jsonify({'message': 'Unauthorized'}), 403
-    stats = {
-        'users': db.users.count_documents({}),
-        'courses': db.courses.count_documents({}),
-        'flashcards': db.flashcards.count_documents({}),
-        'blogs': db.blogs.count_documents({}),
-        'exams': db.exams.count_documents({}) # [MỚI] Đếm số đề thi
-    }
+    # ?mode=materialized (mặc định) | estimated | exact, ?days=: số ngày của chuỗi tăng trưởng
+    mode = request.args.get('mode', 'materialized')
+    days = min(max(request.args.get('days', 30, type=int), 1), 365)
+    stats = get_counts(mode)
+    stats['growth'] = get_growth(days)
     return jsonify(stats), 200
 
+# Định dạng text của Prometheus. Prometheus gửi `Authorization: Bearer <METRICS_TOKEN>`,
+# admin đăng nhập trên web cũng xem được.
+@admin_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    token = current_app.config.get('METRICS_TOKEN')
+    bearer = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    if not (token and hmac.compare_digest(bearer, token)) and not is_admin():
+        return jsonify({'message': 'Unauthorized'}), 403
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+ROLES = ['user', 'teacher', 'admin']
+USER_SORTS = {'created_at': True, 'username': False}  # trường sort -> mặc định giảm dần?
+MAX_BULK_USERS = 1000
+
+def serialize_user(u):
+    u['_id'] = str(u['_id'])
+    return u
+
+def parse_date(value):
+    if not value: return None
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        raise CursorError(f'Ngày không hợp lệ: {value}')
+
+def user_filter(args):
+    """?role=, ?q= (tiền tố username), ?created_from= / ?created_to= (ISO)"""
+    query = {}
+    if args.get('role'): query['role'] = args['role']
+    if args.get('q'): query['username'] = {'$regex': '^' + re.escape(args['q'])}
+    created = {k: v for k, v in (('$gte', parse_date(args.get('created_from'))),
+                                 ('$lt', parse_date(args.get('created_to')))) if v}
+    if created: query['created_at'] = created
+    return query
+
+# Có ?limit= / ?cursor= / bộ lọc thì trả về một trang {items, next_cursor} theo keyset (sort, _id);
+# không có thì giữ định dạng mảng cũ (stream, không gom vào RAM)
 @admin_bp.route('/users', methods=['GET'])
 def get_all_users():
     if not is_admin(): return jsonify({'message': 'Unauthorized'}), 403
-    users = list(db.users.find({}, {'password': 0}))
-    for u in users: u['_id'] = str(u['_id'])
-    return jsonify(users), 200
+    args = request.args
+    sort = args.get('sort', 'created_at')
+    if sort not in USER_SORTS: return jsonify({'message': 'sort phải là created_at hoặc username'}), 400
+    descending = args.get('order', 'desc' if USER_SORTS[sort] else 'asc') == 'desc'
+    try:
+        query = user_filter(args)
+        after = keyset_filter(args.get('cursor'), sort, descending)
+    except CursorError as e:
+        return jsonify({'message': str(e)}), 400
+    if after: query = {'$and': [query, after]} if query else after
+
+    direction = -1 if descending else 1
+    # username là unique nên không cần _id để phân định thứ tự (dùng thẳng index username / role_username)
+    order = [(sort, direction)] + ([] if sort == 'username' else [('_id', direction)])
+    cursor = db.users.find(query, {'password': 0}).sort(order)
+    limit = parse_limit()
+    if limit is None and not args.get('cursor') and not query:
+        return stream_json_list(cursor, serialize_user)
+    limit = limit or DEFAULT_PAGE_SIZE
+    return stream_json_page(cursor.limit(limit + 1), limit, serialize_user,
+                            lambda u: encode_keyset_cursor(u.get(sort), u['_id']))
 
 @admin_bp.route('/users', methods=['POST'])
 def create_user():
@@ -57,16 +111,105 @@ def create_user():
 
     new_user = {
         'username': username,
-        'password': generate_password_hash(password),
+        'password': hasher.hash(password),
         'role': role,
-        'created_at': datetime.datetime.now(),
-        'enrolled_courses': []
+        'created_at': datetime.datetime.now()
     }
-    db.users.insert_one(new_user)
+    try:
+        db.users.insert_one(new_user)
+    except DuplicateKeyError:
+        # Hai request đăng ký cùng lúc: unique index trên username chặn bản ghi thứ hai
+        return jsonify({'message': 'User đã tồn tại'}), 400
+    bump_stats('users')
     return jsonify({'message': 'Tạo user thành công'}), 201
 
+# Tạo nhiều tài khoản: {users: [{username, password, role}]}, băm song song rồi ghi một insert_many
+@admin_bp.route('/users/bulk', methods=['POST'])
+def bulk_create_users():
+    if not is_admin(): return jsonify({'message': 'Unauthorized'}), 403
+    data = request.get_json(silent=True)
+    items = data.get('users') if isinstance(data, dict) else None
+    if not isinstance(items, list): return jsonify({'message': 'Thiếu danh sách tài khoản'}), 400
+    if len(items) > MAX_BULK_USERS: return jsonify({'message': f'Tối đa {MAX_BULK_USERS} tài khoản mỗi lần'}), 400
+
+    errors, valid, seen = [], [], set()
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append({'index': i, 'error': 'Dữ liệu không hợp lệ'})
+            continue
+        username, password, role = item.get('username'), item.get('password'), item.get('role', 'user')
+        if not username or not password: errors.append({'index': i, 'error': 'Thiếu thông tin'})
+        elif not isinstance(username, str) or not isinstance(password, str):
+            errors.append({'index': i, 'error': 'Username và mật khẩu phải là chuỗi'})
+        elif role not in ROLES: errors.append({'index': i, 'error': 'Role không hợp lệ'})
+        elif username in seen: errors.append({'index': i, 'error': 'Trùng username trong danh sách'})
+        else:
+            seen.add(username)
+            valid.append((i, username, password, role))
+    existing = {u['username'] for u in db.users.find({'username': {'$in': list(seen)}}, {'username': 1})}
+    for i, username, _, _ in valid:
+        if username in existing: errors.append({'index': i, 'error': 'User đã tồn tại'})
+    valid = [v for v in valid if v[1] not in existing]
+
+    now = datetime.datetime.now()
+    hashes = hasher.map_hash([password for _, _, password, _ in valid])
+    docs = [{'username': username, 'password': h, 'role': role, 'created_at': now}
+            for (_, username, _, role), h in zip(valid, hashes)]
+    created = 0
+    if docs:
+        try:
+            created = len(db.users.insert_many(docs, ordered=False).inserted_ids)
+        except BulkWriteError as e:
+            # Tạo trùng đồng thời: unique index chặn các bản ghi đó
+            created = e.details.get('nInserted', 0)
+            for write_error in e.details.get('writeErrors', []):
+                errors.append({'index': valid[write_error['index']][0], 'error': 'User đã tồn tại'})
+    bump_stats('users', created)
+    errors.sort(key=lambda e: e['index'])
+    return jsonify({'message': f'Đã tạo {created} tài khoản', 'created': created, 'errors': errors}), \
+        201 if created else 400
+
+def delete_users(object_ids):
+    """Xóa tài khoản ngay, dữ liệu phụ thuộc (kết quả thi, bài viết, tài liệu...) được dọn nền"""
+    users = list(db.users.find({'_id': {'$in': object_ids}}, {'username': 1}))
+    if not users: return 0
+    deleted = db.users.delete_many({'_id': {'$in': [u['_id'] for u in users]}}).deleted_count
+    bump_stats('users', -deleted)
+    invalidate_user(*[u['_id'] for u in users])
+    enqueue_cleanup([(u['_id'], u.get('username')) for u in users])
+    return deleted
+
 @admin_bp.route('/users/<user_id>', methods=['DELETE'])
 def delete_user(user_id):
     if not is_admin(): return jsonify({'message': 'Unauthorized'}), 403
-    db.users.delete_one({'_id': ObjectId(user_id)})
-    return jsonify({'message': 'Đã xóa người dùng'}), 200
\ No newline at end of file
+    if str(get_current_user()['_id']) == user_id: return jsonify({'message': 'Không thể tự xóa tài khoản của mình'}), 400
+    delete_users([ObjectId(user_id)])
+    return jsonify({'message': 'Đã xóa người dùng'}), 200
+
+# {ids: [...]}: tối đa MAX_BULK_USERS mỗi lần
+@admin_bp.route('/users/bulk-delete', methods=['POST'])
+def bulk_delete_users():
+    if not is_admin(): return jsonify({'message': 'Unauthorized'}), 403
+    ids = (request.json or {}).get('ids') or []
+    if len(ids) > MAX_BULK_USERS: return jsonify({'message': f'Tối đa {MAX_BULK_USERS} tài khoản mỗi lần'}), 400
+    if not all(ObjectId.is_valid(i) for i in ids): return jsonify({'message': 'Id không hợp lệ'}), 400
+    me = str(get_current_user()['_id'])
+    deleted = delete_users([ObjectId(i) for i in set(ids) if i != me])
+    return jsonify({'message': f'Đã xóa {deleted} người dùng', 'deleted': deleted}), 202
+
+# Tiến độ dọn dữ liệu của các tài khoản đã xóa
+@admin_bp.route('/users/cleanup', methods=['GET'])
+def get_user_cleanup():
+    if not is_admin(): return jsonify({'message': 'Unauthorized'}), 403
+    return jsonify(get_cleanup_status()), 200
+
+@admin_bp.route('/users/<user_id>/role', methods=['PUT'])
+def update_user_role(user_id):
+    if not is_admin(): return jsonify({'message': 'Unauthorized'}), 403
+    role = (request.json or {}).get('role')
+    if role not in ROLES:
+        return jsonify({'message': 'Role không hợp lệ'}), 400
+    result = db.users.update_one({'_id': ObjectId(user_id)}, {'$set': {'role': role}})
+    if result.matched_count == 0: return jsonify({'message': 'User không tồn tại'}), 404
+    invalidate_user(user_id)
+    return jsonify({'message': 'Đã cập nhật quyền'}), 200
\ No newline at end of file
@@ -0,0 +1,206 @@
+# --- FILE: backend/routes/async_api.py ---
+# Bản async (AsyncMongoClient) của các endpoint đọc nhiều / đông người dùng cùng lúc, dùng bởi asgi.py.
+# Kết quả trả về giống hệt bản Flask tương ứng; các endpoint khác vẫn do Flask xử lý.
+from bson.objectid import ObjectId
+import asyncio
+import re
+
+from database import get_async_db
+from services.aio import AsyncRouter, jsonify
+from services.auth import load_user_async
+from services.http_cache import conditional_get_async
+from services.stats import get_counts_async, get_growth_async
+from services.course_cards import get_course_cards_async
+from services.question_jobs import question_jobs
+from services.question_bank import get_student_exam_async, page_questions
+from services.pagination import (
+    parse_limit, parse_object_id, stream_json_list_async, stream_json_page_async, CursorError, DEFAULT_PAGE_SIZE
+)
+from services.announcements import latest_async as latest_announcements_async, migrate_course as migrate_announcements
+from services.enrollments import is_enrolled_async, enrolled_course_ids_async
+from services.leaderboard import get_leaderboard_async, MAX_TOP
+from services.exam_attempts import (
+    open_attempt, serialize_attempt, submit_attempt, clean_answers, clean_duration, AttemptError
+)
+from routes.courses import serialize_doc, can_manage
+from routes.auth import serialize_course
+from routes.exams import EXAM_SUMMARY_PROJECTION, serialize_exam_summary, serialize_job
+
+adb = get_async_db()
+
+courses_router = AsyncRouter('courses')
+exams_router = AsyncRouter('exams')
+auth_router = AsyncRouter('auth')
+admin_router = AsyncRouter('admin')
+
+
+async def current_user(req):
+    """Như services.auth.get_current_user: tra tối đa một lần mỗi request"""
+    if not hasattr(req, 'current_user'):
+        payload = req.user_payload
+        req.current_user = await load_user_async(payload['user_id']) if payload else None
+    return req.current_user
+
+
+# --- COURSES ---
+@courses_router.route('')
+@conditional_get_async('courses')
+async def get_courses(req):
+    cursor = adb.courses.find({}, {'announcements': 0, 'materials': 0})
+    return jsonify([serialize_doc(c) async for c in cursor]), 200
+
+@courses_router.route('/<oid:course_id>')
+async def get_course_detail(req, course_id):
+    # Khóa học và user không phụ thuộc nhau -> tra song song
+    course, user = await asyncio.gather(adb.courses.find_one({'_id': ObjectId(course_id)}), current_user(req))
+    if not course: return jsonify({'message': 'Khóa học không tồn tại'}), 404
+    if 'announcements' in course: await asyncio.to_thread(migrate_announcements, course)
+    course.pop('announcements', None)
+    is_authorized = bool(user) and (can_manage(course, user) or await is_enrolled_async(user, course['_id']))
+    if not is_authorized:
+        course.pop('materials', None)
+    else:
+        course['announcements'], course['announcements_cursor'] = await latest_announcements_async(course_id)
+    return jsonify({'course': serialize_doc(course), 'access': is_authorized}), 200
+
+
+# --- EXAMS ---
+@exams_router.route('')
+@conditional_get_async('exams')
+async def get_exams(req):
+    query = {}
+    if req.args.get('creator'):
+        query['creator_id'] = req.args['creator']
+    if req.args.get('title'):
+        query['title'] = {'$regex': '^' + re.escape(req.args['title'])}
+    try:
+        after = parse_object_id(req.args.get('after'))
+    except CursorError as e:
+        return jsonify({'message': str(e)}), 400
+    if after:
+        query['_id'] = {'$gt': after}
+
+    limit = parse_limit(args=req.args)
+    cursor = adb.exams.find(query, EXAM_SUMMARY_PROJECTION).sort('_id', 1)
+    if limit is None and after is None:
+        return stream_json_list_async(cursor, serialize_exam_summary)
+    limit = limit or DEFAULT_PAGE_SIZE
+    return stream_json_page_async(cursor.limit(limit + 1), limit, serialize_exam_summary, lambda e: str(e['_id']))
+
+async def open_exam(req, exam_id):
+    data = req.get_json(silent=True) or {}
+    exam = await get_student_exam_async(exam_id)
+    if not exam: return None, (jsonify({'message': 'Đề thi không tồn tại'}), 404)
+    if exam['password'] and str(exam['password']) != str(data.get('password', '')):
+        return None, (jsonify({'message': 'Mật khẩu đề thi không đúng'}), 403)
+    return exam['payload'], None
+
+@exams_router.route('/<oid:exam_id>/start', methods=['POST'])
+async def start_exam(req, exam_id):
+    payload, error = await open_exam(req, exam_id)
+    if error: return error
+    page = page_questions(payload, req.args.get('offset', 0, type=int), parse_limit(args=req.args))
+    user_payload = req.user_payload
+    if user_payload:
+        # Mở/làm tiếp lượt thi dùng chung logic (và buffer autosave trong process) với bản Flask
+        attempt = await asyncio.to_thread(open_attempt, exam_id, user_payload['user_id'],
+                                          user_payload.get('username'), payload['duration'])
+        page = {**page, 'attempt': serialize_attempt(attempt)}
+    return jsonify(page), 200
+
+@exams_router.route('/<oid:exam_id>/questions', methods=['POST'])
+async def get_exam_questions(req, exam_id):
+    payload, error = await open_exam(req, exam_id)
+    if error: return error
+    page = page_questions(payload, req.args.get('offset', 0, type=int), parse_limit(args=req.args) or DEFAULT_PAGE_SIZE)
+    return jsonify({k: page[k] for k in ('questions', 'offset', 'next_offset', 'question_count')}), 200
+
+@exams_router.route('/<oid:exam_id>/submit', methods=['POST'])
+async def submit_exam(req, exam_id):
+    user_payload = req.user_payload
+    if not user_payload: return jsonify({'message': 'Unauthorized'}), 401
+    data = req.get_json(silent=True)
+    if not isinstance(data, dict): return jsonify({'message': 'Thiếu dữ liệu bài nộp'}), 400
+    student_exam = await get_student_exam_async(exam_id)
+    if not student_exam: return jsonify({'message': 'Lỗi đề thi'}), 404
+    try:
+        user_answers = clean_answers(student_exam['payload'], data.get('answers'), required=False)
+        duration_taken = clean_duration(data.get('duration_taken'))
+    except AttemptError as e:
+        return jsonify({'message': str(e)}), 400
+    # Claim, chấm và ghi kết quả dùng chung với bản Flask (cùng buffer autosave trong process)
+    submitted = await asyncio.to_thread(submit_attempt, exam_id, user_payload['user_id'], user_payload.get('username'),
+                                        user_answers, duration_taken)
+    if not submitted: return jsonify({'message': 'Lỗi đề thi'}), 404
+    message, summary = submitted
+    if not summary: return jsonify({'message': message}), 409
+    return jsonify({'message': message, **summary}), 200
+
+@exams_router.route('/<oid:exam_id>/leaderboard')
+async def get_exam_leaderboard(req, exam_id):
+    user_payload = req.user_payload
+    if not user_payload: return jsonify({'message': 'Unauthorized'}), 401
+    limit = min(max(req.args.get('limit', 10, type=int), 1), MAX_TOP)
+    return jsonify(await get_leaderboard_async(exam_id, user_payload['user_id'], limit)), 200
+
+@exams_router.route('/generate-questions', methods=['POST'])
+async def generate_questions_from_pdf(req):
+    user_payload = req.user_payload
+    if not user_payload: return jsonify({'message': 'Unauthorized'}), 401
+    if 'file' not in req.files:
+        return jsonify({'message': 'Không có file PDF'}), 400
+    file = req.files['file']
+    if file.filename == '': return jsonify({'message': 'Chưa chọn file'}), 400
+
+    # Gọi Gemini đã chạy trên thread pool của question_jobs; submit chỉ tra cache và ghi job
+    job = await asyncio.to_thread(question_jobs.submit, file.read(), user_payload['user_id'])
+    if not job:
+        return jsonify({'message': 'Hệ thống AI đang bận, vui lòng thử lại sau'}), 503
+    return jsonify(serialize_job(job)), 200 if job['status'] == 'done' else 202
+
+@exams_router.route('/generate-questions/<job_id>')
+async def get_question_job(req, job_id):
+    user_payload = req.user_payload
+    if not user_payload: return jsonify({'message': 'Unauthorized'}), 401
+    job = await adb.question_jobs.find_one({'_id': job_id})
+    if not job or job['user_id'] != user_payload['user_id']:
+        return jsonify({'message': 'Job không tồn tại'}), 404
+    return jsonify(serialize_job(job)), 200
+
+
+# --- AUTH ---
+@auth_router.route('/me')
+async def get_current_user(req):
+    if not req.user_payload:
+        return jsonify({'message': 'Thiếu token'}), 401
+    user = await current_user(req)
+    if not user:
+        return jsonify({'message': 'User không tồn tại'}), 401
+
+    enrolled_ids = await enrolled_course_ids_async(user)
+    if 'courses' in req.args.get('expand', '').split(','):
+        course_object_ids = [ObjectId(cid) for cid in enrolled_ids if ObjectId.is_valid(cid)]
+        enrolled_details = [serialize_course(c) async for c in adb.courses.find({'_id': {'$in': course_object_ids}})]
+    else:
+        enrolled_details = await get_course_cards_async(enrolled_ids)
+    return jsonify({
+        'user': {
+            'id': str(user['_id']),
+            'username': user['username'],
+            'role': user['role'],
+            'enrolled_courses_details': enrolled_details
+        }
+    }), 200
+
+
+# --- ADMIN ---
+@admin_router.route('/stats')
+async def get_stats(req):
+    user = await current_user(req)
+    if not user or user.get('role') != 'admin': return jsonify({'message': 'Unauthorized'}), 403
+    mode = req.args.get('mode', 'materialized')
+    days = min(max(req.args.get('days', 30, type=int), 1), 365)
+    # Các bộ đếm và chuỗi tăng trưởng độc lập nhau -> chạy song song
+    stats, growth = await asyncio.gather(get_counts_async(mode), get_growth_async(days))
+    stats['growth'] = growth
+    return jsonify(stats), 200
@@ -1,10 +1,15 @@
 # --- FILE: auth.py ---
 from flask import Blueprint, request, jsonify, current_app
 from database import get_db
+from services.stats import bump as bump_stats
+from services.course_cards import get_course_cards
+from services.enrollments import enrolled_course_ids
+from services.passwords import hasher, HashingBusy
+from services.auth import get_user_from_token, get_current_user as current_user_from_token, invalidate_user
 import datetime
 import jwt
-from werkzeug.security import generate_password_hash, check_password_hash
 from bson.objectid import ObjectId
+from pymongo.errors import DuplicateKeyError
 
 auth_bp = Blueprint('auth', __name__)
 db = get_db()
@@ -26,16 +31,20 @@ def register():
     if db.users.find_one({'username': username}):
         return jsonify({'message': 'Tên đăng nhập đã tồn tại'}), 400
     
-    hashed_password = generate_password_hash(password)
+    hashed_password = hasher.hash(password)
 
     new_user = {
         'username': username,
         'password': hashed_password,
         'role': 'user',
-        'created_at': datetime.datetime.now(),
-        'enrolled_courses': []
+        'created_at': datetime.datetime.now()
     }
-    db.users.insert_one(new_user)
+    try:
+        db.users.insert_one(new_user)
+    except DuplicateKeyError:
+        # Hai request đăng ký cùng lúc: unique index trên username chặn bản ghi thứ hai
+        return jsonify({'message': 'Tên đăng nhập đã tồn tại'}), 400
+    bump_stats('users')
     return jsonify({'message': 'Đăng ký thành công'}), 201
 
 @auth_bp.route('/login', methods=['POST'])
@@ -49,26 +58,7 @@ def login():
     if not user:
         return jsonify({'message': 'Sai tài khoản hoặc mật khẩu'}), 401
 
-    stored_password = user['password']
-    is_valid = False
-    needs_rehash = False
-
-    try:
-        if check_password_hash(stored_password, password):
-            is_valid = True
-    except:
-        is_valid = False
-
-    if not is_valid:
-        if stored_password == password:
-            is_valid = True
-            needs_rehash = True 
-    
-    if is_valid:
-        if needs_rehash:
-            new_hash = generate_password_hash(password)
-            db.users.update_one({'_id': user['_id']}, {'$set': {'password': new_hash}})
-
+    if hasher.verify(user['password'], password):
         token_payload = {
             'user_id': str(user['_id']),
             'username': user['username'], # [FIX] Thêm username vào Token
@@ -90,15 +80,11 @@ def login():
 
 @auth_bp.route('/change-password', methods=['POST'])
 def change_password():
-    token = None
-    if 'Authorization' in request.headers:
-        token = request.headers['Authorization'].split(" ")[1]
-    
-    if not token:
+    payload = get_user_from_token()
+    if not payload:
         return jsonify({'message': 'Chưa đăng nhập'}), 401
 
     try:
-        payload = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
         user_id = payload['user_id']
         
         data = request.json
@@ -109,50 +95,40 @@ def change_password():
         if not user:
             return jsonify({'message': 'User không tồn tại'}), 404
 
-        stored_password = user['password']
-        is_old_pass_valid = False
-
-        try:
-            if check_password_hash(stored_password, old_password):
-                is_old_pass_valid = True
-        except:
-            is_old_pass_valid = False
-        
-        if not is_old_pass_valid and stored_password == old_password:
-             is_old_pass_valid = True
-
-        if not is_old_pass_valid:
+        if not hasher.verify(user['password'], old_password):
             return jsonify({'message': 'Mật khẩu cũ không đúng'}), 400
 
-        new_hash = generate_password_hash(new_password)
+        new_hash = hasher.hash(new_password)
         db.users.update_one({'_id': ObjectId(user_id)}, {'$set': {'password': new_hash}})
+        invalidate_user(user_id)
         
         return jsonify({'message': 'Đổi mật khẩu thành công'}), 200
 
+    except HashingBusy:
+        raise
     except Exception as e:
         return jsonify({'message': 'Lỗi xác thực', 'error': str(e)}), 401
 
 @auth_bp.route('/me', methods=['GET'])
 def get_current_user():
-    token = None
-    if 'Authorization' in request.headers:
-        token = request.headers['Authorization'].split(" ")[1]
-
-    if not token:
+    if not get_user_from_token():
         return jsonify({'message': 'Thiếu token'}), 401
 
     try:
-        payload = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
-        user_id = payload['user_id']
-        user = db.users.find_one({'_id': ObjectId(user_id)})
+        user = current_user_from_token()
         
         if not user:
              return jsonify({'message': 'User không tồn tại'}), 401
         
-        enrolled_ids = user.get('enrolled_courses', [])
-        course_object_ids = [ObjectId(cid) for cid in enrolled_ids if ObjectId.is_valid(cid)]
-        enrolled_courses_cursor = db.courses.find({'_id': {'$in': course_object_ids}})
-        enrolled_details = [serialize_course(c) for c in enrolled_courses_cursor]
+        enrolled_ids = enrolled_course_ids(user)
+        # Mặc định chỉ trả về thẻ tóm tắt (có cache); ?expand=courses để lấy đầy đủ announcements/materials
+        expand = request.args.get('expand', '').split(',')
+        if 'courses' in expand:
+            course_object_ids = [ObjectId(cid) for cid in enrolled_ids if ObjectId.is_valid(cid)]
+            enrolled_courses_cursor = db.courses.find({'_id': {'$in': course_object_ids}})
+            enrolled_details = [serialize_course(c) for c in enrolled_courses_cursor]
+        else:
+            enrolled_details = get_course_cards(enrolled_ids)
 
         return jsonify({
             'user': {
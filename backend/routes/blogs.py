@@ -1,13 +1,24 @@
-
+# --- FILE: backend/routes/blogs.py ---
 from flask import Blueprint, request, jsonify, current_app
 from database import get_db
+from services.stats import bump as bump_stats
+from services.auth import get_user_from_token, get_current_user
+from services.search import index_document, remove_document
 import datetime
-import jwt
 from bson.objectid import ObjectId
+from pymongo import DESCENDING
+from services.pagination import (
+    parse_limit, stream_json_list, stream_json_page, time_cursor_filter, encode_time_cursor,
+    CursorError, DEFAULT_PAGE_SIZE
+)
 
 blogs_bp = Blueprint('blogs', __name__)
 db = get_db()
 
+# Thứ tự của feed: mới nhất trước, _id để phân định các bài cùng created_at
+# (được phục vụ bởi hai index feed của 'blogs' trong services/indexes.py)
+FEED_SORT = [('created_at', DESCENDING), ('_id', DESCENDING)]
+
 def serialize_doc(doc):
     if doc:
         doc['_id'] = str(doc['_id'])
@@ -15,25 +26,31 @@ def serialize_doc(doc):
             doc['created_at'] = doc['created_at'].isoformat()
     return doc
 
-# Helper: Lấy User ID từ Token
-def get_user_from_token():
-    token = None
-    if 'Authorization' in request.headers:
-        token = request.headers['Authorization'].split(" ")[1]
-    if not token:
-        return None
+def blog_feed(query):
+    """
+    Feed blog sắp xếp theo (created_at, _id) giảm dần.
+    Có ?cursor= hoặc ?limit= thì trả về một trang {items, next_cursor},
+    không có thì giữ định dạng mảng cũ (vẫn stream từ cursor).
+    """
     try:
-        payload = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
-        return payload 
-    except:
-        return None
+        query = {**query, **time_cursor_filter(request.args.get('cursor'))}
+    except CursorError as e:
+        return jsonify({'message': str(e)}), 400
+    cursor = db.blogs.find(query).sort(FEED_SORT)
+    limit = parse_limit()
+    if limit is None and not request.args.get('cursor'):
+        return stream_json_list(cursor, serialize_doc)
+    limit = limit or DEFAULT_PAGE_SIZE
+    return stream_json_page(
+        cursor.limit(limit + 1), limit, serialize_doc,
+        lambda b: encode_time_cursor(b.get('created_at'), b['_id'])
+    )
 
 
 @blogs_bp.route('', methods=['GET'])
 def get_blogs():
     try:
-        blogs = list(db.blogs.find().sort('created_at', -1))
-        return jsonify([serialize_doc(b) for b in blogs]), 200
+        return blog_feed({})
     except Exception as e:
         return jsonify({'message': 'Lỗi server', 'error': str(e)}), 500
 
@@ -44,9 +61,7 @@ def get_my_blogs():
     if not user_data:
         return jsonify({'message': 'Chưa đăng nhập'}), 401
     
-    user_id = user_data['user_id']
-    blogs = list(db.blogs.find({'author_id': user_id}).sort('created_at', -1))
-    return jsonify([serialize_doc(b) for b in blogs]), 200
+    return blog_feed({'author_id': user_data['user_id']})
 
 # 3. Tạo bài viết mới
 @blogs_bp.route('', methods=['POST'])
@@ -59,8 +74,7 @@ def create_blog():
     if not data.get('title') or not data.get('content'):
         return jsonify({'message': 'Thiếu tiêu đề hoặc nội dung'}), 400
 
-    user_id = user_data['user_id']
-    user = db.users.find_one({'_id': ObjectId(user_id)})
+    user = get_current_user()
     
     if not user:
         return jsonify({'message': 'User không tồn tại'}), 404
@@ -76,6 +90,8 @@ def create_blog():
     }
     
     result = db.blogs.insert_one(new_blog)
+    index_document('blog', new_blog)
+    bump_stats('blogs')
     return jsonify({'message': 'Đăng bài thành công', 'id': str(result.inserted_id)}), 201
 
 
@@ -101,6 +117,7 @@ def update_blog(blog_id):
     }
 
     db.blogs.update_one({'_id': ObjectId(blog_id)}, {'$set': update_data})
+    index_document('blog', {**blog, **update_data})
     return jsonify({'message': 'Cập nhật thành công'}), 200
 
 # 5. Xóa bài viết
@@ -117,5 +134,7 @@ def delete_blog(blog_id):
     if blog.get('author_id') != user_data['user_id']:
         return jsonify({'message': 'Bạn không có quyền xóa bài này'}), 403
 
-    db.blogs.delete_one({'_id': ObjectId(blog_id)})
+    result = db.blogs.delete_one({'_id': ObjectId(blog_id)})
+    bump_stats('blogs', -result.deleted_count)
+    remove_document('blog', blog_id)
     return jsonify({'message': 'Xóa bài viết thành công'}), 200
\ No newline at end of file
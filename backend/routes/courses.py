@@ -1,8 +1,23 @@
 # --- FILE: backend/routes/courses.py ---
 from flask import Blueprint, request, jsonify, current_app, send_file
 from database import get_db
+from services.http_cache import conditional_get, bump_version
+from services.stats import bump as bump_stats
+from services.auth import get_user_from_token, get_current_user
+from services.materials import store_material, send_material
+from services.course_cards import invalidate_course_card
+from services.search import index_document, remove_document
+from services.announcements import (
+    add_announcement as store_announcement, latest as latest_announcements, migrate_course as migrate_announcements,
+    delete_course_announcements, page_query as announcement_query, serialize_announcement,
+    cursor_of as announcement_cursor, ANNOUNCEMENT_SORT
+)
+from services.enrollments import (
+    enroll, unenroll, is_enrolled, import_roster, roster_query, delete_course_enrollments, ROSTER_PROJECTION
+)
+from services.pagination import parse_limit, stream_json_page, CursorError, DEFAULT_PAGE_SIZE
 from bson.objectid import ObjectId
-import jwt
+from werkzeug.exceptions import HTTPException
 import datetime
 import io 
 
@@ -13,49 +28,34 @@ def serialize_doc(doc):
     if doc: doc['_id'] = str(doc['_id'])
     return doc
 
-def get_user_from_token():
-    token = None
-    if 'Authorization' in request.headers:
-        token = request.headers['Authorization'].split(" ")[1]
-    elif request.args.get('token'): # Hỗ trợ token qua URL cho việc download file
-        token = request.args.get('token')
-        
-    if not token: return None
-    try:
-        payload = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
-        return payload
-    except:
-        return None
-
 # [PUBLIC] Lấy danh sách khóa học
 @courses_bp.route('', methods=['GET'])
+@conditional_get('courses')
 def get_courses():
     courses = list(db.courses.find({}, {'announcements': 0, 'materials': 0}))
     return jsonify([serialize_doc(c) for c in courses]), 200
 
-# Lấy chi tiết khóa học
+def can_manage(course, user):
+    return bool(user) and (user['role'] == 'admin' or str(course.get('instructor_id')) == str(user['_id']))
+
+def can_access(course, user):
+    if not user: return False
+    return can_manage(course, user) or is_enrolled(user, course['_id'])
+
+# Lấy chi tiết khóa học (chỉ kèm vài thông báo mới nhất, phần cũ hơn lấy qua /announcements?cursor=)
 @courses_bp.route('/<course_id>', methods=['GET'])
 def get_course_detail(course_id):
-    user_payload = get_user_from_token()
+    if not ObjectId.is_valid(course_id): return jsonify({'message': 'Khóa học không tồn tại'}), 404
     course = db.courses.find_one({'_id': ObjectId(course_id)})
     if not course: return jsonify({'message': 'Khóa học không tồn tại'}), 404
+    if 'announcements' in course: migrate_announcements(course)  # khóa học cũ: chuyển mảng nhúng sang collection
+    course.pop('announcements', None)
 
-    is_authorized = False
-    
-    if user_payload:
-        user = db.users.find_one({'_id': ObjectId(user_payload['user_id'])})
-        is_admin = user['role'] == 'admin'
-        is_owner = str(course.get('instructor_id')) == str(user['_id'])
-        is_enrolled = str(course['_id']) in user.get('enrolled_courses', [])
-        
-        if is_admin or is_owner or is_enrolled:
-            is_authorized = True
-
-    if not is_authorized:
-        course.pop('announcements', None)
+    if not can_access(course, get_current_user()):
         course.pop('materials', None)
         return jsonify({'course': serialize_doc(course), 'access': False}), 200
-    
+
+    course['announcements'], course['announcements_cursor'] = latest_announcements(course_id)
     return jsonify({'course': serialize_doc(course), 'access': True}), 200
 
 @courses_bp.route('/created', methods=['GET'])
@@ -69,7 +69,7 @@ def get_my_created_courses():
 def create_course():
     user_payload = get_user_from_token()
     if not user_payload: return jsonify({'message': 'Unauthorized'}), 401
-    user = db.users.find_one({'_id': ObjectId(user_payload['user_id'])})
+    user = get_current_user()
     if not user or user.get('role') not in ['admin', 'teacher']:
         return jsonify({'message': 'Chỉ Giáo viên hoặc Admin mới được tạo khóa học'}), 403
 
@@ -82,52 +82,118 @@ def create_course():
         'level': data['level'],
         'instructor_id': str(user['_id']),
         'instructor_name': user['username'],
-        'announcements': [], 
-        'materials': []      
+        'materials': []
     }
     result = db.courses.insert_one(new_course)
+    index_document('course', new_course)
+    bump_stats('courses')
+    bump_version('courses')
     return jsonify({'message': 'Tạo khóa học thành công', 'id': str(result.inserted_id)}), 201
 
 @courses_bp.route('/<course_id>', methods=['DELETE'])
 def delete_course(course_id):
     user_payload = get_user_from_token()
     if not user_payload: return jsonify({'message': 'Unauthorized'}), 401
-    user = db.users.find_one({'_id': ObjectId(user_payload['user_id'])})
+    user = get_current_user()
+    if not user: return jsonify({'message': 'Unauthorized'}), 401
     course = db.courses.find_one({'_id': ObjectId(course_id)})
     if not course: return jsonify({'message': 'Khóa học không tồn tại'}), 404
     is_admin = user.get('role') == 'admin'
     is_owner = str(course.get('instructor_id')) == str(user['_id'])
     if not (is_admin or is_owner):
         return jsonify({'message': 'Không có quyền xóa'}), 403
-    db.courses.delete_one({'_id': ObjectId(course_id)})
+    result = db.courses.delete_one({'_id': ObjectId(course_id)})
+    bump_stats('courses', -result.deleted_count)
+    bump_version('courses')
+    invalidate_course_card(course_id)
+    remove_document('course', course_id)
+    delete_course_announcements(course_id)
+    delete_course_enrollments(course_id)
     return jsonify({'message': 'Đã xóa khóa học'}), 200
 
+# Học viên tự đăng ký (user_id là chính mình); admin/giáo viên phụ trách đăng ký hộ được
 @courses_bp.route('/enroll', methods=['POST'])
 def enroll_course():
+    if not get_user_from_token(): return jsonify({'message': 'Unauthorized'}), 401
     data = request.json
     user_id = data.get('user_id')
     course_id = data.get('course_id')
     if not user_id or not course_id: return jsonify({'message': 'Thiếu thông tin'}), 400
     try:
-        if not db.courses.find_one({'_id': ObjectId(course_id)}): return jsonify({'message': 'Khóa học không tồn tại'}), 404
-        db.users.update_one({'_id': ObjectId(user_id)}, {'$addToSet': {'enrolled_courses': course_id}})
+        course = db.courses.find_one({'_id': ObjectId(course_id)}, {'instructor_id': 1})
+        if not course: return jsonify({'message': 'Khóa học không tồn tại'}), 404
+        current = get_current_user()
+        if str(current['_id']) != str(user_id) and not can_manage(course, current):
+            return jsonify({'message': 'Không có quyền'}), 403
+        student = db.users.find_one({'_id': ObjectId(user_id)}, {'username': 1})
+        if not student: return jsonify({'message': 'User không tồn tại'}), 404
+        if enroll(course_id, student): bump_version('courses')
         return jsonify({'message': 'Đăng ký thành công'}), 200
     except Exception as e: return jsonify({'message': 'Lỗi', 'error': str(e)}), 400
 
+def managed_course(course_id):
+    """(course, lỗi): chỉ admin hoặc giáo viên phụ trách được quản lý danh sách lớp"""
+    if not get_user_from_token(): return None, (jsonify({'message': 'Unauthorized'}), 401)
+    if not ObjectId.is_valid(course_id): return None, (jsonify({'message': 'Khóa học không tồn tại'}), 404)
+    course = db.courses.find_one({'_id': ObjectId(course_id)}, {'instructor_id': 1, 'enrollment_count': 1})
+    if not course: return None, (jsonify({'message': 'Khóa học không tồn tại'}), 404)
+    if not can_manage(course, get_current_user()): return None, (jsonify({'message': 'Không có quyền'}), 403)
+    return course, None
+
+# Danh sách học viên, sắp theo user_id và phân trang bằng ?after=<user_id cuối trang trước>
+@courses_bp.route('/<course_id>/students', methods=['GET'])
+def get_roster(course_id):
+    course, error = managed_course(course_id)
+    if error: return error
+    limit = parse_limit() or DEFAULT_PAGE_SIZE
+    cursor = db.enrollments.find(roster_query(course_id, request.args.get('after')), ROSTER_PROJECTION)
+    response = stream_json_page(cursor.sort('user_id', 1).limit(limit + 1), limit, lambda e: e, lambda e: e['user_id'])
+    response.headers['X-Total-Count'] = str(course.get('enrollment_count', 0))
+    return response
+
+# Ghi danh cả lớp: form-data `file` là CSV mỗi dòng một username
+@courses_bp.route('/<course_id>/students/import', methods=['POST'])
+def import_students(course_id):
+    course, error = managed_course(course_id)
+    if error: return error
+    if 'file' not in request.files: return jsonify({'message': 'Không có file'}), 400
+    report = import_roster(course_id, request.files['file'].stream)
+    if report['enrolled']: bump_version('courses')
+    return jsonify({'message': 'Đã ghi danh theo danh sách lớp', **report}), 200
+
+@courses_bp.route('/<course_id>/students/<user_id>', methods=['DELETE'])
+def remove_student(course_id, user_id):
+    course, error = managed_course(course_id)
+    if error: return error
+    if not unenroll(course_id, user_id): return jsonify({'message': 'Học viên không có trong khóa học'}), 404
+    bump_version('courses')
+    return jsonify({'message': 'Đã xóa học viên khỏi khóa học'}), 200
+
 @courses_bp.route('/<course_id>/announcements', methods=['POST'])
 def add_announcement(course_id):
     user_payload = get_user_from_token()
     if not user_payload: return jsonify({'message': 'Unauthorized'}), 401
     
     data = request.json
-    announcement = {
-        'id': str(ObjectId()),
-        'content': data.get('content'),
-        'date': datetime.datetime.now().isoformat(),
-        'sender': user_payload.get('username')
-    }
-    db.courses.update_one({'_id': ObjectId(course_id)}, {'$push': {'announcements': announcement}})
-    return jsonify({'message': 'Đã thêm thông báo'}), 200
+    if not db.courses.count_documents({'_id': ObjectId(course_id)}, limit=1):
+        return jsonify({'message': 'Khóa học không tồn tại'}), 404
+    announcement = store_announcement(course_id, data.get('content'), user_payload.get('username'), user_payload['user_id'])
+    return jsonify({'message': 'Đã thêm thông báo', 'announcement': serialize_announcement(announcement)}), 200
+
+# Thông báo mới nhất trước, phân trang theo ?cursor= (announcements_cursor của chi tiết khóa học hoặc next_cursor)
+@courses_bp.route('/<course_id>/announcements', methods=['GET'])
+def get_announcements(course_id):
+    course = db.courses.find_one({'_id': ObjectId(course_id)}, {'instructor_id': 1, 'announcements': 1})
+    if not course: return jsonify({'message': 'Khóa học không tồn tại'}), 404
+    if not can_access(course, get_current_user()): return jsonify({'message': 'Không có quyền xem thông báo'}), 403
+    if 'announcements' in course: migrate_announcements(course)
+    try:
+        query = announcement_query(course_id, request.args.get('cursor'))
+    except CursorError as e:
+        return jsonify({'message': str(e)}), 400
+    limit = parse_limit() or DEFAULT_PAGE_SIZE
+    cursor = db.announcements.find(query).sort(ANNOUNCEMENT_SORT).limit(limit + 1)
+    return stream_json_page(cursor, limit, serialize_announcement, announcement_cursor)
 
 # [UPDATED] Thêm Tài liệu (Upload File)
 @courses_bp.route('/<course_id>/materials', methods=['POST'])
@@ -146,17 +212,8 @@ def add_material(course_id):
         return jsonify({'message': 'Chưa chọn file'}), 400
 
     try:
-        # Lưu nội dung file vào collection riêng để nhẹ bảng courses
-        file_doc = {
-            'filename': file.filename,
-            'content_type': file.content_type,
-            'data': file.read(), # Đọc binary
-            'uploaded_at': datetime.datetime.now(),
-            'uploader_id': user_payload['user_id']
-        }
-        # Insert vào collection 'course_files'
-        insert_result = db.course_files.insert_one(file_doc)
-        file_id = str(insert_result.inserted_id)
+        # Stream file vào GridFS (chia chunk), không đọc toàn bộ vào RAM
+        file_id = store_material(file, user_payload['user_id'], course_id)
 
         # Lưu thông tin tham chiếu vào khóa học
         material = {
@@ -182,6 +239,10 @@ def download_material(file_id):
     # Để đơn giản cho demo, tạm thời cho phép download nếu có link (hoặc bạn có thể bật check token ở trên)
 
     try:
+        response = send_material(file_id)
+        if response is not None: return response
+
+        # File cũ chưa chạy `flask materials migrate` vẫn nằm trong course_files
         file_doc = db.course_files.find_one({'_id': ObjectId(file_id)})
         if not file_doc: return jsonify({'message': 'File không tồn tại'}), 404
         
@@ -191,5 +252,7 @@ def download_material(file_id):
             as_attachment=True,
             download_name=file_doc['filename']
         )
+    except HTTPException:
+        raise  # 416 khi Range không hợp lệ, ... giữ nguyên mã lỗi
     except Exception as e:
-        return jsonify({'message': 'Lỗi download', 'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'message': 'Lỗi download', 'error': str(e)}), 500
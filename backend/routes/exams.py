@@ -1,128 +1,252 @@
 # --- FILE: backend/routes/exams.py ---
 from flask import Blueprint, request, jsonify, current_app
 from database import get_db
+from services.http_cache import conditional_get, bump_version
+from services.stats import bump as bump_stats
+from services.question_jobs import question_jobs
+from services.auth import get_user_from_token, get_current_user
+from services.search import index_document, remove_document
+from services.question_bank import (
+    get_student_exam, page_questions, save_exam_questions, clean_question,
+    exams_using, QuestionError
+)
+from services.grading import get_answer_key
+from services.analytics import get_teacher_summaries, get_exam_summary, get_best_attempts
+from services.leaderboard import get_leaderboard, MAX_TOP
+from services.exam_attempts import (
+    open_attempt, serialize_attempt, clean_answers, clean_duration, save_progress, submit_attempt, AttemptError
+)
+from services.pagination import (
+    parse_limit, parse_object_id, stream_json_list, stream_json_page, CursorError, DEFAULT_PAGE_SIZE
+)
 from bson.objectid import ObjectId
 import datetime
-import jwt
-import io
-import json
-
-# Thư viện cho AI & PDF
-import google.generativeai as genai
-from pypdf import PdfReader
-from dotenv import load_dotenv
-import os
-load_dotenv()
-api_key = os.getenv("GEMINI_API_KEY")
+import re
 
 exams_bp = Blueprint('exams', __name__)
 db = get_db()
 
-GEMINI_API_KEY = api_key
-genai.configure(api_key=GEMINI_API_KEY)
-model = genai.GenerativeModel('gemini-2.5-flash') 
-
-def get_user_from_token():
-    token = None
-    if 'Authorization' in request.headers:
-        token = request.headers['Authorization'].split(" ")[1]
-    if not token: return None
-    try:
-        payload = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
-        return payload
-    except:
-        return None
-
 def serialize_doc(doc):
     doc['_id'] = str(doc['_id'])
     return doc
 
+def serialize_job(job):
+    data = {'job_id': job['_id'], 'status': job['status'], 'progress': job.get('progress', 0)}
+    if job['status'] == 'done': data['questions'] = job.get('questions', [])
+    if job['status'] == 'failed': data['error'] = job.get('error')
+    return data
+
+# Chỉ lấy các trường cần cho danh sách, bỏ qua mảng questions rất nặng
+EXAM_SUMMARY_PROJECTION = {'title': 1, 'duration': 1, 'description': 1, 'password': 1, 'creator_name': 1}
+
+def serialize_exam_summary(e):
+    return {
+        '_id': str(e['_id']),
+        'title': e['title'],
+        'duration': e['duration'],
+        'description': e.get('description', ''),
+        'has_password': bool(e.get('password')),
+        'creator_name': e.get('creator_name', 'Admin')
+    }
+
 # --- CÁC API CŨ (Giữ nguyên) ---
+# ?after=<id>&limit=: phân trang keyset theo _id; ?creator=<user_id>, ?title=<tiền tố>: bộ lọc
 @exams_bp.route('', methods=['GET'])
+@conditional_get('exams')
 def get_exams():
-    exams = list(db.exams.find())
-    results = []
-    for e in exams:
-        results.append({
-            '_id': str(e['_id']),
-            'title': e['title'],
-            'duration': e['duration'],
-            'description': e.get('description', ''),
-            'has_password': bool(e.get('password')),
-            'creator_name': e.get('creator_name', 'Admin')
-        })
-    return jsonify(results), 200
+    query = {}
+    if request.args.get('creator'):
+        query['creator_id'] = request.args['creator']
+    if request.args.get('title'):
+        # Regex có neo '^' và phân biệt hoa thường thì MongoDB dùng được index trên title
+        query['title'] = {'$regex': '^' + re.escape(request.args['title'])}
+    try:
+        after = parse_object_id(request.args.get('after'))
+    except CursorError as e:
+        return jsonify({'message': str(e)}), 400
+    if after:
+        query['_id'] = {'$gt': after}
+
+    limit = parse_limit()
+    cursor = db.exams.find(query, EXAM_SUMMARY_PROJECTION).sort('_id', 1)
+    if limit is None and after is None:
+        return stream_json_list(cursor, serialize_exam_summary)
+    limit = limit or DEFAULT_PAGE_SIZE
+    return stream_json_page(cursor.limit(limit + 1), limit, serialize_exam_summary, lambda e: str(e['_id']))
+
+def open_exam(exam_id):
+    """Bản đề cho học sinh (cache) sau khi kiểm tra mật khẩu; trả về (payload, lỗi)"""
+    data = request.json or {}
+    exam = get_student_exam(exam_id)
+    if not exam: return None, (jsonify({'message': 'Đề thi không tồn tại'}), 404)
+    if exam['password'] and str(exam['password']) != str(data.get('password', '')):
+        return None, (jsonify({'message': 'Mật khẩu đề thi không đúng'}), 403)
+    return exam['payload'], None
 
+# Không trả về đáp án hay mật khẩu. Đề dài: ?limit=&offset= để lấy từng phần câu hỏi
+# (các phần sau lấy qua POST /<exam_id>/questions, không bắt đầu lại bài thi).
+# Đã đăng nhập: kèm `attempt` (giờ làm bài tính trên server, đáp án đã lưu) để làm tiếp sau khi tải lại trang.
 @exams_bp.route('/<exam_id>/start', methods=['POST'])
 def start_exam(exam_id):
-    data = request.json or {}
-    password_input = data.get('password', '')
-    exam = db.exams.find_one({'_id': ObjectId(exam_id)})
+    payload, error = open_exam(exam_id)
+    if error: return error
+    page = page_questions(payload, request.args.get('offset', 0, type=int), parse_limit())
+    user_payload = get_user_from_token()
+    if user_payload:
+        attempt = open_attempt(exam_id, user_payload['user_id'], user_payload.get('username'), payload['duration'])
+        page = {**page, 'attempt': serialize_attempt(attempt)}
+    return jsonify(page), 200
+
+# Autosave trong lúc làm bài: {answers: {'<câu>': lựa chọn}} (chỉ cần gửi các câu vừa đổi)
+@exams_bp.route('/<exam_id>/progress', methods=['PUT'])
+def save_exam_progress(exam_id):
+    user_payload = get_user_from_token()
+    if not user_payload: return jsonify({'message': 'Unauthorized'}), 401
+    exam = get_student_exam(exam_id)
     if not exam: return jsonify({'message': 'Đề thi không tồn tại'}), 404
-    if exam.get('password') and str(exam.get('password')) != str(password_input):
-        return jsonify({'message': 'Mật khẩu đề thi không đúng'}), 403
-    return jsonify(serialize_doc(exam)), 200
+    try:
+        answers = clean_answers(exam['payload'], (request.json or {}).get('answers'))
+        remaining = save_progress(exam_id, user_payload['user_id'], answers)
+    except AttemptError as e:
+        return jsonify({'message': str(e)}), 409
+    return jsonify({'message': 'Đã lưu', 'remaining_seconds': remaining}), 200
+
+@exams_bp.route('/<exam_id>/questions', methods=['POST'])
+def get_exam_questions(exam_id):
+    payload, error = open_exam(exam_id)
+    if error: return error
+    page = page_questions(payload, request.args.get('offset', 0, type=int), parse_limit() or DEFAULT_PAGE_SIZE)
+    return jsonify({k: page[k] for k in ('questions', 'offset', 'next_offset', 'question_count')}), 200
+
+def can_manage_exams():
+    user = get_current_user()
+    return user if user and user['role'] in ['admin', 'teacher'] else None
 
+# questions: câu hỏi mới {question, options, correct_index} hoặc câu có sẵn trong ngân hàng {id}
 @exams_bp.route('', methods=['POST'])
 def create_exam():
     user_payload = get_user_from_token()
     if not user_payload: return jsonify({'message': 'Unauthorized'}), 401
-    user = db.users.find_one({'_id': ObjectId(user_payload['user_id'])})
-    if user['role'] not in ['admin', 'teacher']: return jsonify({'message': 'Không có quyền tạo đề thi'}), 403
+    user = can_manage_exams()
+    if not user: return jsonify({'message': 'Không có quyền tạo đề thi'}), 403
     data = request.json
+    try:
+        question_ids = save_exam_questions(data.get('questions', []), str(user['_id']), user['role'] == 'admin')
+    except QuestionError as e:
+        return jsonify({'message': str(e)}), 400
     new_exam = {
         'title': data['title'],
         'description': data.get('description', ''),
         'duration': int(data['duration']),
-        'questions': data['questions'],
+        'question_ids': question_ids,
+        'question_count': len(question_ids),
         'password': data.get('password', ''),
         'creator_id': str(user['_id']),
         'creator_name': user['username']
     }
     db.exams.insert_one(new_exam)
-    return jsonify({'message': 'Tạo đề thi thành công'}), 201
+    index_document('exam', new_exam)
+    bump_stats('exams')
+    bump_version('exams')
+    return jsonify({'message': 'Tạo đề thi thành công', 'id': str(new_exam['_id'])}), 201
+
+@exams_bp.route('/<exam_id>', methods=['PUT'])
+def update_exam(exam_id):
+    user_payload = get_user_from_token()
+    if not user_payload: return jsonify({'message': 'Unauthorized'}), 401
+    user = can_manage_exams()
+    if not user: return jsonify({'message': 'Không có quyền sửa đề thi'}), 403
+    exam = db.exams.find_one({'_id': ObjectId(exam_id)}, {'creator_id': 1, 'title': 1, 'description': 1, 'creator_name': 1})
+    if not exam: return jsonify({'message': 'Đề thi không tồn tại'}), 404
+    if user['role'] != 'admin' and str(exam.get('creator_id')) != str(user['_id']):
+        return jsonify({'message': 'Không có quyền sửa đề thi'}), 403
+    data = request.json or {}
+    update = {k: data[k] for k in ('title', 'description', 'password') if k in data}
+    if 'duration' in data: update['duration'] = int(data['duration'])
+    unset = {}
+    if 'questions' in data:
+        try:
+            update['question_ids'] = save_exam_questions(data['questions'], str(user['_id']), user['role'] == 'admin')
+        except QuestionError as e:
+            return jsonify({'message': str(e)}), 400
+        update['question_count'] = len(update['question_ids'])
+        unset = {'questions': ''}  # đề cũ: bỏ mảng nhúng
+    if not update: return jsonify({'message': 'Không có gì để cập nhật'}), 400
+    db.exams.update_one({'_id': ObjectId(exam_id)}, {'$set': update, **({'$unset': unset} if unset else {})})
+    bump_version('exams')
+    index_document('exam', {**exam, **update})
+    return jsonify({'message': 'Đã cập nhật đề thi'}), 200
+
+# Ngân hàng câu hỏi của giáo viên đang đăng nhập (admin: ?creator= để xem của người khác), phân trang theo _id
+@exams_bp.route('/questions', methods=['GET'])
+def get_question_bank():
+    if not get_user_from_token(): return jsonify({'message': 'Unauthorized'}), 401
+    user = can_manage_exams()
+    if not user: return jsonify({'message': 'Không có quyền'}), 403
+    creator = request.args.get('creator') if user['role'] == 'admin' else None
+    query = {'creator_id': creator or str(user['_id'])}
+    try:
+        after = parse_object_id(request.args.get('after'))
+    except CursorError as e:
+        return jsonify({'message': str(e)}), 400
+    if after: query['_id'] = {'$gt': after}
+    limit = parse_limit() or DEFAULT_PAGE_SIZE
+    cursor = db.questions.find(query).sort('_id', 1).limit(limit + 1)
+    return stream_json_page(cursor, limit, serialize_doc, lambda q: str(q['_id']))
+
+# Sửa một câu trong ngân hàng: mọi đề đang dùng câu này đều được làm mới cache
+@exams_bp.route('/questions/<question_id>', methods=['PUT'])
+def update_question(question_id):
+    if not get_user_from_token(): return jsonify({'message': 'Unauthorized'}), 401
+    user = can_manage_exams()
+    if not user: return jsonify({'message': 'Không có quyền'}), 403
+    question = db.questions.find_one({'_id': ObjectId(question_id)}, {'creator_id': 1})
+    if not question: return jsonify({'message': 'Câu hỏi không tồn tại'}), 404
+    if user['role'] != 'admin' and question.get('creator_id') != str(user['_id']):
+        return jsonify({'message': 'Không có quyền sửa câu hỏi này'}), 403
+    try:
+        fields = clean_question(request.json or {})
+    except QuestionError as e:
+        return jsonify({'message': str(e)}), 400
+    db.questions.update_one({'_id': ObjectId(question_id)}, {'$set': fields})
+    if exams_using(question_id): bump_version('exams')
+    return jsonify({'message': 'Đã cập nhật câu hỏi'}), 200
 
 @exams_bp.route('/<exam_id>', methods=['DELETE'])
 def delete_exam(exam_id):
     user_payload = get_user_from_token()
     if not user_payload: return jsonify({'message': 'Unauthorized'}), 401
-    user = db.users.find_one({'_id': ObjectId(user_payload['user_id'])})
+    user = get_current_user()
     exam = db.exams.find_one({'_id': ObjectId(exam_id)})
+    if not user: return jsonify({'message': 'Unauthorized'}), 401
+    if not exam: return jsonify({'message': 'Đề thi không tồn tại'}), 404
     if user['role'] == 'admin' or str(exam.get('creator_id')) == str(user['_id']):
-        db.exams.delete_one({'_id': ObjectId(exam_id)})
+        result = db.exams.delete_one({'_id': ObjectId(exam_id)})
+        bump_stats('exams', -result.deleted_count)
+        bump_version('exams')
+        remove_document('exam', exam_id)
         return jsonify({'message': 'Đã xóa đề thi'}), 200
     return jsonify({'message': 'Không có quyền xóa'}), 403
 
+# Lượt đã bắt đầu trên server: đáp án đã autosave được gộp với đáp án gửi kèm, thời gian làm bài đo trên server
 @exams_bp.route('/<exam_id>/submit', methods=['POST'])
 def submit_exam(exam_id):
     user_payload = get_user_from_token()
     if not user_payload: return jsonify({'message': 'Unauthorized'}), 401
-    data = request.json
-    user_answers = data.get('answers', {}) 
-    duration_taken = data.get('duration_taken', 0)
-    exam = db.exams.find_one({'_id': ObjectId(exam_id)})
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict): return jsonify({'message': 'Thiếu dữ liệu bài nộp'}), 400
+    exam = get_student_exam(exam_id)
     if not exam: return jsonify({'message': 'Lỗi đề thi'}), 404
-    score = 0
-    total_questions = len(exam['questions'])
-    for i, question in enumerate(exam['questions']):
-        user_choice = user_answers.get(str(i))
-        if user_choice is not None and int(user_choice) == question['correct_index']:
-            score += 1
-    attempt_count = db.results.count_documents({'user_id': user_payload['user_id'], 'exam_id': exam_id}) + 1
-    result_record = {
-        'user_id': user_payload['user_id'],
-        'username': user_payload.get('username'),
-        'exam_id': exam_id,
-        'exam_title': exam['title'],
-        'creator_id': exam.get('creator_id'),
-        'score': score,
-        'total_questions': total_questions,
-        'duration_taken': duration_taken,
-        'attempt_number': attempt_count,
-        'timestamp': datetime.datetime.now()
-    }
-    db.results.insert_one(result_record)
-    return jsonify({'message': 'Nộp bài thành công', 'score': score, 'total': total_questions, 'attempt': attempt_count}), 200
+    try:
+        user_answers = clean_answers(exam['payload'], data.get('answers'), required=False)
+        duration_taken = clean_duration(data.get('duration_taken'))
+    except AttemptError as e:
+        return jsonify({'message': str(e)}), 400
+    submitted = submit_attempt(exam_id, user_payload['user_id'], user_payload.get('username'), user_answers, duration_taken)
+    if not submitted: return jsonify({'message': 'Lỗi đề thi'}), 404
+    message, summary = submitted
+    if not summary: return jsonify({'message': message}), 409
+    return jsonify({'message': message, **summary}), 200
 
 @exams_bp.route('/history', methods=['GET'])
 def get_history():
@@ -142,7 +266,37 @@ def get_teacher_results():
             r['timestamp'] = r['timestamp'].isoformat()
     return jsonify(results), 200
 
+# Thống kê tổng hợp sẵn (materialized) cho các đề của giáo viên đang đăng nhập
+@exams_bp.route('/analytics', methods=['GET'])
+def get_teacher_analytics():
+    user_payload = get_user_from_token()
+    if not user_payload: return jsonify({'message': 'Unauthorized'}), 401
+    return jsonify(get_teacher_summaries(user_payload['user_id'])), 200
+
+@exams_bp.route('/<exam_id>/analytics', methods=['GET'])
+def get_exam_analytics(exam_id):
+    user = get_current_user()
+    if not user: return jsonify({'message': 'Unauthorized'}), 401
+    if not ObjectId.is_valid(exam_id): return jsonify({'message': 'Đề thi không tồn tại'}), 404
+    # Kiểm tra quyền trước: người ngoài không dò được đề nào đã có bài nộp
+    exam = get_answer_key(exam_id)
+    if user['role'] != 'admin' and (not exam or str(exam.get('creator_id')) != str(user['_id'])):
+        return jsonify({'message': 'Không có quyền xem thống kê'}), 403
+    summary = get_exam_summary(exam_id)
+    if not summary: return jsonify({'message': 'Chưa có bài nộp cho đề thi này'}), 404
+    summary['best_attempts'] = get_best_attempts(exam_id, min(request.args.get('limit', 100, type=int), 1000))
+    return jsonify(summary), 200
+
+# Bảng xếp hạng của đề (điểm cao nhất, cùng điểm thì nhanh hơn xếp trên): top ?limit= người và hạng của mình
+@exams_bp.route('/<exam_id>/leaderboard', methods=['GET'])
+def get_exam_leaderboard(exam_id):
+    user_payload = get_user_from_token()
+    if not user_payload: return jsonify({'message': 'Unauthorized'}), 401
+    limit = min(max(request.args.get('limit', 10, type=int), 1), MAX_TOP)
+    return jsonify(get_leaderboard(exam_id, user_payload['user_id'], limit)), 200
+
 # --- [NEW] API GEMINI GENERATE ---
+# Chạy nền: POST trả về job_id (202), client hỏi GET /generate-questions/<job_id> tới khi status = done
 @exams_bp.route('/generate-questions', methods=['POST'])
 def generate_questions_from_pdf():
     user_payload = get_user_from_token()
@@ -154,44 +308,17 @@ def generate_questions_from_pdf():
     file = request.files['file']
     if file.filename == '': return jsonify({'message': 'Chưa chọn file'}), 400
 
-    try:
-        reader = PdfReader(file)
-        text_content = ""
-        for page in reader.pages:
-            text_content += page.extract_text() + "\n"
-        
-        # Giới hạn ký tự để tránh lỗi token limit
-        text_content = text_content[:10000] 
-
-        prompt = f"""
-        Bạn là giáo viên đang soạn đề thi trắc nghiệm dựa trên tài liệu học tập được cung cấp.
-        Dựa vào nội dung văn bản sau, hãy tạo ra đầy đủ câu hỏi trắc nghiệm tiếng Anh (hoặc tiếng Việt tùy nội dung).
-        Chú ý mỗi câu hỏi chỉ có 1 đáp án, đáp án có thể được đặt ở cuối tài liệu, phương án được highlight trong tài liệu.
-        Không tạo câu hỏi nếu không tìm thấy thông tin liên quan trong tài liệu.
-        Tạo 5 câu hỏi mẫu.
-        Không nhầm lẫn tạo câu hỏi từ tiêu đề của tài liệu, mục lục, hoặc các phần không liên quan.
-        Yêu cầu định dạng trả về là một chuỗi JSON thuần túy (không bọc trong Markdown code block), là một danh sách các object có cấu trúc:
-        [
-            {{
-                "question": "Nội dung câu hỏi?",
-                "options": ["Đáp án A", "Đáp án B", "Đáp án C", "Đáp án D"],
-                "correct_index": 0 (số nguyên 0-3 tương ứng A-D)
-            }}
-        ]
-        
-        Nội dung văn bản:
-        {text_content}
-        """
-
-        response = model.generate_content(prompt)
-        raw_text = response.text
-
-        clean_json_text = raw_text.replace("```json", "").replace("```", "").strip()
-        
-        questions = json.loads(clean_json_text)
-
-        return jsonify({'questions': questions}), 200
-
-    except Exception as e:
-        print("AI Error:", str(e))
-        return jsonify({'message': 'Lỗi xử lý AI', 'error': str(e)}), 500
\ No newline at end of file
+    job = question_jobs.submit(file.read(), user_payload['user_id'])
+    if not job:
+        return jsonify({'message': 'Hệ thống AI đang bận, vui lòng thử lại sau'}), 503
+    # Trùng nội dung với PDF đã xử lý thì job đã xong ngay (200), còn lại 202 Accepted
+    return jsonify(serialize_job(job)), 200 if job['status'] == 'done' else 202
+
+@exams_bp.route('/generate-questions/<job_id>', methods=['GET'])
+def get_question_job(job_id):
+    user_payload = get_user_from_token()
+    if not user_payload: return jsonify({'message': 'Unauthorized'}), 401
+    job = question_jobs.get(job_id)
+    if not job or job['user_id'] != user_payload['user_id']:
+        return jsonify({'message': 'Job không tồn tại'}), 404
+    return jsonify(serialize_job(job)), 200
@@ -1,6 +1,12 @@
-
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, Response, stream_with_context
 from database import get_db
+from services.http_cache import conditional_get, bump_version
+from services.stats import bump as bump_stats
+from services.auth import get_user_from_token
+from services.decks import create_deck as create_deck_with_cards, delete_deck as delete_deck_with_cards, migrate_deck
+from services.srs import start_deck, due_cards, record_reviews, ReviewError
+from services.deck_io import detect_format, import_cards, export_cards, DeckImportError
+from services.pagination import parse_limit, stream_json_page
 from bson.objectid import ObjectId
 
 flashcards_bp = Blueprint('flashcards', __name__)
@@ -10,18 +16,40 @@ def serialize_doc(doc):
     doc['_id'] = str(doc['_id'])
     return doc
 
+# Danh sách bộ thẻ không kèm thẻ; bộ thẻ định dạng cũ (còn mảng cards) vẫn đếm được số thẻ
+DECK_LIST_PIPELINE = [
+    {'$project': {
+        'title': 1,
+        'card_count': {'$ifNull': ['$card_count', {'$size': {'$ifNull': ['$cards', []]}}]},
+    }},
+]
+
 @flashcards_bp.route('', methods=['GET'])
+@conditional_get('flashcards')
 def get_flashcards():
-    decks = list(db.flashcards.find())
+    decks = list(db.flashcards.aggregate(DECK_LIST_PIPELINE))
     if not decks:
-        sample_deck = {
-            'title': '3000 Từ vựng cơ bản (Mẫu)',
-            'cards': [{'front': 'Hello', 'back': 'Xin chào'}]
-        }
-        db.flashcards.insert_one(sample_deck)
-        decks = [sample_deck]
+        create_deck_with_cards('3000 Từ vựng cơ bản (Mẫu)', [{'front': 'Hello', 'back': 'Xin chào'}])
+        bump_stats('flashcards')
+        bump_version('flashcards')
+        decks = list(db.flashcards.aggregate(DECK_LIST_PIPELINE))
     return jsonify([serialize_doc(d) for d in decks]), 200
 
+# Thẻ của một bộ, phân trang keyset theo position: ?after=<position>&limit=
+@flashcards_bp.route('/<deck_id>/cards', methods=['GET'])
+def get_deck_cards(deck_id):
+    deck = db.flashcards.find_one({'_id': ObjectId(deck_id)})
+    if not deck: return jsonify({'message': 'Bộ thẻ không tồn tại'}), 404
+    if 'cards' in deck: migrate_deck(deck)
+
+    after = request.args.get('after', -1, type=int)
+    limit = parse_limit(default=50, maximum=500) or 50
+    cursor = db.flashcard_cards.find(
+        {'deck_id': deck_id, 'position': {'$gt': after}},
+        {'deck_id': 0}
+    ).sort('position', 1).limit(limit + 1)
+    return stream_json_page(cursor, limit, serialize_doc, lambda c: c['position'])
+
 
 @flashcards_bp.route('', methods=['POST'])
 def create_deck():
@@ -30,14 +58,102 @@ def create_deck():
         return jsonify({'message': 'Thiếu tiêu đề'}), 400
     
     # Mặc định tạo bộ thẻ rỗng hoặc nhận cards từ request
-    new_deck = {
-        'title': data['title'],
-        'cards': data.get('cards', []) 
-    }
-    db.flashcards.insert_one(new_deck)
-    return jsonify({'message': 'Tạo bộ thẻ thành công'}), 201
+    deck_id = create_deck_with_cards(data['title'], data.get('cards', []))
+    bump_stats('flashcards')
+    bump_version('flashcards')
+    return jsonify({'message': 'Tạo bộ thẻ thành công', 'id': str(deck_id)}), 201
 
 @flashcards_bp.route('/<deck_id>', methods=['DELETE'])
 def delete_deck(deck_id):
-    db.flashcards.delete_one({'_id': ObjectId(deck_id)})
-    return jsonify({'message': 'Đã xóa bộ thẻ'}), 200
\ No newline at end of file
+    deleted = delete_deck_with_cards(deck_id)
+    bump_stats('flashcards', -deleted)
+    bump_version('flashcards')
+    return jsonify({'message': 'Đã xóa bộ thẻ'}), 200
+
+# --- Nhập / xuất CSV, TSV (cần đăng nhập) ---
+def _import_into(deck_id):
+    """deck_id hoặc hàm tạo bộ thẻ (xem import_cards); DeckImportError nếu file không đọc được"""
+    file = request.files['file']
+    fmt = detect_format(file.filename, request.args.get('format') or request.form.get('format'))
+    try:
+        return import_cards(deck_id, file.stream, fmt)
+    finally:
+        bump_version('flashcards')
+
+# Tạo bộ thẻ mới từ file: form-data gồm title và file. Bộ thẻ chỉ được tạo khi file có thẻ hợp lệ
+@flashcards_bp.route('/import', methods=['POST'])
+def import_new_deck():
+    if not get_user_from_token(): return jsonify({'message': 'Chưa đăng nhập'}), 401
+    if 'file' not in request.files: return jsonify({'message': 'Không có file'}), 400
+    title = request.form.get('title') or request.files['file'].filename
+    created = []
+
+    def create_deck():
+        created.append(create_deck_with_cards(title))
+        return created[0]
+
+    try:
+        report = _import_into(create_deck)
+    except DeckImportError as e:
+        if created: delete_deck_with_cards(created[0])
+        return jsonify({'message': str(e)}), 400
+    if not created: return jsonify({'message': 'File không có thẻ hợp lệ', **report}), 400
+    bump_stats('flashcards')
+    return jsonify({'message': 'Đã nhập bộ thẻ', 'id': str(created[0]), **report}), 201
+
+@flashcards_bp.route('/<deck_id>/import', methods=['POST'])
+def import_into_deck(deck_id):
+    if not get_user_from_token(): return jsonify({'message': 'Chưa đăng nhập'}), 401
+    if 'file' not in request.files: return jsonify({'message': 'Không có file'}), 400
+    deck = db.flashcards.find_one({'_id': ObjectId(deck_id)})
+    if not deck: return jsonify({'message': 'Bộ thẻ không tồn tại'}), 404
+    if 'cards' in deck: migrate_deck(deck)
+    try:
+        report = _import_into(deck_id)
+    except DeckImportError as e:
+        return jsonify({'message': str(e)}), 400
+    return jsonify({'message': 'Đã nhập thẻ', **report}), 200
+
+@flashcards_bp.route('/<deck_id>/export', methods=['GET'])
+def export_deck(deck_id):
+    if not get_user_from_token(): return jsonify({'message': 'Chưa đăng nhập'}), 401
+    deck = db.flashcards.find_one({'_id': ObjectId(deck_id)}, {'title': 1, 'cards': 1})
+    if not deck: return jsonify({'message': 'Bộ thẻ không tồn tại'}), 404
+    if 'cards' in deck: migrate_deck(deck)
+    fmt = detect_format(None, request.args.get('format'))
+    rv = Response(
+        stream_with_context(export_cards(deck_id, fmt)),
+        mimetype='text/tab-separated-values' if fmt == 'tsv' else 'text/csv'
+    )
+    rv.headers.set('Content-Disposition', 'attachment', filename=f'deck-{deck_id}.{fmt}')
+    return rv
+
+# --- Ôn tập ngắt quãng (SM-2) ---
+@flashcards_bp.route('/<deck_id>/review/start', methods=['POST'])
+def start_review(deck_id):
+    user_payload = get_user_from_token()
+    if not user_payload: return jsonify({'message': 'Chưa đăng nhập'}), 401
+    deck = db.flashcards.find_one({'_id': ObjectId(deck_id)})
+    if not deck: return jsonify({'message': 'Bộ thẻ không tồn tại'}), 404
+    if 'cards' in deck: migrate_deck(deck)
+    added = start_deck(user_payload['user_id'], deck_id)
+    return jsonify({'message': 'Đã thêm bộ thẻ vào lịch ôn tập', 'added': added}), 200
+
+@flashcards_bp.route('/review/due', methods=['GET'])
+def get_due_cards():
+    user_payload = get_user_from_token()
+    if not user_payload: return jsonify({'message': 'Chưa đăng nhập'}), 401
+    limit = parse_limit(default=20, maximum=200) or 20
+    return jsonify(due_cards(user_payload['user_id'], limit, request.args.get('deck_id'))), 200
+
+@flashcards_bp.route('/review', methods=['POST'])
+def submit_reviews():
+    user_payload = get_user_from_token()
+    if not user_payload: return jsonify({'message': 'Chưa đăng nhập'}), 401
+    grades = (request.json or {}).get('grades', [])
+    if not isinstance(grades, list): return jsonify({'message': 'Dữ liệu không hợp lệ'}), 400
+    try:
+        updated = record_reviews(user_payload['user_id'], grades)
+    except ReviewError as e:
+        return jsonify({'message': str(e)}), 400
+    return jsonify({'message': 'Đã lưu kết quả ôn tập', 'updated': updated}), 200
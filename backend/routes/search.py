@@ -0,0 +1,15 @@
+# --- FILE: backend/routes/search.py ---
+from flask import Blueprint, request, jsonify
+from services.search import search, SEARCH_TYPES
+
+search_bp = Blueprint('search', __name__)
+
+# GET /api/search?q=ngu phap&type=course,blog&page=1&limit=20
+@search_bp.route('', methods=['GET'])
+def search_all():
+    query = request.args.get('q', '').strip()
+    if not query: return jsonify({'message': 'Thiếu từ khóa tìm kiếm'}), 400
+    types = [t for t in request.args.get('type', '').split(',') if t in SEARCH_TYPES]
+    page = request.args.get('page', 1, type=int)
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 50)
+    return jsonify(search(query, types, page, limit)), 200
@@ -1,4 +1,5 @@
 from pymongo import MongoClient
+from werkzeug.security import generate_password_hash
 import datetime
 
 # 1. Kết nối MongoDB
@@ -18,14 +19,14 @@ def seed_database():
     users = [
         {
             "username": "admin",
-            "password": "123", # Password đơn giản để demo
+            "password": generate_password_hash("123"), # Password đơn giản để demo
             "role": "admin",
             "created_at": datetime.datetime.now(),
             "enrolled_courses": []
         },
         {
             "username": "student",
-            "password": "123",
+            "password": generate_password_hash("123"),
             "role": "user",
             "created_at": datetime.datetime.now(),
             "enrolled_courses": []
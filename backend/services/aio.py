@@ -0,0 +1,327 @@
+# --- FILE: backend/services/aio.py ---
+# Lớp ASGI tối giản cho chế độ phục vụ bất đồng bộ (asgi.py):
+#   - AsyncRouter: khai báo view `async def view(req, **kwargs)` giống Blueprint của Flask,
+#     req là Request của werkzeug (args, headers, get_json(), files, ...) kèm req.user_payload;
+#   - AsyncApp: ứng dụng ASGI, request khớp route async thì chạy trên event loop (AsyncMongoClient),
+#     còn lại chuyển nguyên cho app Flask (WSGI) chạy trên thread pool nên hành vi không đổi.
+#     Body của request chuyển tiếp được đọc dần từ receive (wsgi.input), response gửi về qua queue có giới hạn
+#     nên một upload hay response lớn không bị gom cả vào bộ nhớ.
+# Xác thực, CORS, nén và metrics của route async được xử lý giống các hook của app Flask.
+from concurrent.futures import ThreadPoolExecutor
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.exceptions import HTTPException, RequestEntityTooLarge
+from werkzeug.routing import Map, Rule, BaseConverter
+from werkzeug.wrappers import Request, Response
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import sys
+import threading
+
+from services import metrics
+from services.auth import bearer_token, decode_token
+from services.http_cache import negotiate_encoding, compress_response, compress_async_stream
+
+logger = logging.getLogger(__name__)
+
+# Số phần response của app WSGI chờ gửi tối đa; đầy thì thread WSGI dừng lại chờ client nhận bớt
+WSGI_QUEUE_SIZE = 16
+
+
+def dumps(obj):
+    """Cùng định dạng với current_app.json.dumps (provider mặc định của Flask) nhưng không cần app context"""
+    return json.dumps(obj, default=DefaultJSONProvider.default, ensure_ascii=True, sort_keys=True)
+
+
+def jsonify(data):
+    # Giống jsonify của Flask khi không bật debug: JSON gọn, không khoảng trắng
+    body = json.dumps(data, default=DefaultJSONProvider.default, ensure_ascii=True, sort_keys=True,
+                      separators=(',', ':'))
+    return Response(body + '\n', mimetype='application/json')
+
+
+class AsyncStreamResponse(Response):
+    """Response có body là async iterator (str hoặc bytes), gửi từng phần qua ASGI"""
+
+    def __init__(self, body, **kwargs):
+        super().__init__(**kwargs)
+        self.async_body = body
+
+
+class ObjectIdConverter(BaseConverter):
+    """<oid:name>: chỉ khớp ObjectId (24 ký tự hex), đoạn khác (VD: /courses/created) rơi xuống route của Flask"""
+    regex = '[0-9a-fA-F]{24}'
+
+
+class AsyncRouter:
+    def __init__(self, name):
+        self.name = name
+        self.routes = []  # (rule, methods, view)
+
+    def route(self, rule, methods=('GET',)):
+        def decorator(view):
+            self.routes.append((rule, tuple(methods), view))
+            return view
+        return decorator
+
+
+async def read_body(receive, limit=None):
+    """Cả body cho view async (Request của werkzeug đọc đồng bộ); quá limit byte thì RequestEntityTooLarge"""
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect': break
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if limit and size > limit: raise RequestEntityTooLarge()
+        chunks.append(chunk)
+        if not message.get('more_body'): break
+    return b''.join(chunks)
+
+
+class ReceiveStream(io.RawIOBase):
+    """wsgi.input cho app WSGI: thread WSGI đọc tới đâu thì lấy thêm message từ receive trên event loop tới đó"""
+
+    def __init__(self, receive, loop):
+        self._receive = receive
+        self._loop = loop
+        self._chunk = b''
+        self._done = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._chunk and not self._done:
+            message = asyncio.run_coroutine_threadsafe(self._receive(), self._loop).result()
+            if message['type'] == 'http.disconnect':
+                self._done = True
+            else:
+                self._chunk = message.get('body', b'')
+                self._done = not message.get('more_body')
+        size = min(len(buffer), len(self._chunk))
+        buffer[:size] = self._chunk[:size]
+        self._chunk = self._chunk[size:]
+        return size
+
+
+def build_environ(scope, stream):
+    """
+    WSGI environ từ ASGI scope: dùng cho Request của werkzeug và để chuyển request cho Flask.
+    stream: wsgi.input; body kết thúc khi receive báo hết (wsgi.input_terminated) nên không cần Content-Length.
+    """
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': stream,
+        'wsgi.input_terminated': True,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for raw_name, raw_value in scope.get('headers', []):
+        name = raw_name.decode('latin-1').upper().replace('-', '_')
+        value = raw_value.decode('latin-1')
+        if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            environ[name] = value
+        else:
+            key = f'HTTP_{name}'
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+def _asgi_headers(headers):
+    return [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+
+
+class AsyncApp:
+    """
+    wsgi_app: app Flask xử lý các route không có bản async.
+    config: app.config (SECRET_KEY, CORS_ORIGINS, ASGI_WSGI_THREADS, ASGI_MAX_BODY).
+    on_shutdown: coroutine function gọi khi server tắt (lifespan.shutdown).
+    """
+
+    def __init__(self, wsgi_app, config, on_shutdown=None):
+        self.wsgi_app = wsgi_app
+        self.config = config
+        self.on_shutdown = on_shutdown
+        self.url_map = Map(strict_slashes=False, converters={'oid': ObjectIdConverter})
+        self.views = {}
+        self.executor = ThreadPoolExecutor(max_workers=config.get('ASGI_WSGI_THREADS', 32),
+                                           thread_name_prefix='wsgi')
+
+    def register(self, router, url_prefix=''):
+        for rule, methods, view in router.routes:
+            endpoint = f'{router.name}.{view.__name__}'
+            self.url_map.add(Rule(url_prefix + rule, endpoint=endpoint, methods=methods))
+            self.views[endpoint] = view
+        shadowed = self._shadowed_flask_routes()
+        if shadowed: raise ValueError(f'Route async che mất route Flask: {", ".join(shadowed)}')
+
+    def _shadowed_flask_routes(self):
+        """Route tĩnh của Flask bị một route async có tham số khớp trước (VD: /courses/created và /courses/<id>)"""
+        flask_map = getattr(self.wsgi_app, 'url_map', None)
+        if flask_map is None: return []
+        adapter = self.url_map.bind('localhost')
+        shadowed = []
+        for rule in flask_map.iter_rules():
+            if rule.arguments: continue
+            for method in sorted(rule.methods - {'HEAD', 'OPTIONS'}):
+                try:
+                    matched, _ = adapter.match(rule.rule, method=method, return_rule=True)
+                except HTTPException:
+                    continue
+                if matched.arguments: shadowed.append(f'{method} {rule.rule}')
+        return shadowed
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] != 'http':
+            return
+        environ = build_environ(scope, io.BufferedReader(ReceiveStream(receive, asyncio.get_running_loop())))
+        try:
+            rule, kwargs = self.url_map.bind_to_environ(environ).match(return_rule=True)
+        except HTTPException:
+            # 404 / 405 / OPTIONS (CORS preflight) / redirect: để Flask xử lý như trước
+            return await self._call_wsgi(environ, send)
+        try:
+            body = await read_body(receive, self.config.get('ASGI_MAX_BODY'))
+        except RequestEntityTooLarge as e:
+            return await self._send_response(e.get_response(environ), environ, send)
+        environ.update({'wsgi.input': io.BytesIO(body), 'CONTENT_LENGTH': str(len(body))})
+        await self._call_view(rule, kwargs, environ, send)
+
+    async def _call_view(self, rule, kwargs, environ, send):
+        req = Request(environ)
+        start = metrics.begin_request(rule.rule)
+        token = bearer_token(req.headers.get('Authorization'))
+        req.user_payload = decode_token(token, self.config['SECRET_KEY']) if token else None
+        try:
+            rv = await self.views[rule.endpoint](req, **kwargs)
+            response, status = rv if isinstance(rv, tuple) else (rv, None)
+            if status is not None: response.status_code = status
+        except HTTPException as e:
+            response = e.get_response(environ)
+        except Exception:
+            logger.exception('Lỗi ở route async %s', rule.rule)
+            response = jsonify({'message': 'Lỗi máy chủ'})
+            response.status_code = 500
+        self._apply_cors(req, response)
+        response = self._compress(req, response)
+        response.headers['Server-Timing'] = metrics.server_timing(start)
+        try:
+            await self._send_response(response, environ, send)
+        finally:
+            # Sau khi gửi xong để tính cả thời gian và query khi duyệt body của AsyncStreamResponse
+            metrics.end_request(req.method, response.status_code, start)
+
+    def _apply_cors(self, req, response):
+        origin = req.headers.get('Origin')
+        allowed = self.config.get('CORS_ORIGINS', [])
+        if origin and (origin in allowed or '*' in allowed):
+            response.headers['Access-Control-Allow-Origin'] = origin
+            response.headers['Access-Control-Allow-Credentials'] = 'true'
+            response.vary.add('Origin')
+
+    def _compress(self, req, response):
+        if not isinstance(response, AsyncStreamResponse):
+            return compress_response(response, req.accept_encodings)
+        if response.status_code != 200 or response.mimetype != 'application/json':
+            return response
+        encoding = negotiate_encoding(req.accept_encodings)
+        if encoding != 'identity':
+            response.async_body = compress_async_stream(response.async_body, encoding)
+            response.headers['Content-Encoding'] = encoding
+            response.vary.add('Accept-Encoding')
+        return response
+
+    async def _send_response(self, response, environ, send):
+        headers = response.get_wsgi_headers(environ)
+        if isinstance(response, AsyncStreamResponse):
+            headers.pop('Content-Length', None)
+            await send({'type': 'http.response.start', 'status': response.status_code,
+                        'headers': _asgi_headers(headers.to_wsgi_list())})
+            async for chunk in response.async_body:
+                if isinstance(chunk, str): chunk = chunk.encode('utf-8')
+                if chunk: await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+        body = b'' if response.status_code == 304 else response.get_data()
+        await send({'type': 'http.response.start', 'status': response.status_code,
+                    'headers': _asgi_headers(headers.to_wsgi_list())})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _call_wsgi(self, environ, send):
+        """
+        Chạy app Flask trên thread pool. Cả response được duyệt trong cùng một thread
+        (stream_with_context cần giữ context trên một thread), từng phần gửi về event loop qua queue.
+        Queue có giới hạn: thread WSGI chờ put xong mới sinh phần tiếp theo; gửi lỗi (client đóng kết nối)
+        thì thread dừng duyệt response thay vì chạy tiếp không ai nhận.
+        """
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=WSGI_QUEUE_SIZE)
+        started = loop.create_future()
+        headers_sent = []
+        closed = threading.Event()
+
+        def put(item):
+            if closed.is_set(): raise ConnectionAbortedError('Client đã đóng kết nối')
+            asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+        def start_response(status, headers, exc_info=None):
+            headers_sent.append(True)
+            loop.call_soon_threadsafe(started.set_result, (int(status.split(' ', 1)[0]), headers))
+            return put
+
+        def run():
+            try:
+                iterable = self.wsgi_app(environ, start_response)
+                try:
+                    for chunk in iterable:
+                        if chunk: put(chunk)
+                finally:
+                    if hasattr(iterable, 'close'): iterable.close()
+            except ConnectionAbortedError:
+                pass
+            except BaseException as e:
+                if not headers_sent: loop.call_soon_threadsafe(started.set_exception, e)
+                logger.exception('Lỗi khi chạy app WSGI')
+            finally:
+                with contextlib.suppress(ConnectionAbortedError): put(None)
+
+        loop.run_in_executor(self.executor, run)
+        try:
+            status, headers = await started
+            await send({'type': 'http.response.start', 'status': status, 'headers': _asgi_headers(headers)})
+            while (chunk := await queue.get()) is not None:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            # Thread WSGI có thể đang chờ put vào queue đầy: lấy bớt để nó thấy closed và dừng
+            closed.set()
+            while not queue.empty(): queue.get_nowait()
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.on_shutdown: await self.on_shutdown()
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
@@ -0,0 +1,187 @@
+# --- FILE: backend/services/analytics.py ---
+# Thống kê kết quả thi cho giáo viên, được tính dồn (incremental) mỗi lần nộp bài:
+#   exam_analytics: {_id: exam_id, creator_id, title, total_questions, attempts, score_sum,
+#                    histogram: {'<điểm>': n}, question_correct: {'<câu>': n}}
+#   exam_best:      {_id: 'exam_id:user_id', exam_id, user_id, username, best_score, best_duration, attempts}
+#                   (ghi bởi services.leaderboard, dùng cho bảng xếp hạng)
+# rebuild() dựng lại cả hai từ results bằng aggregation pipeline (dữ liệu cũ / sửa sai lệch).
+from flask.cli import AppGroup
+from pymongo import UpdateOne, ReplaceOne
+from database import get_db
+from services.leaderboard import (
+    record_best, rebuild_counts, normalize_duration, LEADERBOARD_SORT, MISSING_DURATION
+)
+import click
+import datetime
+
+db = get_db()
+
+
+def _analytics_update(result):
+    """(filter, update) upsert vào exam_analytics cho một bài nộp"""
+    exam_id = result['exam_id']
+    score = result['score']
+    inc = {'attempts': 1, 'score_sum': score, f'histogram.{score}': 1}
+    for i, correct in enumerate(result.get('question_correct', [])):
+        if correct: inc[f'question_correct.{i}'] = 1
+    return {'_id': exam_id}, {
+        '$inc': inc,
+        '$set': {
+            'creator_id': result.get('creator_id'),
+            'title': result.get('exam_title'),
+            'total_questions': result['total_questions'],
+            'updated_at': result['timestamp'],
+        },
+    }
+
+
+def record_submission(result):
+    """Cập nhật số liệu tổng hợp cho một bài nộp (result là document vừa insert vào results)"""
+    db.exam_analytics.update_one(*_analytics_update(result), upsert=True)
+    record_best(result)
+
+
+def _median_from_histogram(histogram):
+    counts = sorted((int(score), n) for score, n in histogram.items() if n > 0)
+    total = sum(n for _, n in counts)
+    if not total: return None
+    targets = [(total - 1) // 2, total // 2]
+    values = []
+    seen = 0
+    for score, n in counts:
+        while targets and targets[0] < seen + n:
+            values.append(score)
+            targets.pop(0)
+        seen += n
+    return sum(values) / len(values)
+
+
+def summarize(doc):
+    """Chuyển document exam_analytics thành dữ liệu trả về cho dashboard"""
+    attempts = doc.get('attempts', 0)
+    total_questions = doc.get('total_questions', 0)
+    histogram = doc.get('histogram', {})
+    question_correct = doc.get('question_correct', {})
+    return {
+        'exam_id': doc['_id'],
+        'title': doc.get('title'),
+        'total_questions': total_questions,
+        'attempts': attempts,
+        'mean_score': round(doc.get('score_sum', 0) / attempts, 2) if attempts else None,
+        'median_score': _median_from_histogram(histogram),
+        'histogram': [{'score': s, 'count': histogram.get(str(s), 0)} for s in range(total_questions + 1)],
+        # Độ khó = tỉ lệ làm đúng của từng câu (thấp = khó)
+        'question_difficulty': [
+            {'index': i, 'correct_rate': round(question_correct.get(str(i), 0) / attempts, 3) if attempts else None}
+            for i in range(total_questions)
+        ],
+    }
+
+
+def get_teacher_summaries(creator_id):
+    return [summarize(doc) for doc in db.exam_analytics.find({'creator_id': creator_id}).sort('title', 1)]
+
+
+def get_exam_summary(exam_id):
+    doc = db.exam_analytics.find_one({'_id': exam_id})
+    return summarize(doc) if doc else None
+
+
+def get_best_attempts(exam_id, limit=100):
+    cursor = db.exam_best.find({'exam_id': exam_id}, {'_id': 0}).sort(LEADERBOARD_SORT).limit(limit)
+    return list(cursor)
+
+
+def rebuild(exam_id=None):
+    """
+    Dựng lại exam_analytics / exam_best từ toàn bộ results bằng aggregation pipeline.
+    Không xóa trước rồi chèn lại (bài nộp đồng thời sẽ mất $inc hoặc gặp DuplicateKeyError): document cũ được
+    đánh dấu stale_since, ghi đè bằng replace/update upsert (bỏ dấu), cuối cùng chỉ xóa những document còn dấu.
+    """
+    match = {'$match': {'exam_id': exam_id}} if exam_id else {'$match': {}}
+    now = datetime.datetime.now()
+    db.exam_analytics.update_many({'_id': exam_id} if exam_id else {}, {'$set': {'stale_since': now}})
+    db.exam_best.update_many(match['$match'], {'$set': {'stale_since': now}})
+
+    totals = db.results.aggregate([
+        match,
+        {'$group': {
+            '_id': '$exam_id',
+            'creator_id': {'$last': '$creator_id'},
+            'title': {'$last': '$exam_title'},
+            'total_questions': {'$max': '$total_questions'},
+            'attempts': {'$sum': 1},
+            'score_sum': {'$sum': '$score'},
+        }},
+    ])
+    histograms = db.results.aggregate([
+        match,
+        {'$group': {'_id': {'exam_id': '$exam_id', 'score': '$score'}, 'count': {'$sum': 1}}},
+    ])
+    # Bài nộp cũ không có question_correct sẽ bị $unwind bỏ qua
+    difficulty = db.results.aggregate([
+        match,
+        {'$unwind': {'path': '$question_correct', 'includeArrayIndex': 'index'}},
+        {'$match': {'question_correct': True}},
+        {'$group': {'_id': {'exam_id': '$exam_id', 'index': '$index'}, 'count': {'$sum': 1}}},
+    ])
+    # Bài tốt nhất của mỗi người: điểm cao nhất, cùng điểm thì thời gian ngắn nhất
+    best = db.results.aggregate([
+        match,
+        {'$addFields': {'duration': {'$ifNull': ['$duration_taken', MISSING_DURATION]}}},
+        {'$sort': {'score': -1, 'duration': 1}},
+        {'$group': {
+            '_id': {'exam_id': '$exam_id', 'user_id': '$user_id'},
+            'username': {'$first': '$username'},
+            'best_score': {'$first': '$score'},
+            'best_duration': {'$first': '$duration'},
+            'attempts': {'$sum': 1},
+        }},
+    ])
+
+    docs = {}
+    for t in totals:
+        docs[t['_id']] = {**t, 'histogram': {}, 'question_correct': {}, 'updated_at': now}
+    for h in histograms:
+        doc = docs.get(h['_id']['exam_id'])
+        if doc: doc['histogram'][str(h['_id']['score'])] = h['count']
+    for d in difficulty:
+        doc = docs.get(d['_id']['exam_id'])
+        if doc: doc['question_correct'][str(d['_id']['index'])] = d['count']
+
+    analytics_ops = [ReplaceOne({'_id': doc['_id']}, doc, upsert=True) for doc in docs.values()]
+    for i in range(0, len(analytics_ops), 1000):
+        db.exam_analytics.bulk_write(analytics_ops[i:i + 1000], ordered=False)
+    ops = [
+        UpdateOne(
+            {'_id': f"{b['_id']['exam_id']}:{b['_id']['user_id']}"},
+            {'$set': {
+                'exam_id': b['_id']['exam_id'], 'user_id': b['_id']['user_id'],
+                'username': b['username'], 'best_score': b['best_score'],
+                'best_duration': normalize_duration(b['best_duration']), 'attempts': b['attempts'],
+            }, '$unset': {'stale_since': ''}},
+            upsert=True
+        )
+        for b in best
+    ]
+    for i in range(0, len(ops), 1000):
+        db.exam_best.bulk_write(ops[i:i + 1000], ordered=False)
+    # Đề / học viên không còn bài nộp nào
+    db.exam_analytics.delete_many({'stale_since': now, **({'_id': exam_id} if exam_id else {})})
+    db.exam_best.delete_many({**match['$match'], 'stale_since': now})
+    rebuild_counts(exam_id)
+    return len(docs)
+
+
+analytics_cli = AppGroup('analytics', help='Thống kê kết quả thi')
+
+@analytics_cli.command('rebuild')
+@click.option('--exam-id', default=None, help='Chỉ dựng lại một đề thi')
+def rebuild_command(exam_id):
+    click.echo(f'Đã dựng lại thống kê cho {rebuild(exam_id)} đề thi')
+
+@analytics_cli.command('leaderboards')
+@click.option('--exam-id', default=None, help='Chỉ đếm lại một đề thi')
+def leaderboards_command(exam_id):
+    # Đề có exam_best từ trước khi có bảng xếp hạng: đếm lại bộ đếm hạng mà không dựng lại thống kê
+    click.echo(f'Đã đếm lại bảng xếp hạng cho {rebuild_counts(exam_id)} đề thi')
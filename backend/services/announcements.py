@@ -0,0 +1,106 @@
+# --- FILE: backend/services/announcements.py ---
+# Thông báo của khóa học nằm trong collection riêng thay vì mảng `announcements` trong document khóa học
+# (mảng đó lớn dần theo thời gian, làm mọi lần đọc/ghi khóa học nặng thêm).
+#   announcements: {_id, course_id, content, date, sender, sender_id}
+# Chi tiết khóa học chỉ nhúng LATEST_EMBEDDED thông báo mới nhất; phần cũ hơn lấy theo trang
+# (keyset (date, _id) giảm dần) qua GET /api/courses/<id>/announcements.
+# Khóa học cũ còn mảng nhúng được chuyển dần khi được đọc, hoặc một lần bằng `flask announcements migrate`.
+from flask.cli import AppGroup
+from bson.objectid import ObjectId
+from database import get_db, get_async_db
+from services.pagination import time_cursor_filter, encode_time_cursor
+import click
+import datetime
+
+db = get_db()
+adb = get_async_db()
+
+LATEST_EMBEDDED = 5
+ANNOUNCEMENT_SORT = [('date', -1), ('_id', -1)]
+
+
+def serialize_announcement(a):
+    # Giữ định dạng cũ của phần tử trong mảng nhúng: {id, content, date (ISO), sender}
+    date = a.get('date')
+    return {
+        'id': str(a['_id']),
+        'content': a.get('content'),
+        'date': date.isoformat() if isinstance(date, datetime.datetime) else date,
+        'sender': a.get('sender'),
+    }
+
+
+def cursor_of(a):
+    return encode_time_cursor(a.get('date'), a['_id'])
+
+
+def add_announcement(course_id, content, sender, sender_id=None):
+    doc = {'course_id': str(course_id), 'content': content, 'date': datetime.datetime.now(),
+           'sender': sender, 'sender_id': sender_id}
+    db.announcements.insert_one(doc)
+    return doc
+
+
+def page_query(course_id, cursor=None):
+    """Filter cho một trang (mới nhất trước); CursorError nếu cursor sai"""
+    return {'course_id': str(course_id), **time_cursor_filter(cursor, field='date')}
+
+
+def _embedded(docs):
+    """Các thông báo mới nhất để nhúng vào chi tiết khóa học (cũ -> mới như mảng trước đây) và cursor trang sau"""
+    items = docs[:LATEST_EMBEDDED]
+    next_cursor = cursor_of(items[-1]) if len(docs) > LATEST_EMBEDDED else None
+    return [serialize_announcement(a) for a in reversed(items)], next_cursor
+
+
+def latest(course_id):
+    docs = list(db.announcements.find({'course_id': str(course_id)}).sort(ANNOUNCEMENT_SORT).limit(LATEST_EMBEDDED + 1))
+    return _embedded(docs)
+
+
+async def latest_async(course_id):
+    cursor = adb.announcements.find({'course_id': str(course_id)}).sort(ANNOUNCEMENT_SORT).limit(LATEST_EMBEDDED + 1)
+    return _embedded(await cursor.to_list())
+
+
+def delete_course_announcements(course_id):
+    db.announcements.delete_many({'course_id': str(course_id)})
+
+
+def _legacy_docs(course):
+    docs = []
+    for a in course.get('announcements') or []:
+        try:
+            date = datetime.datetime.fromisoformat(a['date']) if isinstance(a.get('date'), str) else a.get('date')
+        except ValueError:
+            date = None
+        oid = ObjectId(a['id']) if ObjectId.is_valid(a.get('id')) else ObjectId()
+        docs.append({'_id': oid, 'course_id': str(course['_id']), 'content': a.get('content'),
+                     'date': date, 'sender': a.get('sender'), 'sender_id': None})
+    return docs
+
+
+def migrate_course(course):
+    """
+    Chuyển mảng announcements nhúng của một khóa học sang collection (giữ nguyên id).
+    Ghi trước rồi mới $unset có điều kiện nên chạy đồng thời/lặp lại cũng không mất hay nhân đôi dữ liệu.
+    """
+    if 'announcements' not in course: return False
+    docs = _legacy_docs(course)
+    for doc in docs:
+        db.announcements.update_one({'_id': doc['_id']}, {'$setOnInsert': doc}, upsert=True)
+    result = db.courses.update_one({'_id': course['_id'], 'announcements': {'$exists': True}},
+                                   {'$unset': {'announcements': ''}})
+    return bool(result.modified_count)
+
+
+def migrate_all():
+    return sum(1 for course in db.courses.find({'announcements': {'$exists': True}}, {'announcements': 1})
+               if migrate_course(course))
+
+
+announcements_cli = AppGroup('announcements', help='Thông báo khóa học')
+
+@announcements_cli.command('migrate')
+def migrate_command():
+    click.echo(f'Đã chuyển thông báo của {migrate_all()} khóa học sang collection announcements')
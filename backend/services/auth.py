@@ -0,0 +1,96 @@
+# --- FILE: backend/services/auth.py ---
+# Lớp xác thực dùng chung: giải mã JWT một lần cho mỗi request (before_request)
+# và tra user qua cache LRU/TTL thay vì db.users.find_one ở từng handler.
+# Khóa cache gắn với version 'users' dùng chung (collection_versions): invalidate_user ở worker nào thì
+# mọi worker cũng bỏ bản cũ sau tối đa TTL của version_cache (vài giây) thay vì giữ tới hết TTL của user_cache.
+from flask import request, current_app, g, has_app_context
+from bson.objectid import ObjectId
+from database import get_db, get_async_db
+from services.cache import TTLCache
+from services.http_cache import versioned_key, versioned_key_async, bump_version
+import jwt
+
+db = get_db()
+adb = get_async_db()
+
+# Không cache password: các handler cần password (đổi mật khẩu, đăng nhập) vẫn đọc thẳng từ DB
+USER_PROJECTION = {'password': 0}
+user_cache = TTLCache(maxsize=2048, ttl=60)
+
+
+def bearer_token(auth_header):
+    parts = (auth_header or '').split(' ')
+    return parts[1] if len(parts) == 2 and parts[1] else None
+
+
+def decode_token(token, secret_key):
+    """Payload của JWT, None nếu token không hợp lệ hoặc hết hạn"""
+    try:
+        return jwt.decode(token, secret_key, algorithms=['HS256'])
+    except jwt.PyJWTError:
+        return None
+
+
+def _read_token():
+    token = bearer_token(request.headers.get('Authorization'))
+    if token:
+        return token
+    # Thẻ <a> tải tài liệu không gửi được header Authorization -> cho phép ?token= ở blueprint courses
+    if request.blueprint == 'courses':
+        return request.args.get('token')
+    return None
+
+
+def load_token_payload():
+    """before_request: giải mã token một lần, lưu vào g.user_payload (None nếu không có/không hợp lệ)"""
+    g.user_payload = None
+    token = _read_token()
+    if not token: return
+    g.user_payload = decode_token(token, current_app.config['SECRET_KEY'])
+
+
+def get_user_from_token():
+    """Payload JWT của request hiện tại (giữ tên cũ để các blueprint dùng như trước)"""
+    return g.get('user_payload')
+
+
+def load_user(user_id):
+    """Tra user theo id qua cache; trả về bản sao để handler có thể sửa mà không làm bẩn cache"""
+    if not user_id or not ObjectId.is_valid(user_id): return None
+    key = versioned_key('users', user_id)
+    user = user_cache.get_or_load(key, lambda: db.users.find_one({'_id': ObjectId(user_id)}, USER_PROJECTION))
+    return dict(user) if user else None
+
+
+async def load_user_async(user_id):
+    """Như load_user, dùng chung cache, cho chế độ ASGI"""
+    if not user_id or not ObjectId.is_valid(user_id): return None
+    key = await versioned_key_async('users', user_id)
+    user = user_cache.get(key)
+    if user is None:
+        user = await adb.users.find_one({'_id': ObjectId(user_id)}, USER_PROJECTION)
+        if user is not None: user_cache.set(key, user)
+    return dict(user) if user else None
+
+
+def get_current_user():
+    """User (không kèm password) của request hiện tại, tra tối đa một lần mỗi request"""
+    if 'current_user' not in g:
+        payload = get_user_from_token()
+        g.current_user = load_user(payload['user_id']) if payload else None
+    return g.current_user
+
+
+def invalidate_user(*user_ids):
+    """
+    Gọi sau khi xóa user, đổi mật khẩu, đổi role hoặc thay đổi dữ liệu user được cache.
+    Tăng version 'users' một lần cho cả nhóm: mọi khóa cũ trong user_cache (ở mọi worker) không còn được dùng.
+    """
+    bump_version('users')
+    ids = {str(user_id) for user_id in user_ids}
+    if has_app_context() and g.get('current_user') and str(g.current_user['_id']) in ids:
+        g.pop('current_user', None)
+
+
+def init_auth(app):
+    app.before_request(load_token_payload)
@@ -0,0 +1,53 @@
+# --- FILE: backend/services/cache.py ---
+from collections import OrderedDict
+import threading
+import time
+
+
+class TTLCache:
+    """
+    Cache LRU có giới hạn số phần tử và thời gian sống (TTL), an toàn khi dùng nhiều thread.
+    Chỉ sống trong một process: mỗi worker có bản riêng, TTL giới hạn độ "cũ" giữa các worker.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_load(self, key, loader):
+        """Lấy từ cache, nếu thiếu thì gọi loader(); kết quả None không được cache"""
+        value = self.get(key)
+        if value is None:
+            value = loader()
+            if value is not None:
+                self.set(key, value)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
@@ -0,0 +1,55 @@
+# --- FILE: backend/services/course_cards.py ---
+# "Thẻ" khóa học: bản tóm tắt nhỏ (không có announcements/materials) dùng cho /api/auth/me,
+# cache theo course id trong process và xóa khỏi cache khi khóa học thay đổi.
+from bson.objectid import ObjectId
+from database import get_db, get_async_db
+from services.cache import TTLCache
+
+db = get_db()
+adb = get_async_db()
+
+COURSE_CARD_PROJECTION = {
+    'title': 1, 'description': 1, 'level': 1, 'schedule': 1, 'price': 1,
+    'image': 1, 'instructor_id': 1, 'instructor_name': 1,
+}
+course_card_cache = TTLCache(maxsize=4096, ttl=300)
+
+
+def _to_card(course):
+    card = dict(course)
+    card['_id'] = str(card['_id'])
+    return card
+
+
+def _cached_cards(course_ids):
+    ids = [cid for cid in course_ids if ObjectId.is_valid(cid)]
+    cards = {cid: course_card_cache.get(cid) for cid in ids}
+    missing = [ObjectId(cid) for cid, card in cards.items() if card is None]
+    return ids, cards, missing
+
+
+def _add_card(cards, course):
+    card = _to_card(course)
+    course_card_cache.set(card['_id'], card)
+    cards[card['_id']] = card
+
+
+def get_course_cards(course_ids):
+    """Trả về thẻ khóa học theo đúng thứ tự course_ids, chỉ query MongoDB cho các id chưa có trong cache"""
+    ids, cards, missing = _cached_cards(course_ids)
+    if missing:
+        for course in db.courses.find({'_id': {'$in': missing}}, COURSE_CARD_PROJECTION):
+            _add_card(cards, course)
+    return [dict(cards[cid]) for cid in ids if cards.get(cid)]
+
+
+async def get_course_cards_async(course_ids):
+    ids, cards, missing = _cached_cards(course_ids)
+    if missing:
+        async for course in adb.courses.find({'_id': {'$in': missing}}, COURSE_CARD_PROJECTION):
+            _add_card(cards, course)
+    return [dict(cards[cid]) for cid in ids if cards.get(cid)]
+
+
+def invalidate_course_card(course_id):
+    course_card_cache.invalidate(str(course_id))
@@ -0,0 +1,96 @@
+# --- FILE: backend/services/deck_io.py ---
+# Nhập / xuất bộ thẻ dạng CSV hoặc TSV theo kiểu stream:
+# nhập đọc file upload từng dòng và ghi theo batch insert_many(ordered=False),
+# xuất sinh từng đoạn CSV từ cursor nên bộ thẻ lớn cỡ nào bộ nhớ cũng không tăng.
+from pymongo import ASCENDING
+from pymongo.errors import BulkWriteError
+from database import get_db
+from services.decks import clean_card, insert_cards, CARD_FIELDS
+import csv
+import io
+
+db = get_db()
+
+IMPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+DELIMITERS = {'csv': ',', 'tsv': '\t'}
+
+
+class DeckImportError(ValueError):
+    """File nhập không đọc được (không phải văn bản UTF-8, CSV hỏng)"""
+
+
+def detect_format(filename, requested=None):
+    if requested in DELIMITERS: return requested
+    if filename and filename.lower().endswith(('.tsv', '.tab')): return 'tsv'
+    return 'csv'
+
+
+def import_cards(deck_id, stream, fmt='csv'):
+    """
+    Đọc các dòng `front, back[, example]` (dòng tiêu đề front/back được bỏ qua) và thêm vào bộ thẻ.
+    deck_id có thể là hàm tạo bộ thẻ: chỉ được gọi khi đã đọc được batch thẻ hợp lệ đầu tiên.
+    Trả về {'imported': n, 'failed': n, 'errors': [{'row': số dòng, 'error': ...}]};
+    DeckImportError nếu file không đọc được (các batch đọc được trước đó vẫn đã ghi).
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    reader = csv.reader(text, delimiter=DELIMITERS[fmt])
+    report = {'imported': 0, 'failed': 0, 'errors': []}
+    batch, batch_rows = [], []
+    target = None if callable(deck_id) else deck_id
+
+    def error(row_number, message):
+        report['failed'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append({'row': row_number, 'error': message})
+
+    def flush():
+        nonlocal target
+        if target is None: target = deck_id()
+        try:
+            report['imported'] += insert_cards(target, batch, ordered=False)
+        except BulkWriteError as e:
+            report['imported'] += e.details.get('nInserted', 0)
+            for write_error in e.details.get('writeErrors', []):
+                error(batch_rows[write_error['index']], write_error.get('errmsg', 'Lỗi ghi'))
+
+    try:
+        for row_number, row in enumerate(reader, start=1):
+            if not any(cell.strip() for cell in row): continue
+            if row_number == 1 and [c.strip().lower() for c in row[:2]] == ['front', 'back']: continue
+            if len(row) < 2:
+                error(row_number, 'Thiếu cột back')
+                continue
+            card = clean_card(dict(zip(CARD_FIELDS, (cell.strip() for cell in row))))
+            if not card.get('front') or not card.get('back'):
+                error(row_number, 'front và back không được để trống')
+                continue
+            batch.append(card)
+            batch_rows.append(row_number)
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                flush()
+                batch, batch_rows = [], []
+    except UnicodeDecodeError:
+        raise DeckImportError('File phải là văn bản UTF-8')
+    except csv.Error as e:
+        raise DeckImportError(f'File {fmt.upper()} không hợp lệ: {e}')
+    if batch:
+        flush()
+    return report
+
+
+def export_cards(deck_id, fmt='csv'):
+    """Generator trả về từng đoạn CSV/TSV của bộ thẻ, theo thứ tự position"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=DELIMITERS[fmt])
+    writer.writerow(CARD_FIELDS)
+    cursor = db.flashcard_cards.find(
+        {'deck_id': deck_id}, {'_id': 0, **{f: 1 for f in CARD_FIELDS}}
+    ).sort('position', ASCENDING).batch_size(IMPORT_BATCH_SIZE)
+    for i, card in enumerate(cursor, start=1):
+        writer.writerow([card.get(f, '') for f in CARD_FIELDS])
+        if i % 500 == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+    yield buffer.getvalue()
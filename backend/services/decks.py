@@ -0,0 +1,82 @@
+# --- FILE: backend/services/decks.py ---
+# Bộ thẻ flashcard: document trong `flashcards` chỉ giữ thông tin bộ thẻ (title, card_count),
+# từng thẻ nằm trong `flashcard_cards` {deck_id, position, front, back, example}
+# nên bộ thẻ hàng nghìn từ không chạm giới hạn 16MB và đọc được theo trang.
+from flask.cli import AppGroup
+from bson.objectid import ObjectId
+from pymongo import ReturnDocument
+from database import get_db
+from services.search import index_document, remove_document
+import click
+
+db = get_db()
+
+CARD_FIELDS = ('front', 'back', 'example')
+
+
+def clean_card(card):
+    return {field: card[field] for field in CARD_FIELDS if card.get(field) not in (None, '')}
+
+
+def reserve_positions(deck_id, count):
+    """Tăng card_count nguyên tử và trả về vị trí bắt đầu cho `count` thẻ mới"""
+    deck = db.flashcards.find_one_and_update(
+        {'_id': ObjectId(deck_id)},
+        {'$inc': {'card_count': count}},
+        projection={'card_count': 1},
+        return_document=ReturnDocument.BEFORE
+    )
+    if deck is None: return None
+    return deck.get('card_count', 0)
+
+
+def insert_cards(deck_id, cards, ordered=True):
+    """Thêm các thẻ (đã clean) vào cuối bộ thẻ, trả về số thẻ đã ghi"""
+    if not cards: return 0
+    start = reserve_positions(deck_id, len(cards))
+    if start is None: return 0
+    docs = [{**card, 'deck_id': str(deck_id), 'position': start + i} for i, card in enumerate(cards)]
+    return len(db.flashcard_cards.insert_many(docs, ordered=ordered).inserted_ids)
+
+
+def create_deck(title, cards=(), **fields):
+    deck = {'title': title, 'card_count': 0, **fields}
+    deck_id = db.flashcards.insert_one(deck).inserted_id
+    insert_cards(deck_id, [clean_card(c) for c in cards])
+    index_document('flashcard', {'_id': deck_id, **deck})
+    return deck_id
+
+
+def delete_deck(deck_id):
+    result = db.flashcards.delete_one({'_id': ObjectId(deck_id)})
+    db.flashcard_cards.delete_many({'deck_id': str(deck_id)})
+    db.flashcard_reviews.delete_many({'deck_id': str(deck_id)})
+    remove_document('flashcard', deck_id)
+    return result.deleted_count
+
+
+def migrate_deck(deck):
+    """Chuyển mảng `cards` nhúng (định dạng cũ) của một bộ thẻ sang flashcard_cards"""
+    cards = deck.get('cards')
+    if cards is None: return 0
+    # Gỡ mảng cards trước (có điều kiện) để hai request cùng lúc không chuyển hai lần
+    result = db.flashcards.update_one(
+        {'_id': deck['_id'], 'cards': {'$exists': True}},
+        {'$unset': {'cards': ''}, '$set': {'card_count': 0}}
+    )
+    if result.modified_count == 0: return 0
+    return insert_cards(deck['_id'], [clean_card(c) for c in cards])
+
+
+def migrate_all():
+    migrated = 0
+    for deck in db.flashcards.find({'cards': {'$exists': True}}):
+        if migrate_deck(deck): migrated += 1
+    return migrated
+
+
+flashcards_cli = AppGroup('flashcards', help='Quản lý bộ thẻ flashcard')
+
+@flashcards_cli.command('migrate')
+def migrate_command():
+    click.echo(f'Đã chuyển {migrate_all()} bộ thẻ sang collection flashcard_cards')
@@ -0,0 +1,185 @@
+# --- FILE: backend/services/enrollments.py ---
+# Ghi danh: mỗi cặp (khóa học, học viên) là một document trong `enrollments`
+#   {_id, course_id, user_id, username, enrolled_at}
+# với unique index (course_id, user_id) cho danh sách lớp và (user_id, course_id) cho
+# "khóa học của tôi" / kiểm tra quyền. courses.enrollment_count được cập nhật cùng lúc ghi danh.
+# Mảng users.enrolled_courses (định dạng cũ) vẫn được tính là đã ghi danh cho tới khi chạy
+# `flask enrollments migrate`; dữ liệu mới không ghi vào mảng đó nữa.
+from flask.cli import AppGroup
+from bson.objectid import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from database import get_db, get_async_db
+from services.auth import invalidate_user
+import click
+import csv
+import datetime
+import io
+
+db = get_db()
+adb = get_async_db()
+
+IMPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+ROSTER_PROJECTION = {'_id': 0, 'user_id': 1, 'username': 1, 'enrolled_at': 1}
+
+
+def _enroll_op(course_id, user, now):
+    key = {'course_id': str(course_id), 'user_id': str(user['_id'])}
+    return UpdateOne(key, {'$setOnInsert': {**key, 'username': user.get('username'), 'enrolled_at': now}},
+                     upsert=True)
+
+
+def enroll_users(course_id, users):
+    """
+    Ghi danh nhiều user (document có _id, username) bằng một bulk_write upsert.
+    Trả về số lượt ghi danh mới (user đã có trong lớp không tính, không ghi lại).
+    """
+    if not users: return 0
+    now = datetime.datetime.now()
+    try:
+        result = db.enrollments.bulk_write([_enroll_op(course_id, u, now) for u in users], ordered=False)
+        added = result.upserted_count
+    except BulkWriteError as e:
+        # Hai request ghi danh cùng một người cùng lúc: unique index chặn bản ghi thứ hai
+        added = e.details.get('nUpserted', 0)
+    if added: db.courses.update_one({'_id': ObjectId(course_id)}, {'$inc': {'enrollment_count': added}})
+    return added
+
+
+def enroll(course_id, user):
+    return enroll_users(course_id, [user]) == 1
+
+
+def unenroll(course_id, user_id):
+    """False nếu user không có trong khóa học (kể cả id không hợp lệ)"""
+    if not ObjectId.is_valid(course_id) or not ObjectId.is_valid(user_id): return False
+    result = db.enrollments.delete_one({'course_id': str(course_id), 'user_id': str(user_id)})
+    if result.deleted_count:
+        db.courses.update_one({'_id': ObjectId(course_id)}, {'$inc': {'enrollment_count': -1}})
+    # Dữ liệu cũ: bỏ luôn khỏi mảng nhúng (nếu có)
+    legacy = db.users.update_one({'_id': ObjectId(user_id)}, {'$pull': {'enrolled_courses': str(course_id)}})
+    if legacy.modified_count: invalidate_user(user_id)
+    return bool(result.deleted_count or legacy.modified_count)
+
+
+def _membership(user, course_id):
+    return {'user_id': str(user['_id']), 'course_id': str(course_id)}
+
+
+def is_enrolled(user, course_id):
+    if str(course_id) in user.get('enrolled_courses', []): return True
+    return db.enrollments.count_documents(_membership(user, course_id), limit=1) > 0
+
+
+async def is_enrolled_async(user, course_id):
+    if str(course_id) in user.get('enrolled_courses', []): return True
+    return await adb.enrollments.count_documents(_membership(user, course_id), limit=1) > 0
+
+
+def _merge_ids(user, docs):
+    ids = [d['course_id'] for d in docs]
+    seen = set(ids)
+    return ids + [cid for cid in user.get('enrolled_courses', []) if cid not in seen]
+
+
+def enrolled_course_ids(user):
+    """Id các khóa học user đã ghi danh (query chỉ đọc index user_course)"""
+    docs = db.enrollments.find({'user_id': str(user['_id'])}, {'_id': 0, 'course_id': 1})
+    return _merge_ids(user, docs)
+
+
+async def enrolled_course_ids_async(user):
+    docs = await adb.enrollments.find({'user_id': str(user['_id'])}, {'_id': 0, 'course_id': 1}).to_list()
+    return _merge_ids(user, docs)
+
+
+def roster_query(course_id, after=None):
+    query = {'course_id': str(course_id)}
+    if after: query['user_id'] = {'$gt': str(after)}
+    return query
+
+
+def delete_course_enrollments(course_id):
+    db.enrollments.delete_many({'course_id': str(course_id)})
+    db.users.update_many({'enrolled_courses': str(course_id)}, {'$pull': {'enrolled_courses': str(course_id)}})
+
+
+def remove_user(user_id):
+    """Xóa mọi lượt ghi danh của một user (khi xóa tài khoản), trừ lại enrollment_count"""
+    course_ids = [d['course_id'] for d in db.enrollments.find({'user_id': str(user_id)}, {'_id': 0, 'course_id': 1})]
+    if not course_ids: return 0
+    db.enrollments.delete_many({'user_id': str(user_id)})
+    db.courses.update_many({'_id': {'$in': [ObjectId(c) for c in course_ids if ObjectId.is_valid(c)]}},
+                           {'$inc': {'enrollment_count': -1}})
+    return len(course_ids)
+
+
+def import_roster(course_id, stream):
+    """
+    Ghi danh theo danh sách lớp: CSV mỗi dòng một username (cột đầu; dòng tiêu đề `username` được bỏ qua).
+    Mỗi lô IMPORT_BATCH_SIZE tên tốn một query users ($in) và một bulk_write.
+    Trả về {'enrolled': n, 'already_enrolled': n, 'not_found': n, 'errors': [{'row', 'error'}]}.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    report = {'enrolled': 0, 'already_enrolled': 0, 'not_found': 0, 'errors': []}
+    batch = {}  # username -> số dòng
+
+    def flush():
+        users = list(db.users.find({'username': {'$in': list(batch)}}, {'username': 1}))
+        added = enroll_users(course_id, users)
+        report['enrolled'] += added
+        report['already_enrolled'] += len(users) - added
+        for username in set(batch) - {u['username'] for u in users}:
+            report['not_found'] += 1
+            if len(report['errors']) < MAX_REPORTED_ERRORS:
+                report['errors'].append({'row': batch[username], 'error': f'Không có user {username}'})
+
+    for row_number, row in enumerate(csv.reader(text), start=1):
+        username = row[0].strip() if row else ''
+        if not username or (row_number == 1 and username.lower() == 'username'): continue
+        batch.setdefault(username, row_number)
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            flush()
+            batch = {}
+    if batch:
+        flush()
+    report['errors'].sort(key=lambda e: e['row'])
+    return report
+
+
+def migrate_all():
+    """Chuyển users.enrolled_courses sang enrollments rồi tính lại enrollment_count"""
+    migrated = 0
+    for user in db.users.find({'enrolled_courses': {'$exists': True}}, {'username': 1, 'enrolled_courses': 1}):
+        for course_id in user.get('enrolled_courses') or []:
+            if not ObjectId.is_valid(course_id): continue
+            key = {'course_id': course_id, 'user_id': str(user['_id'])}
+            db.enrollments.update_one(key, {'$setOnInsert': {**key, 'username': user.get('username'),
+                                                             'enrolled_at': datetime.datetime.now()}}, upsert=True)
+        db.users.update_one({'_id': user['_id']}, {'$unset': {'enrolled_courses': ''}})
+        invalidate_user(user['_id'])
+        migrated += 1
+    reconcile_counts()
+    return migrated
+
+
+def reconcile_counts():
+    """Tính lại enrollment_count của mọi khóa học từ collection enrollments"""
+    pipeline = [{'$group': {'_id': '$course_id', 'count': {'$sum': 1}}}]
+    counts = {d['_id']: d['count'] for d in db.enrollments.aggregate(pipeline)}
+    ops = [UpdateOne({'_id': c['_id']}, {'$set': {'enrollment_count': counts.get(str(c['_id']), 0)}})
+           for c in db.courses.find({}, {'_id': 1})]
+    if ops: db.courses.bulk_write(ops, ordered=False)
+    return len(ops)
+
+
+enrollments_cli = AppGroup('enrollments', help='Ghi danh khóa học')
+
+@enrollments_cli.command('migrate')
+def migrate_command():
+    click.echo(f'Đã chuyển ghi danh của {migrate_all()} user sang collection enrollments')
+
+@enrollments_cli.command('reconcile')
+def reconcile_command():
+    click.echo(f'Đã tính lại số học viên của {reconcile_counts()} khóa học')
@@ -0,0 +1,331 @@
+# --- FILE: backend/services/exam_attempts.py ---
+# Bài thi đang làm được lưu trên server để tải lại trang không mất bài và client biến mất vẫn nộp được:
+#   exam_attempts: {_id: 'user_id:exam_id', user_id, username, exam_id, status: in_progress|submitted,
+#                   started_at, deadline, answers: {'<câu>': lựa chọn}, updated_at,
+#                   submitted_at, finalized_by: client|timer, result: {score, total, attempt}}
+# Mỗi (user, đề) có một document; bắt đầu lại sau khi đã nộp thì document được dùng lại cho lượt mới.
+# Autosave không ghi MongoDB ngay: ProgressBuffer gộp thay đổi theo lượt làm trong process và ghi bằng
+# một bulk_write mỗi AUTOSAVE_FLUSH_INTERVAL giây. Mỗi câu được $set riêng ('answers.<câu>') nên nhiều
+# worker cùng nhận autosave của một lượt cũng không đè câu của nhau.
+# Buffer nằm trong từng worker nhưng không cần chờ các worker khác khi nộp: client gửi kèm toàn bộ đáp án
+# lúc nộp và bản đó đè lên bản đã lưu, nên nộp bài chỉ flush buffer của process mình rồi chuyển
+# in_progress -> submitted bằng một find_one_and_update có điều kiện (chỉ một request nhận được lượt).
+# Nộp lại khi lượt đã nộp (bấm hai lần, hoặc đã nộp tự động khi hết giờ) trả về kết quả đã chấm, không tạo bài mới.
+# Giờ thi tính theo started_at/deadline trên server: lượt quá deadline + SUBMIT_GRACE mà client chưa nộp
+# được worker nền chấm từ đáp án đã lưu (EXAM_EXPIRE_INTERVAL giây một lần, hoặc `flask attempts expire`).
+# Autosave bị từ chối sau deadline + SUBMIT_GRACE, và worker nền chờ thêm một chu kỳ flush sau mốc đó,
+# nên lúc chấm thì buffer của mọi worker đã ghi xuống.
+from flask.cli import AppGroup
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from database import get_db
+from services.cache import TTLCache
+from services.grading import get_answer_key, build_result, next_attempt_number
+from services.analytics import record_submission
+from services import metrics
+import click
+import datetime
+import threading
+
+db = get_db()
+
+# Nộp bài trễ trong khoảng này (mạng chậm, đồng hồ client lệch) vẫn nhận đáp án client gửi kèm
+SUBMIT_GRACE = datetime.timedelta(seconds=30)
+EXPIRE_BATCH_SIZE = 500
+# 'user_id:exam_id' -> deadline của lượt đang làm; autosave kiểm tra giờ mà không đọc MongoDB
+deadline_cache = TTLCache(maxsize=4096, ttl=60)
+
+
+class AttemptError(ValueError):
+    """Autosave không hợp lệ: chưa bắt đầu, đã nộp, hết giờ hoặc đáp án sai định dạng"""
+
+
+def attempt_key(user_id, exam_id):
+    return f'{user_id}:{exam_id}'
+
+
+class ProgressBuffer:
+    """Đáp án autosave chưa ghi: {key: {'<câu>': lựa chọn}}, lần lưu sau của cùng một câu đè lần trước"""
+
+    def __init__(self):
+        self.window = 0  # AUTOSAVE_FLUSH_INTERVAL; 0: ghi ngay từng lần lưu
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def add(self, key, answers):
+        with self._lock:
+            self._pending.setdefault(key, {}).update(answers)
+        metrics.autosave_updates.inc()
+        if not self.window: self.flush(key)
+
+    def pending(self, key):
+        with self._lock:
+            return dict(self._pending.get(key, {}))
+
+    def flush(self, key=None):
+        """Ghi phần đang chờ (của một lượt hoặc tất cả) bằng một bulk_write; trả về số lượt được ghi"""
+        with self._lock:
+            if key is None:
+                batch, self._pending = self._pending, {}
+            else:
+                batch = {key: self._pending.pop(key)} if key in self._pending else {}
+        if not batch: return 0
+        now = datetime.datetime.now()
+        # Lượt đã nộp không khớp filter -> phần autosave đến muộn bị bỏ qua
+        ops = [UpdateOne({'_id': k, 'status': 'in_progress'},
+                         {'$set': {**{f'answers.{i}': v for i, v in answers.items()}, 'updated_at': now}})
+               for k, answers in batch.items()]
+        try:
+            db.exam_attempts.bulk_write(ops, ordered=False)
+        except PyMongoError:
+            # Trả lại buffer (giữ thay đổi mới hơn đến trong lúc ghi) để lần flush sau thử lại
+            with self._lock:
+                for k, answers in batch.items():
+                    self._pending[k] = {**answers, **self._pending.get(k, {})}
+            raise
+        metrics.autosave_writes.inc(amount=len(ops))
+        return len(ops)
+
+
+progress_buffer = ProgressBuffer()
+
+
+def _expired_before(now):
+    """Lượt có deadline trước mốc này thì không còn nhận autosave và buffer của mọi worker đã ghi xong"""
+    return now - SUBMIT_GRACE - datetime.timedelta(seconds=progress_buffer.window)
+
+
+def _remaining(attempt, now):
+    return max(0, int((attempt['deadline'] - now).total_seconds()))
+
+
+def serialize_attempt(attempt):
+    """Trạng thái lượt làm trả về cho client khi bắt đầu / làm tiếp"""
+    now = datetime.datetime.now()
+    return {
+        'started_at': attempt['started_at'].isoformat(),
+        'deadline': attempt['deadline'].isoformat(),
+        'remaining_seconds': _remaining(attempt, now),
+        'answers': {**(attempt.get('answers') or {}), **progress_buffer.pending(attempt['_id'])},
+    }
+
+
+def open_attempt(exam_id, user_id, username, duration):
+    """
+    Lượt đang làm của user (làm tiếp sau khi tải lại trang), chưa có thì mở lượt mới
+    với deadline = bây giờ + duration phút. Lượt cũ đã quá giờ được chấm trước khi mở lượt mới.
+    """
+    key = attempt_key(user_id, exam_id)
+    now = datetime.datetime.now()
+    attempt = db.exam_attempts.find_one({'_id': key})
+    if attempt and attempt['status'] == 'in_progress' and attempt['deadline'] < _expired_before(now):
+        finalize_attempt(attempt)
+        attempt = None
+    if not attempt or attempt['status'] != 'in_progress':
+        fresh = {'user_id': user_id, 'username': username, 'exam_id': exam_id, 'status': 'in_progress',
+                 'started_at': now, 'deadline': now + datetime.timedelta(minutes=duration or 0),
+                 'answers': {}, 'updated_at': now}
+        try:
+            db.exam_attempts.update_one(
+                {'_id': key, 'status': {'$ne': 'in_progress'}},
+                {'$set': fresh, '$unset': {'submitted_at': '', 'finalized_by': '', 'result': ''}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            pass  # Request khác vừa mở lượt này
+        attempt = db.exam_attempts.find_one({'_id': key})
+    deadline_cache.set(key, attempt['deadline'])
+    return attempt
+
+
+def clean_answers(payload, answers, required=True):
+    """{'<câu>': lựa chọn} hợp lệ theo bản đề của học sinh; AttemptError nếu sai (required=False: nộp bài trống được)"""
+    if answers is None and not required: return {}
+    if not isinstance(answers, dict) or (required and not answers): raise AttemptError('Thiếu đáp án cần lưu')
+    questions = payload['questions']
+    cleaned = {}
+    for index, choice in answers.items():
+        try:
+            i, choice = int(index), int(choice)
+        except (TypeError, ValueError):
+            raise AttemptError('Đáp án không hợp lệ')
+        if not 0 <= i < len(questions) or not 0 <= choice < len(questions[i].get('options', [])):
+            raise AttemptError('Đáp án không hợp lệ')
+        cleaned[str(i)] = choice
+    return cleaned
+
+
+def _load_deadline(key):
+    attempt = db.exam_attempts.find_one({'_id': key, 'status': 'in_progress'}, {'deadline': 1})
+    return attempt['deadline'] if attempt else None
+
+
+def save_progress(exam_id, user_id, answers):
+    """Đưa đáp án vào buffer autosave, trả về số giây còn lại"""
+    key = attempt_key(user_id, exam_id)
+    deadline = deadline_cache.get_or_load(key, lambda: _load_deadline(key))
+    if deadline is None: raise AttemptError('Bài thi chưa bắt đầu hoặc đã nộp')
+    now = datetime.datetime.now()
+    if now > deadline + SUBMIT_GRACE: raise AttemptError('Đã hết giờ làm bài')
+    progress_buffer.add(key, answers)
+    return _remaining({'deadline': deadline}, now)
+
+
+def _claim(key, finalized_by):
+    """
+    in_progress -> submitted (find_one_and_update nên chỉ một nơi nhận được mỗi lượt), trả về lượt kèm
+    đáp án đã lưu; None nếu không còn đang làm. Buffer của process này được ghi trước để bản lưu đủ nhất.
+    """
+    progress_buffer.flush(key)
+    attempt = db.exam_attempts.find_one_and_update(
+        {'_id': key, 'status': 'in_progress'},
+        {'$set': {'status': 'submitted', 'submitted_at': datetime.datetime.now(), 'finalized_by': finalized_by}},
+        return_document=ReturnDocument.AFTER
+    )
+    deadline_cache.invalidate(key)
+    return attempt
+
+
+def claim_attempt(exam_id, user_id):
+    """Nhận lượt đang làm để chấm khi client nộp; None nếu không có lượt đang làm"""
+    return _claim(attempt_key(user_id, exam_id), 'client')
+
+
+def merge_submission(attempt, answers):
+    """
+    (đáp án, thời gian làm bài) của lượt vừa claim: đáp án client gửi kèm đè lên bản đã lưu,
+    trừ khi nộp quá giờ thì chỉ tính bản đã lưu. Thời gian đo trên server, tối đa bằng thời lượng đề.
+    """
+    now = attempt.get('submitted_at') or datetime.datetime.now()
+    saved = attempt.get('answers') or {}
+    merged = saved if now > attempt['deadline'] + SUBMIT_GRACE else {**saved, **(answers or {})}
+    limit = (attempt['deadline'] - attempt['started_at']).total_seconds()
+    return merged, int(min((now - attempt['started_at']).total_seconds(), limit))
+
+
+def clean_duration(value):
+    """Thời gian làm bài client gửi (số giây, chỉ dùng khi lượt không được theo dõi trên server)"""
+    try:
+        return max(0, int(value or 0))
+    except (TypeError, ValueError):
+        raise AttemptError('Thời gian làm bài không hợp lệ')
+
+
+def result_summary(record):
+    return {'score': record['score'], 'total': record['total_questions'], 'attempt': record['attempt_number']}
+
+
+def save_result(exam_id, user_id, username, answers, duration_taken):
+    """Chấm, ghi results và cập nhật thống kê; None nếu đề không tồn tại"""
+    exam = get_answer_key(exam_id)
+    if not exam: return None
+    record = build_result(exam, exam_id, user_id, username, answers, duration_taken,
+                          next_attempt_number(user_id, exam_id))
+    db.results.insert_one(record)
+    record_submission(record)
+    return record
+
+
+def store_result(attempt, record):
+    """Lưu kết quả vào lượt đã chấm để lần nộp lại trả về đúng kết quả này"""
+    db.exam_attempts.update_one({'_id': attempt['_id']}, {'$set': {'result': result_summary(record)}})
+
+
+def previous_submission(exam_id, user_id):
+    """
+    Client nộp khi không còn lượt đang làm (nộp lại, hoặc đã được nộp tự động khi hết giờ):
+    (thông báo, kết quả của lượt gần nhất), kết quả None nếu lượt vẫn đang được chấm ở request khác.
+    None nếu user chưa có lượt nào trên server (client cũ không gọi /start: chấm như trước).
+    """
+    attempt = db.exam_attempts.find_one({'_id': attempt_key(user_id, exam_id)})
+    if not attempt: return None
+    if attempt['status'] != 'submitted' or not attempt.get('result'):
+        return 'Bài thi đang được nộp, vui lòng thử lại sau', None
+    if attempt.get('finalized_by') == 'timer': return 'Bài thi đã được nộp tự động khi hết giờ', attempt['result']
+    return 'Bài thi đã được nộp', attempt['result']
+
+
+def submit_attempt(exam_id, user_id, username, answers, duration_taken):
+    """
+    Nộp bài từ client (dùng chung cho bản Flask và ASGI): nhận lượt đang làm rồi chấm và lưu kết quả,
+    không còn lượt đang làm thì trả về kết quả lượt đã nộp. Trả về (thông báo, kết quả) như previous_submission,
+    None nếu đề không tồn tại.
+    """
+    attempt = claim_attempt(exam_id, user_id)
+    if attempt:
+        answers, duration_taken = merge_submission(attempt, answers)
+    else:
+        previous = previous_submission(exam_id, user_id)
+        if previous: return previous
+    record = save_result(exam_id, user_id, username, answers, duration_taken)
+    if not record: return None
+    if attempt: store_result(attempt, record)
+    return 'Nộp bài thành công', result_summary(record)
+
+
+def finalize_attempt(attempt):
+    """Chấm lượt quá giờ từ đáp án đã lưu; False nếu lượt đã được nộp ở nơi khác"""
+    claimed = _claim(attempt['_id'], 'timer')
+    if not claimed: return False
+    answers, duration_taken = merge_submission(claimed, None)
+    record = save_result(claimed['exam_id'], claimed['user_id'], claimed.get('username'), answers, duration_taken)
+    if record: store_result(claimed, record)
+    return True
+
+
+def finalize_expired(limit=EXPIRE_BATCH_SIZE):
+    """Chấm các lượt đã quá deadline + SUBMIT_GRACE (và một chu kỳ flush) mà client không nộp; trả về số lượt"""
+    cutoff = _expired_before(datetime.datetime.now())
+    expired = db.exam_attempts.find({'status': 'in_progress', 'deadline': {'$lt': cutoff}}, {'_id': 1}).limit(limit or 0)
+    return sum(1 for attempt in list(expired) if finalize_attempt(attempt))
+
+
+def _flush_loop(app, interval, stop_event):
+    while not stop_event.wait(interval):
+        try:
+            progress_buffer.flush()
+        except Exception as e:
+            app.logger.warning('Ghi autosave bài thi lỗi: %s', e)
+
+
+def _expire_loop(app, interval, stop_event):
+    # Thread riêng: chấm nhiều bài quá giờ không làm trễ chu kỳ flush autosave
+    while not stop_event.wait(interval):
+        try:
+            finalize_expired()
+        except Exception as e:
+            app.logger.warning('Nộp bài quá giờ lỗi: %s', e)
+
+
+exam_attempts_cli = AppGroup('attempts', help='Bài thi đang làm')
+
+@exam_attempts_cli.command('expire')
+def expire_command():
+    click.echo(f'Đã nộp {finalize_expired(limit=None)} bài thi quá giờ')
+
+
+def init_exam_attempts(app):
+    """
+    Đăng ký CLI và chạy thread nền: ghi buffer autosave mỗi AUTOSAVE_FLUSH_INTERVAL giây
+    (0: ghi ngay từng lần lưu) và nộp bài quá giờ mỗi EXAM_EXPIRE_INTERVAL giây (0: chỉ qua CLI).
+    """
+    app.cli.add_command(exam_attempts_cli)
+    flush_interval = app.config.get('AUTOSAVE_FLUSH_INTERVAL', 2)
+    expire_interval = app.config.get('EXAM_EXPIRE_INTERVAL', 60)
+    progress_buffer.window = flush_interval
+    stop_event = threading.Event()
+    for name, target, interval in (('exam-autosave', _flush_loop, flush_interval),
+                                   ('exam-expire', _expire_loop, expire_interval)):
+        if interval:
+            threading.Thread(target=target, args=(app, interval, stop_event), name=name, daemon=True).start()
+    app.extensions['exam_attempts'] = stop_event
+
+
+def stop_exam_attempts(app):
+    stop_event = app.extensions.pop('exam_attempts', None)
+    if stop_event: stop_event.set()
+    # Autosave còn trong buffer được ghi trước khi đóng kết nối
+    try:
+        progress_buffer.flush()
+    except PyMongoError as e:
+        app.logger.warning('Ghi autosave bài thi khi tắt lỗi: %s', e)
@@ -0,0 +1,91 @@
+# --- FILE: backend/services/grading.py ---
+# Chấm bài thi: đáp án rút gọn được cache theo (đề, version 'exams') nên sửa đề ở worker nào cũng làm
+# mọi worker đọc lại; số lần làm bài tăng nguyên tử bằng $inc.
+from bson.objectid import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from database import get_db
+from services.cache import TTLCache
+from services.http_cache import versioned_key
+from services.question_bank import load_questions
+import datetime
+
+db = get_db()
+
+# 'exam_id:v<version>' -> {'title', 'creator_id', 'answer_key': [correct_index, ...]}
+answer_key_cache = TTLCache(maxsize=512, ttl=300)
+
+
+# Chỉ lấy correct_index của từng câu (ngân hàng câu hỏi hoặc mảng nhúng của đề cũ), không đọc nội dung
+ANSWER_KEY_PROJECTION = {'title': 1, 'creator_id': 1, 'question_ids': 1, 'questions.correct_index': 1}
+CORRECT_INDEX_PROJECTION = {'correct_index': 1}
+
+
+def _to_answer_key(exam, questions):
+    return {
+        'title': exam['title'],
+        'creator_id': exam.get('creator_id'),
+        'answer_key': [q.get('correct_index') for q in questions],
+    }
+
+
+def _load_answer_key(exam_id):
+    exam = db.exams.find_one({'_id': ObjectId(exam_id)}, ANSWER_KEY_PROJECTION)
+    if not exam: return None
+    return _to_answer_key(exam, load_questions(exam, CORRECT_INDEX_PROJECTION))
+
+
+def get_answer_key(exam_id):
+    return answer_key_cache.get_or_load(versioned_key('exams', exam_id), lambda: _load_answer_key(exam_id))
+
+
+def grade(answer_key, user_answers):
+    """
+    user_answers: {'0': 2, '1': 0, ...} như client gửi lên.
+    Trả về (số câu đúng, [True/False cho từng câu]).
+    """
+    correct = []
+    for i, correct_index in enumerate(answer_key):
+        user_choice = user_answers.get(str(i))
+        correct.append(user_choice is not None and int(user_choice) == correct_index)
+    return sum(correct), correct
+
+
+def build_result(exam, exam_id, user_id, username, user_answers, duration_taken, attempt_number):
+    """Document kết quả (collection results) của một bài nộp; exam là đáp án rút gọn từ get_answer_key"""
+    score, question_correct = grade(exam['answer_key'], user_answers)
+    return {
+        'user_id': user_id,
+        'username': username,
+        'exam_id': exam_id,
+        'exam_title': exam['title'],
+        'creator_id': exam.get('creator_id'),
+        'score': score,
+        'total_questions': len(exam['answer_key']),
+        'duration_taken': duration_taken,
+        'attempt_number': attempt_number,
+        'question_correct': question_correct,
+        'timestamp': datetime.datetime.now()
+    }
+
+
+def next_attempt_number(user_id, exam_id):
+    """
+    Tăng bộ đếm (user, exam) trong collection attempt_counters bằng find-and-modify $inc,
+    hai lần nộp cùng lúc luôn nhận hai số khác nhau. Bộ đếm chưa có thì khởi tạo một lần
+    từ số kết quả đã có trong results (dữ liệu trước khi có bộ đếm).
+    """
+    key = {'_id': f'{user_id}:{exam_id}'}
+    counter = db.attempt_counters.find_one_and_update(
+        key, {'$inc': {'count': 1}}, return_document=ReturnDocument.AFTER
+    )
+    if counter: return counter['count']
+    existing = db.results.count_documents({'user_id': user_id, 'exam_id': exam_id})
+    try:
+        db.attempt_counters.insert_one({**key, 'user_id': user_id, 'exam_id': exam_id, 'count': existing})
+    except DuplicateKeyError:
+        pass  # Request khác vừa khởi tạo bộ đếm
+    counter = db.attempt_counters.find_one_and_update(
+        key, {'$inc': {'count': 1}}, return_document=ReturnDocument.AFTER
+    )
+    return counter['count']
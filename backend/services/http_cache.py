@@ -0,0 +1,191 @@
+# --- FILE: backend/services/http_cache.py ---
+# Conditional GET cho các endpoint danh mục (courses, flashcards, exams):
+#   - mỗi collection có một số version (collection_versions) được tăng bởi các handler ghi;
+#   - ETag/Last-Modified tính từ version, If-None-Match khớp thì trả 304 mà không chạy query;
+#   - nén gzip (và brotli nếu có cài) cho response JSON lớn, kể cả response stream.
+from flask import request, current_app
+from werkzeug.wrappers import Response
+from functools import wraps
+from pymongo import ReturnDocument
+from database import get_db, get_async_db
+from services.cache import TTLCache
+import datetime
+import hashlib
+import zlib
+
+try:
+    import brotli
+except ImportError:  # brotli là tùy chọn, không có thì chỉ dùng gzip
+    brotli = None
+
+db = get_db()
+adb = get_async_db()
+
+# Cache version trong process; TTL ngắn để worker khác thấy thay đổi sau tối đa vài giây
+version_cache = TTLCache(maxsize=64, ttl=2)
+COMPRESS_MIN_SIZE = 1024
+
+
+def _store_version(name, doc):
+    value = (doc.get('version', 0), doc['updated_at'].replace(microsecond=0))
+    version_cache.set(name, value)
+    return value
+
+
+def bump_version(name):
+    """Gọi sau mỗi thao tác ghi làm thay đổi danh sách của collection `name`"""
+    doc = db.collection_versions.find_one_and_update(
+        {'_id': name},
+        {'$inc': {'version': 1}, '$set': {'updated_at': datetime.datetime.utcnow()}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return _store_version(name, doc)
+
+
+def get_version(name):
+    """(version, updated_at) của collection, đọc từ cache trong process nếu còn hạn"""
+    cached = version_cache.get(name)
+    if cached: return cached
+    doc = db.collection_versions.find_one_and_update(
+        {'_id': name},
+        {'$setOnInsert': {'version': 0, 'updated_at': datetime.datetime.utcnow()}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return _store_version(name, doc)
+
+
+async def get_version_async(name):
+    cached = version_cache.get(name)
+    if cached: return cached
+    doc = await adb.collection_versions.find_one_and_update(
+        {'_id': name},
+        {'$setOnInsert': {'version': 0, 'updated_at': datetime.datetime.utcnow()}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return _store_version(name, doc)
+
+
+def versioned_key(name, key):
+    """Khóa cache trong process gắn với version của collection: bump_version ở worker nào thì mọi worker cũng miss"""
+    return f'{key}:v{get_version(name)[0]}'
+
+
+async def versioned_key_async(name, key):
+    return f'{key}:v{(await get_version_async(name))[0]}'
+
+
+def negotiate_encoding(accepted=None):
+    """accepted: Accept-Encoding đã parse (mặc định lấy từ request Flask hiện tại)"""
+    if accepted is None: accepted = request.accept_encodings
+    if brotli is not None and accepted['br']: return 'br'
+    if accepted['gzip']: return 'gzip'
+    return 'identity'
+
+
+def etag_for(name, version, req=None):
+    # Query string và encoding là một phần của representation nên nằm trong ETag (strong)
+    req = req if req is not None else request
+    query = hashlib.sha1(req.query_string).hexdigest()[:12]
+    return f'{name}-v{version}-{query}-{negotiate_encoding(req.accept_encodings)}'
+
+
+def _mark_conditional(rv, etag, updated_at):
+    rv.set_etag(etag)
+    rv.last_modified = updated_at
+    rv.cache_control.no_cache = True
+    rv.vary.add('Accept-Encoding')
+    return rv
+
+
+def conditional_get(name):
+    """Decorator cho view GET trả về danh sách của collection `name`"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # ETag tính một lần trước khi chạy view: view có ghi (VD: tạo bộ thẻ mẫu) thì ETag cũ hơn dữ liệu,
+            # lần sau không khớp version mới và client nhận lại bản đầy đủ, không bao giờ giữ dữ liệu cũ
+            version, updated_at = get_version(name)
+            etag = etag_for(name, version)
+            if request.if_none_match.contains(etag):
+                rv = current_app.response_class(status=304)
+            else:
+                rv = current_app.make_response(view(*args, **kwargs))
+                if rv.status_code != 200: return rv
+            return _mark_conditional(rv, etag, updated_at)
+        return wrapper
+    return decorator
+
+
+def conditional_get_async(name):
+    """Như conditional_get cho view async của asgi.py: view(req, ...) trả về Response của werkzeug"""
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(req, *args, **kwargs):
+            version, updated_at = await get_version_async(name)
+            etag = etag_for(name, version, req)
+            if req.if_none_match.contains(etag):
+                rv = Response(status=304)
+            else:
+                rv = await view(req, *args, **kwargs)
+                if isinstance(rv, tuple):
+                    rv, status = rv
+                    rv.status_code = status
+                if rv.status_code != 200: return rv
+            return _mark_conditional(rv, etag, updated_at)
+        return wrapper
+    return decorator
+
+
+def _compressor(encoding):
+    if encoding == 'br':
+        c = brotli.Compressor()
+        return c.process, c.finish
+    c = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: định dạng gzip
+    return c.compress, c.flush
+
+
+def _compress_stream(chunks, encoding):
+    compress, finish = _compressor(encoding)
+    for chunk in chunks:
+        if isinstance(chunk, str): chunk = chunk.encode('utf-8')
+        data = compress(chunk)
+        if data: yield data
+    yield finish()
+
+
+async def compress_async_stream(chunks, encoding):
+    compress, finish = _compressor(encoding)
+    async for chunk in chunks:
+        if isinstance(chunk, str): chunk = chunk.encode('utf-8')
+        data = compress(chunk)
+        if data: yield data
+    yield finish()
+
+
+def compress_response(response, accepted=None):
+    """after_request: nén response JSON lớn theo Accept-Encoding của client"""
+    if (response.status_code != 200 or response.mimetype != 'application/json'
+            or 'Content-Encoding' in response.headers):
+        return response
+    encoding = negotiate_encoding(accepted)
+    if encoding == 'identity':
+        return response
+    response.vary.add('Accept-Encoding')
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return response
+        compress, finish = _compressor(encoding)
+        response.set_data(compress(data) + finish())
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def init_http_cache(app):
+    app.after_request(compress_response)
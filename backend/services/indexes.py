@@ -0,0 +1,198 @@
+# --- FILE: backend/services/indexes.py ---
+# Khai báo tập trung các index mà từng collection cần, áp dụng khi khởi động app
+# hoặc qua lệnh CLI:  flask --app app indexes apply | flask --app app indexes audit
+from flask.cli import AppGroup
+from pymongo import IndexModel, ASCENDING, DESCENDING, TEXT
+from pymongo.errors import PyMongoError
+from database import get_db
+import click
+import datetime
+
+# collection -> danh sách index. Đặt tên cố định để create_indexes chạy lại nhiều lần vẫn an toàn.
+INDEXES = {
+    'users': [
+        IndexModel([('username', ASCENDING)], name='username_unique', unique=True),
+        # Danh sách user của admin: keyset (created_at, _id), lọc theo role
+        IndexModel([('created_at', DESCENDING), ('_id', DESCENDING)], name='created'),
+        IndexModel([('role', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)], name='role_created'),
+        IndexModel([('role', ASCENDING), ('username', ASCENDING)], name='role_username'),
+    ],
+    'user_cleanup': [
+        IndexModel([('status', ASCENDING), ('created_at', ASCENDING)], name='status'),
+        # Job đã xong giữ 7 ngày để admin xem lại (job chưa xong không có finished_at nên không bị xóa)
+        IndexModel([('finished_at', ASCENDING)], name='expire_done', expireAfterSeconds=7 * 24 * 3600),
+    ],
+    'course_materials.files': [
+        IndexModel([('metadata.uploader_id', ASCENDING)], name='uploader'),
+    ],
+    'results': [
+        IndexModel([('user_id', ASCENDING), ('exam_id', ASCENDING)], name='user_exam'),
+        IndexModel([('user_id', ASCENDING), ('timestamp', DESCENDING)], name='user_timestamp'),
+        IndexModel([('creator_id', ASCENDING), ('timestamp', DESCENDING)], name='creator_timestamp'),
+        IndexModel([('exam_id', ASCENDING)], name='exam'),
+    ],
+    'exam_attempts': [
+        # Worker nền tìm các lượt đang làm đã quá giờ
+        IndexModel([('status', ASCENDING), ('deadline', ASCENDING)], name='status_deadline'),
+        # Lượt đã nộp giữ 7 ngày (lượt đang làm không có submitted_at nên không bị xóa)
+        IndexModel([('submitted_at', ASCENDING)], name='expire_submitted', expireAfterSeconds=7 * 24 * 3600),
+    ],
+    'exam_analytics': [
+        IndexModel([('creator_id', ASCENDING), ('title', ASCENDING)], name='creator_title'),
+    ],
+    'exam_best': [
+        # Bảng xếp hạng: top-K đọc theo thứ tự index, hạng = đếm trên đoạn (exam_id, best_score) làm nhanh hơn
+        IndexModel([('exam_id', ASCENDING), ('best_score', DESCENDING), ('best_duration', ASCENDING),
+                    ('user_id', ASCENDING)], name='leaderboard'),
+    ],
+    'courses': [
+        IndexModel([('instructor_id', ASCENDING)], name='instructor'),
+    ],
+    'enrollments': [
+        # Danh sách lớp (phân trang theo user_id) và chặn ghi danh trùng
+        IndexModel([('course_id', ASCENDING), ('user_id', ASCENDING)], name='course_user', unique=True),
+        # Kiểm tra quyền / "khóa học của tôi": chỉ đọc index (covered query)
+        IndexModel([('user_id', ASCENDING), ('course_id', ASCENDING)], name='user_course'),
+    ],
+    'announcements': [
+        IndexModel([('course_id', ASCENDING), ('date', DESCENDING), ('_id', DESCENDING)], name='course_latest'),
+    ],
+    'blogs': [
+        # Giữ tên tự sinh của các index feed đã tạo trước khi có registry: cùng key khác tên sẽ lỗi IndexOptionsConflict
+        IndexModel([('created_at', DESCENDING), ('_id', DESCENDING)], name='created_at_-1__id_-1'),
+        IndexModel([('author_id', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)],
+                   name='author_id_1_created_at_-1__id_-1'),
+        # Dọn bình luận của tài khoản đã xóa
+        IndexModel([('comments.user_id', ASCENDING)], name='comment_user'),
+    ],
+    'exams': [
+        IndexModel([('creator_id', ASCENDING), ('_id', ASCENDING)], name='creator'),
+        IndexModel([('title', ASCENDING)], name='title'),
+        # Multikey: tìm các đề đang dùng một câu hỏi (xóa cache khi câu hỏi bị sửa)
+        IndexModel([('question_ids', ASCENDING)], name='question_ids'),
+    ],
+    'questions': [
+        IndexModel([('creator_id', ASCENDING), ('_id', ASCENDING)], name='creator'),
+    ],
+    'flashcard_cards': [
+        IndexModel([('deck_id', ASCENDING), ('position', ASCENDING)], name='deck_position', unique=True),
+    ],
+    'flashcard_reviews': [
+        IndexModel([('user_id', ASCENDING), ('due_at', ASCENDING)], name='user_due'),
+        IndexModel([('user_id', ASCENDING), ('deck_id', ASCENDING), ('due_at', ASCENDING)], name='user_deck_due'),
+        IndexModel([('deck_id', ASCENDING)], name='deck'),
+    ],
+    'search_index': [
+        # Text đã bỏ dấu sẵn nên dùng 'none' (không stemming); tiêu đề nặng hơn nội dung khi xếp hạng
+        IndexModel([('title_norm', TEXT), ('body_norm', TEXT)], name='search_text',
+                   default_language='none', weights={'title_norm': 10, 'body_norm': 1}),
+        IndexModel([('type', ASCENDING)], name='type'),
+    ],
+    'question_jobs': [
+        # Job sinh câu hỏi chỉ cần giữ đủ lâu để client lấy kết quả; kết quả lâu dài nằm trong question_cache
+        IndexModel([('created_at', ASCENDING)], name='expire_jobs', expireAfterSeconds=24 * 3600),
+    ],
+}
+
+# Các query tiêu biểu của từng route (cùng "hình dạng" filter/sort) để chạy explain().
+# Giá trị chỉ là mẫu, planner chọn index dựa trên tên trường.
+_SAMPLE_ID = '000000000000000000000000'
+_SAMPLE_TIME = datetime.datetime(2000, 1, 1)
+AUDIT_QUERIES = [
+    ('auth.login / auth.register', 'users', {'username': 'sample'}, None),
+    ('blogs.get_blogs', 'blogs', {}, [('created_at', DESCENDING), ('_id', DESCENDING)]),
+    ('blogs.get_my_blogs', 'blogs', {'author_id': _SAMPLE_ID}, [('created_at', DESCENDING), ('_id', DESCENDING)]),
+    ('courses.get_my_created_courses', 'courses', {'instructor_id': _SAMPLE_ID}, None),
+    ('exams.get_exams?creator=', 'exams', {'creator_id': _SAMPLE_ID}, [('_id', ASCENDING)]),
+    ('exams.get_exams?title=', 'exams', {'title': {'$regex': '^IELTS'}}, [('_id', ASCENDING)]),
+    ('exams.submit_exam', 'results', {'user_id': _SAMPLE_ID, 'exam_id': _SAMPLE_ID}, None),
+    ('exam_attempts.finalize_expired', 'exam_attempts', {'status': 'in_progress', 'deadline': {'$lt': _SAMPLE_TIME}}, None),
+    ('exams.get_history', 'results', {'user_id': _SAMPLE_ID}, [('timestamp', DESCENDING)]),
+    ('exams.get_teacher_results', 'results', {'creator_id': _SAMPLE_ID}, [('timestamp', DESCENDING)]),
+    ('flashcards.get_deck_cards', 'flashcard_cards', {'deck_id': _SAMPLE_ID, 'position': {'$gt': 0}}, [('position', ASCENDING)]),
+    ('flashcards.get_due_cards', 'flashcard_reviews', {'user_id': _SAMPLE_ID, 'due_at': {'$lte': _SAMPLE_TIME}}, [('due_at', ASCENDING)]),
+    ('exams.get_teacher_analytics', 'exam_analytics', {'creator_id': _SAMPLE_ID}, [('title', ASCENDING)]),
+    ('search.search_all', 'search_index', {'$text': {'$search': 'sample'}, 'type': {'$in': ['course']}}, None),
+    ('exams.get_exam_analytics / leaderboard', 'exam_best', {'exam_id': _SAMPLE_ID},
+     [('best_score', DESCENDING), ('best_duration', ASCENDING), ('user_id', ASCENDING)]),
+    ('exams.get_exam_leaderboard (rank)', 'exam_best', {'exam_id': _SAMPLE_ID, 'best_score': 3, 'best_duration': {'$lt': 60}}, None),
+    ('admin.get_all_users', 'users', {}, [('created_at', DESCENDING), ('_id', DESCENDING)]),
+    ('admin.get_all_users?role=', 'users', {'role': 'user'}, [('created_at', DESCENDING), ('_id', DESCENDING)]),
+    ('admin.get_all_users?q=&sort=username', 'users', {'username': {'$regex': '^sample'}}, [('username', ASCENDING)]),
+    ('courses.get_course_detail (is_enrolled)', 'enrollments', {'user_id': _SAMPLE_ID, 'course_id': _SAMPLE_ID}, None),
+    ('courses.get_roster', 'enrollments', {'course_id': _SAMPLE_ID, 'user_id': {'$gt': _SAMPLE_ID}},
+     [('user_id', ASCENDING)]),
+    ('courses.get_announcements', 'announcements', {'course_id': _SAMPLE_ID},
+     [('date', DESCENDING), ('_id', DESCENDING)]),
+    ('exams.get_question_bank', 'questions', {'creator_id': _SAMPLE_ID}, [('_id', ASCENDING)]),
+    ('exams.update_question', 'exams', {'question_ids': _SAMPLE_ID}, None),
+]
+
+
+def apply_indexes(db=None):
+    """Tạo các index đã khai báo (idempotent). Trả về {collection: [tên index | lỗi]}"""
+    db = db if db is not None else get_db()
+    report = {}
+    for collection, models in INDEXES.items():
+        try:
+            report[collection] = db[collection].create_indexes(models)
+        except PyMongoError as e:
+            # VD: username bị trùng khiến unique index không tạo được -> báo lỗi, không làm sập app
+            report[collection] = [f'ERROR: {e}']
+    return report
+
+
+def _plan_stages(plan):
+    """Duyệt cây winningPlan, trả về tất cả tên stage (COLLSCAN, IXSCAN, FETCH, ...)"""
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            yield plan['stage']
+        for value in plan.values():
+            yield from _plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _plan_stages(item)
+
+
+def audit_queries(db=None):
+    """Chạy explain() cho từng query trong AUDIT_QUERIES, đánh dấu query nào bị COLLSCAN"""
+    db = db if db is not None else get_db()
+    findings = []
+    for route, collection, query, sort in AUDIT_QUERIES:
+        cursor = db[collection].find(query)
+        if sort: cursor = cursor.sort(sort)
+        plan = cursor.explain().get('queryPlanner', {}).get('winningPlan', {})
+        stages = list(_plan_stages(plan))
+        findings.append({
+            'route': route,
+            'collection': collection,
+            'stages': stages,
+            'collscan': 'COLLSCAN' in stages,
+        })
+    return findings
+
+
+index_cli = AppGroup('indexes', help='Quản lý index MongoDB')
+
+@index_cli.command('apply')
+def apply_command():
+    for collection, names in apply_indexes().items():
+        click.echo(f'{collection}: {", ".join(names)}')
+
+@index_cli.command('audit')
+def audit_command():
+    findings = audit_queries()
+    for f in findings:
+        status = 'COLLSCAN' if f['collscan'] else 'OK'
+        click.echo(f"[{status:8}] {f['route']} ({f['collection']}): {' > '.join(f['stages'])}")
+    if any(f['collscan'] for f in findings):
+        raise SystemExit(1)
+
+
+def init_indexes(app):
+    """Đăng ký lệnh CLI và tạo index khi khởi động (tắt bằng AUTO_CREATE_INDEXES=False)"""
+    app.cli.add_command(index_cli)
+    if app.config.get('AUTO_CREATE_INDEXES', True):
+        for collection, names in apply_indexes().items():
+            errors = [n for n in names if n.startswith('ERROR')]
+            if errors: app.logger.warning('Index %s: %s', collection, errors)
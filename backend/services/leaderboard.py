@@ -0,0 +1,166 @@
+# --- FILE: backend/services/leaderboard.py ---
+# Bảng xếp hạng theo đề: mỗi học viên một dòng trong exam_best (điểm cao nhất, cùng điểm thì làm nhanh hơn
+# xếp trên), cập nhật dồn mỗi lần nộp bài thay vì sắp xếp lại toàn bộ results:
+#   exam_best:    {_id: 'exam_id:user_id', exam_id, user_id, username, best_score, best_duration, attempts}
+#   leaderboards: {_id: exam_id, players, score_counts: {'<điểm>': số học viên có điểm cao nhất này}}
+# Top-K đọc theo index (exam_id, best_score, best_duration, user_id). Hạng của một người =
+# số người điểm cao hơn (cộng từ score_counts, số mức điểm <= số câu của đề)
+# + số người cùng điểm làm nhanh hơn (đếm trên đoạn index của đúng mức điểm đó) + 1.
+# Bộ đếm được tạo bằng upsert ở bài nộp đầu tiên của đề; đề có exam_best từ trước khi có bảng xếp hạng
+# cần chạy `flask analytics leaderboards` (hoặc `flask analytics rebuild`) một lần để đếm lại.
+from pymongo import ASCENDING, DESCENDING
+from database import get_db, get_async_db
+import asyncio
+
+db = get_db()
+adb = get_async_db()
+
+LEADERBOARD_SORT = [('best_score', DESCENDING), ('best_duration', ASCENDING), ('user_id', ASCENDING)]
+ENTRY_PROJECTION = {'_id': 0, 'user_id': 1, 'username': 1, 'best_score': 1, 'best_duration': 1, 'attempts': 1}
+# Bài nộp cũ không có thời gian làm bài: xếp sau cùng trong nhóm cùng điểm
+MISSING_DURATION = 2 ** 31 - 1
+MAX_TOP = 100
+
+
+def normalize_duration(value):
+    try:
+        return max(0, int(float(value)))
+    except (TypeError, ValueError):
+        return MISSING_DURATION
+
+
+def _best_updates(result):
+    """(key, update upsert tăng số lần làm, filter/update chỉ khớp khi bài mới tốt hơn thành tích cũ)"""
+    exam_id, user_id = result['exam_id'], result['user_id']
+    score, duration = result['score'], normalize_duration(result.get('duration_taken'))
+    key = {'_id': f'{exam_id}:{user_id}'}
+    best = {'best_score': score, 'best_duration': duration}
+    upsert = {
+        '$inc': {'attempts': 1},
+        '$set': {'exam_id': exam_id, 'user_id': user_id, 'username': result.get('username')},
+        '$setOnInsert': best,
+    }
+    improve = {**key, '$or': [
+        {'best_score': {'$lt': score}},
+        {'best_score': score, 'best_duration': {'$gt': duration}},
+        {'best_score': score, 'best_duration': None},  # exam_best cũ chưa có best_duration
+    ]}
+    return key, upsert, improve, {'$set': best}
+
+
+def _count_changes(before, improved, score):
+    """Thay đổi của score_counts suy ra từ bản trước khi ghi (find_one_and_update nên không lệch khi ghi đồng thời)"""
+    if before is None: return {str(score): 1}, 1
+    if improved and improved.get('best_score') != score:
+        return {str(improved.get('best_score')): -1, str(score): 1}, 0
+    return {}, 0
+
+
+def _counts_update(changes, new_players):
+    inc = {f'score_counts.{s}': n for s, n in changes.items()}
+    if new_players: inc['players'] = new_players
+    return {'$inc': inc}
+
+
+def record_best(result):
+    """Cập nhật thành tích tốt nhất và score_counts cho một bài nộp"""
+    key, upsert, improve, set_best = _best_updates(result)
+    before = db.exam_best.find_one_and_update(key, upsert, upsert=True)
+    improved = db.exam_best.find_one_and_update(improve, set_best) if before else None
+    changes, new_players = _count_changes(before, improved, result['score'])
+    if changes: db.leaderboards.update_one({'_id': result['exam_id']}, _counts_update(changes, new_players), upsert=True)
+
+
+def rebuild_counts(exam_id=None):
+    """
+    Đếm lại score_counts / players từ exam_best (một đề hoặc tất cả); chỉ chạy qua CLI.
+    Ghi bằng replace_one upsert từng đề nên không bao giờ có lúc thiếu document hay trùng _id.
+    """
+    query = {'exam_id': exam_id} if exam_id else {}
+    # exam_best cũ chưa có best_duration: coi như không rõ thời gian để thứ tự index khớp với cách tính hạng
+    db.exam_best.update_many({**query, 'best_duration': None}, {'$set': {'best_duration': MISSING_DURATION}})
+    match = {'$match': query}
+    rows = db.exam_best.aggregate([
+        match,
+        {'$group': {'_id': {'exam_id': '$exam_id', 'score': '$best_score'}, 'count': {'$sum': 1}}},
+    ])
+    docs = {}
+    for row in rows:
+        doc = docs.setdefault(row['_id']['exam_id'], {'_id': row['_id']['exam_id'], 'players': 0, 'score_counts': {}})
+        doc['score_counts'][str(row['_id']['score'])] = row['count']
+        doc['players'] += row['count']
+    for doc in docs.values():
+        db.leaderboards.replace_one({'_id': doc['_id']}, doc, upsert=True)
+    # Đề không còn ai trong exam_best
+    if exam_id is None:
+        db.leaderboards.delete_many({'_id': {'$nin': list(docs)}})
+    elif exam_id not in docs:
+        db.leaderboards.delete_one({'_id': exam_id})
+    return len(docs)
+
+
+def _with_ranks(entries):
+    """Hạng kiểu thi đấu (cùng điểm và cùng thời gian thì cùng hạng) cho danh sách bắt đầu từ hạng 1"""
+    ranked, previous = [], None
+    for position, entry in enumerate(entries, start=1):
+        current = (entry.get('best_score'), entry.get('best_duration'))
+        rank = ranked[-1]['rank'] if current == previous else position
+        ranked.append({**entry, 'rank': rank})
+        previous = current
+    return ranked
+
+
+def _serialize_entry(entry):
+    if entry.get('best_duration') == MISSING_DURATION: entry['best_duration'] = None
+    return entry
+
+
+def get_top(exam_id, limit=10):
+    cursor = db.exam_best.find({'exam_id': exam_id}, ENTRY_PROJECTION).sort(LEADERBOARD_SORT).limit(limit)
+    return [_serialize_entry(e) for e in _with_ranks(list(cursor))]
+
+
+async def get_top_async(exam_id, limit=10):
+    cursor = adb.exam_best.find({'exam_id': exam_id}, ENTRY_PROJECTION).sort(LEADERBOARD_SORT).limit(limit)
+    return [_serialize_entry(e) for e in _with_ranks(await cursor.to_list())]
+
+
+def _faster_query(exam_id, entry):
+    return {'exam_id': exam_id, 'best_score': entry['best_score'],
+            'best_duration': {'$lt': entry.get('best_duration', MISSING_DURATION)}}
+
+
+def _rank(counts_doc, entry, faster):
+    higher = sum(n for s, n in (counts_doc or {}).get('score_counts', {}).items() if int(s) > entry['best_score'])
+    return {**_serialize_entry(entry), 'rank': higher + faster + 1}
+
+
+def get_rank(exam_id, user_id):
+    """Thành tích và hạng của một học viên, None nếu chưa làm đề này"""
+    entry = db.exam_best.find_one({'_id': f'{exam_id}:{user_id}'}, ENTRY_PROJECTION)
+    if not entry: return None
+    return _rank(db.leaderboards.find_one({'_id': exam_id}), entry, db.exam_best.count_documents(_faster_query(exam_id, entry)))
+
+
+async def get_rank_async(exam_id, user_id):
+    entry = await adb.exam_best.find_one({'_id': f'{exam_id}:{user_id}'}, ENTRY_PROJECTION)
+    if not entry: return None
+    counts, faster = await asyncio.gather(adb.leaderboards.find_one({'_id': exam_id}),
+                                          adb.exam_best.count_documents(_faster_query(exam_id, entry)))
+    return _rank(counts, entry, faster)
+
+
+def get_leaderboard(exam_id, user_id=None, limit=10):
+    """{'players', 'top': [...], 'me': {...} | None}"""
+    counts = db.leaderboards.find_one({'_id': exam_id})
+    return {'exam_id': exam_id, 'players': (counts or {}).get('players', 0), 'top': get_top(exam_id, limit),
+            'me': get_rank(exam_id, user_id) if user_id else None}
+
+
+async def get_leaderboard_async(exam_id, user_id=None, limit=10):
+    counts, top, me = await asyncio.gather(
+        adb.leaderboards.find_one({'_id': exam_id}),
+        get_top_async(exam_id, limit),
+        get_rank_async(exam_id, user_id) if user_id else asyncio.sleep(0),
+    )
+    return {'exam_id': exam_id, 'players': (counts or {}).get('players', 0), 'top': top, 'me': me}
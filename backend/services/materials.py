@@ -0,0 +1,98 @@
+# --- FILE: backend/services/materials.py ---
+# Lưu tài liệu khóa học trong GridFS (chia chunk 255KB) thay vì một document BSON 16MB,
+# upload/download đều stream nên không phải giữ cả file trong RAM của worker.
+from flask import request, send_file
+from flask.cli import AppGroup
+from bson.objectid import ObjectId
+from gridfs import GridFSBucket
+from gridfs.errors import NoFile
+from database import get_db, get_database
+import click
+import io
+
+db = get_db()
+MATERIALS_BUCKET = 'course_materials'
+
+
+def get_bucket():
+    return GridFSBucket(get_database(), bucket_name=MATERIALS_BUCKET)
+
+
+def store_material(file, uploader_id, course_id):
+    """Stream FileStorage của werkzeug vào GridFS, trả về id (str) của file"""
+    file_id = get_bucket().upload_from_stream(
+        file.filename,
+        file.stream,
+        metadata={
+            'content_type': file.content_type,
+            'uploader_id': uploader_id,
+            'course_id': course_id,
+        }
+    )
+    return str(file_id)
+
+
+def send_material(file_id):
+    """
+    Trả về Response stream file từ GridFS, hỗ trợ Range (206), ETag/If-None-Match (304)
+    và Last-Modified. Trả về None nếu file không tồn tại.
+    """
+    try:
+        grid_out = get_bucket().open_download_stream(ObjectId(file_id))
+    except NoFile:
+        return None
+    metadata = grid_out.metadata or {}
+    rv = send_file(
+        grid_out,
+        mimetype=metadata.get('content_type') or 'application/octet-stream',
+        as_attachment=True,
+        download_name=grid_out.filename,
+        conditional=False,
+        etag=False,
+    )
+    # File trong GridFS không bao giờ bị sửa tại chỗ nên id là một strong ETag hợp lệ
+    rv.content_length = grid_out.length
+    rv.set_etag(str(grid_out._id))
+    rv.last_modified = grid_out.upload_date
+    rv.cache_control.private = True
+    rv.cache_control.no_cache = True
+    return rv.make_conditional(request, accept_ranges=True, complete_length=grid_out.length)
+
+
+def migrate_legacy_files(delete=True):
+    """
+    Chuyển các document cũ trong course_files (binary trong trường `data`) sang GridFS,
+    giữ nguyên _id để các tham chiếu materials[].file_id trong courses vẫn đúng.
+    """
+    bucket = get_bucket()
+    migrated = skipped = 0
+    # Chỉ lấy _id rồi đọc từng file một, tránh một batch nhiều document 16MB
+    for ref in db.course_files.find({'data': {'$exists': True}}, {'_id': 1}):
+        doc = db.course_files.find_one({'_id': ref['_id']})
+        if not doc: continue
+        if db[f'{MATERIALS_BUCKET}.files'].count_documents({'_id': doc['_id']}, limit=1):
+            skipped += 1
+        else:
+            bucket.upload_from_stream_with_id(
+                doc['_id'],
+                doc['filename'],
+                io.BytesIO(doc['data']),
+                metadata={
+                    'content_type': doc.get('content_type'),
+                    'uploader_id': doc.get('uploader_id'),
+                    'legacy_uploaded_at': doc.get('uploaded_at'),
+                }
+            )
+            migrated += 1
+        if delete:
+            db.course_files.delete_one({'_id': doc['_id']})
+    return migrated, skipped
+
+
+materials_cli = AppGroup('materials', help='Quản lý tài liệu khóa học (GridFS)')
+
+@materials_cli.command('migrate')
+@click.option('--keep-legacy', is_flag=True, help='Không xóa document cũ trong course_files')
+def migrate_command(keep_legacy):
+    migrated, skipped = migrate_legacy_files(delete=not keep_legacy)
+    click.echo(f'Đã chuyển {migrated} file sang GridFS, bỏ qua {skipped} file đã có')
@@ -0,0 +1,199 @@
+# --- FILE: backend/services/metrics.py ---
+# Đo đạc: thời gian xử lý từng route, số query MongoDB mỗi request, độ trễ lệnh theo
+# collection (qua pymongo CommandListener) và log query chậm. Xuất dạng text Prometheus
+# tại /api/admin/metrics.
+# Số liệu nằm trong bộ nhớ của từng process: với nhiều worker gunicorn, mỗi lần scrape
+# chỉ thấy worker nhận request đó (Prometheus cộng dồn theo instance/pod).
+from flask import request, g
+from pymongo import monitoring
+import contextvars
+import logging
+import threading
+import time
+
+import database
+
+logger = logging.getLogger(__name__)
+
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Thống kê của request đang chạy; listener của pymongo được gọi đồng bộ trên thread của request
+_request_stats = contextvars.ContextVar('request_stats', default=None)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra: pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.labels, key)} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=HTTP_BUCKETS):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [đếm từng bucket..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.setdefault(label_values, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound: series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets + ('+Inf',), series[:-2] + [series[-1]]):
+                    labels = _format_labels(self.labels, key, 'le="%s"' % bound)
+                    lines.append(f'{self.name}_bucket{labels} {count}')
+                lines.append(f'{self.name}_sum{_format_labels(self.labels, key)} {series[-2]:.6f}')
+                lines.append(f'{self.name}_count{_format_labels(self.labels, key)} {series[-1]}')
+        return lines
+
+
+http_latency = Histogram('http_request_duration_seconds', 'Thời gian xử lý request theo route',
+                         ('method', 'route', 'status'))
+http_queries = Histogram('http_request_mongo_queries', 'Số lệnh MongoDB mỗi request (phát hiện N+1)',
+                         ('method', 'route'), QUERY_COUNT_BUCKETS)
+mongo_latency = Histogram('mongo_command_duration_seconds', 'Độ trễ lệnh MongoDB theo collection',
+                          ('command', 'collection'), MONGO_BUCKETS)
+mongo_failures = Counter('mongo_command_failures_total', 'Số lệnh MongoDB lỗi', ('command', 'collection'))
+mongo_slow = Counter('mongo_slow_commands_total', 'Số lệnh MongoDB vượt ngưỡng chậm', ('command', 'collection'))
+# Autosave bài thi: số lần client lưu và số document thực sự ghi xuống MongoDB (sau khi gộp)
+autosave_updates = Counter('exam_autosave_updates_total', 'Số lần lưu tạm bài thi nhận được')
+autosave_writes = Counter('exam_autosave_writes_total', 'Số lượt làm bài được ghi trong các lần flush autosave')
+REGISTRY = [http_latency, http_queries, mongo_latency, mongo_failures, mongo_slow, autosave_updates, autosave_writes]
+
+
+def render_metrics():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+# Lệnh nội bộ của driver (handshake, heartbeat, ...) không tính là query của ứng dụng
+IGNORED_COMMANDS = {'hello', 'ismaster', 'isMaster', 'ping', 'buildinfo', 'buildInfo', 'endSessions',
+                    'saslStart', 'saslContinue', 'killCursors'}
+
+
+class MongoMetricsListener(monitoring.CommandListener):
+    def __init__(self, slow_ms=100):
+        self.slow_ms = slow_ms
+        self._pending = {}  # (request_id, connection_id) -> (collection, filter keys)
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        if event.command_name in IGNORED_COMMANDS: return
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str): collection = '-'
+        # Chỉ giữ tên trường của filter cho log query chậm, không giữ giá trị (có thể là mật khẩu, token)
+        query = event.command.get('filter') or event.command.get('q') or {}
+        shape = sorted(query) if isinstance(query, dict) else []
+        with self._lock:
+            self._pending[(event.request_id, event.connection_id)] = (collection, shape)
+        stats = _request_stats.get()
+        if stats is not None: stats['queries'] += 1
+
+    def _finish(self, event, failed):
+        with self._lock:
+            entry = self._pending.pop((event.request_id, event.connection_id), None)
+        if entry is None: return
+        collection, shape = entry
+        seconds = event.duration_micros / 1e6
+        mongo_latency.observe(seconds, event.command_name, collection)
+        stats = _request_stats.get()
+        if stats is not None: stats['mongo_seconds'] += seconds
+        if failed: mongo_failures.inc(event.command_name, collection)
+        if seconds * 1000 >= self.slow_ms:
+            mongo_slow.inc(event.command_name, collection)
+            route = stats['route'] if stats is not None else '-'
+            logger.warning('Query chậm %.1fms: %s %s filter=%s route=%s',
+                           seconds * 1000, event.command_name, collection, shape, route)
+
+    def succeeded(self, event):
+        self._finish(event, False)
+
+    def failed(self, event):
+        self._finish(event, True)
+
+
+command_listener = MongoMetricsListener()
+
+
+def _route_label():
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+
+def begin_request(route):
+    """Bắt đầu đo một request; trả về mốc thời gian cho end_request"""
+    _request_stats.set({'queries': 0, 'mongo_seconds': 0.0, 'route': route})
+    return time.perf_counter()
+
+
+def server_timing(start):
+    """Giá trị header Server-Timing tính tới lúc gửi header (response stream: chưa gồm phần sinh body)"""
+    elapsed = time.perf_counter() - start
+    stats = _request_stats.get()
+    return f'app;dur={elapsed * 1000:.1f}, db;dur={stats["mongo_seconds"] * 1000:.1f};desc="{stats["queries"]} queries"'
+
+
+def end_request(method, status, start):
+    """Ghi histogram khi đã gửi xong response (gồm cả body stream) rồi dừng đếm query của request"""
+    elapsed = time.perf_counter() - start
+    stats = _request_stats.get()
+    _request_stats.set(None)
+    if stats is None: return
+    http_latency.observe(elapsed, method, stats['route'], status)
+    http_queries.observe(stats['queries'], method, stats['route'])
+
+
+def start_timer():
+    g.metrics_start = begin_request(_route_label())
+
+
+def record_request(response):
+    start = g.pop('metrics_start', None)
+    if start is None: return response
+    # Xem nhanh trong DevTools (tab Timing) mà không cần Prometheus
+    response.headers['Server-Timing'] = server_timing(start)
+    # Body stream (stream_json_list, stream_json_page) chỉ được duyệt sau after_request và query của nó vẫn
+    # chạy trên thread này: ghi histogram khi server đóng response
+    method, status = request.method, response.status_code
+    response.call_on_close(lambda: end_request(method, status, start))
+    return response
+
+
+def init_metrics(app):
+    """Gọi trước khi MongoClient được tạo (listener chỉ gắn được lúc khởi tạo client)"""
+    command_listener.slow_ms = app.config['MONGO_SLOW_QUERY_MS']
+    database.add_listener(command_listener)
+    app.before_request(start_timer)
+    app.after_request(record_request)
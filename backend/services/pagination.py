@@ -0,0 +1,174 @@
+# --- FILE: backend/services/pagination.py ---
+from flask import Response, request, current_app, stream_with_context
+from bson.objectid import ObjectId
+import base64
+import datetime
+import json
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class CursorError(ValueError):
+    """Cursor phân trang không hợp lệ (client gửi sai ?after / ?cursor)"""
+
+
+def parse_limit(default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE, args=None):
+    """Đọc ?limit=, ép về khoảng [1, maximum]. Trả về None nếu client không gửi."""
+    raw = (args if args is not None else request.args).get('limit')
+    if raw is None or raw == '':
+        return None
+    try:
+        limit = int(raw)
+    except ValueError:
+        return default
+    return max(1, min(limit, maximum))
+
+
+def parse_object_id(value):
+    if not value: return None
+    if not ObjectId.is_valid(value):
+        raise CursorError('Cursor không hợp lệ')
+    return ObjectId(value)
+
+
+def encode_time_cursor(created_at, doc_id):
+    """Cursor (created_at, _id) dạng base64 url-safe để client gửi lại nguyên văn"""
+    if isinstance(created_at, datetime.datetime):
+        created_at = created_at.isoformat()
+    raw = f"{created_at or ''}|{doc_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_time_cursor(cursor):
+    if not cursor: return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, doc_id = base64.urlsafe_b64decode(padded).decode('utf-8').split('|', 1)
+        return (datetime.datetime.fromisoformat(created_at) if created_at else None), ObjectId(doc_id)
+    except Exception:
+        raise CursorError('Cursor không hợp lệ')
+
+
+def time_cursor_filter(cursor, field='created_at'):
+    """Điều kiện keyset cho sort (field DESC, _id DESC): lấy các bản ghi 'cũ hơn' cursor"""
+    decoded = decode_time_cursor(cursor)
+    if not decoded: return {}
+    created_at, doc_id = decoded
+    if created_at is None:
+        return {field: None, '_id': {'$lt': doc_id}}
+    return {'$or': [
+        {field: {'$lt': created_at}},
+        {field: created_at, '_id': {'$lt': doc_id}},
+        {field: None},
+    ]}
+
+
+def encode_keyset_cursor(value, doc_id):
+    """Cursor (giá trị trường sort, _id) cho sort theo một trường bất kỳ (chuỗi, số hoặc datetime)"""
+    if isinstance(value, datetime.datetime):
+        value = {'$date': value.isoformat()}
+    raw = json.dumps([value, str(doc_id)], ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_keyset_cursor(cursor):
+    if not cursor: return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        value, doc_id = json.loads(base64.urlsafe_b64decode(padded).decode('utf-8'))
+        if isinstance(value, dict):
+            value = datetime.datetime.fromisoformat(value['$date'])
+        return value, ObjectId(doc_id)
+    except Exception:
+        raise CursorError('Cursor không hợp lệ')
+
+
+def keyset_filter(cursor, field, descending=False):
+    """
+    Điều kiện keyset cho sort (field, _id) cùng chiều: lấy các bản ghi đứng sau cursor.
+    Bản ghi thiếu `field` (null) đứng đầu khi tăng dần và cuối khi giảm dần, như thứ tự sort của MongoDB.
+    """
+    decoded = decode_keyset_cursor(cursor)
+    if not decoded: return {}
+    value, doc_id = decoded
+    after, id_after = ('$lt', {'$lt': doc_id}) if descending else ('$gt', {'$gt': doc_id})
+    if value is None:
+        return {field: None, '_id': id_after} if descending else \
+            {'$or': [{field: None, '_id': id_after}, {field: {'$ne': None}}]}
+    clauses = [{field: {after: value}}, {field: value, '_id': id_after}]
+    if descending: clauses.append({field: None})
+    return {'$or': clauses}
+
+
+def _dumps(obj):
+    return current_app.json.dumps(obj)
+
+
+def stream_json_list(docs, serialize):
+    """Stream một mảng JSON từ cursor MongoDB, không gom toàn bộ vào list trong RAM"""
+    def generate():
+        yield '['
+        first = True
+        for doc in docs:
+            yield ('' if first else ',') + _dumps(serialize(doc))
+            first = False
+        yield ']'
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+
+def stream_json_page(docs, limit, serialize, cursor_of):
+    """
+    Stream {"items": [...], "next_cursor": ...}.
+    `docs` phải được query với limit + 1 để biết còn trang sau hay không;
+    next_cursor được ghi cuối cùng nên vẫn stream được từng phần tử.
+    """
+    def generate():
+        yield '{"items":['
+        count = 0
+        next_cursor = None
+        last_cursor = None
+        for doc in docs:
+            if count == limit:
+                next_cursor = last_cursor
+                break
+            # Lấy cursor trước khi serialize vì serialize có thể đổi kiểu _id / created_at
+            last_cursor = cursor_of(doc)
+            yield ('' if count == 0 else ',') + _dumps(serialize(doc))
+            count += 1
+        yield '],"next_cursor":' + _dumps(next_cursor) + '}'
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+
+# --- Bản async cho asgi.py: docs là cursor của AsyncMongoClient ---
+
+def stream_json_list_async(docs, serialize):
+    from services.aio import AsyncStreamResponse, dumps
+
+    async def generate():
+        yield '['
+        first = True
+        async for doc in docs:
+            yield ('' if first else ',') + dumps(serialize(doc))
+            first = False
+        yield ']'
+    return AsyncStreamResponse(generate(), mimetype='application/json')
+
+
+def stream_json_page_async(docs, limit, serialize, cursor_of):
+    from services.aio import AsyncStreamResponse, dumps
+
+    async def generate():
+        yield '{"items":['
+        count = 0
+        next_cursor = None
+        last_cursor = None
+        async for doc in docs:
+            if count == limit:
+                next_cursor = last_cursor
+                break
+            last_cursor = cursor_of(doc)
+            yield ('' if count == 0 else ',') + dumps(serialize(doc))
+            count += 1
+        yield '],"next_cursor":' + dumps(next_cursor) + '}'
+    return AsyncStreamResponse(generate(), mimetype='application/json')
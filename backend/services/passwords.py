@@ -0,0 +1,113 @@
+# --- FILE: backend/services/passwords.py ---
+# Băm / kiểm tra mật khẩu (scrypt của werkzeug, tốn CPU) trên một pool thread giới hạn,
+# để một đợt đăng nhập dồn dập không chiếm hết thread phục vụ các request I/O khác.
+# hashlib.scrypt nhả GIL trong lúc tính nên các thread trong pool chạy song song thật.
+from concurrent.futures import ThreadPoolExecutor
+from flask import jsonify
+from flask.cli import AppGroup
+from pymongo import UpdateOne
+from werkzeug.security import generate_password_hash, check_password_hash
+from database import get_db
+import click
+import os
+import threading
+
+db = get_db()
+
+HASH_PREFIXES = ('scrypt:', 'pbkdf2:')
+
+
+class HashingBusy(Exception):
+    """Hàng đợi băm mật khẩu đã đầy, init_passwords đăng ký handler trả về 503"""
+
+
+class PasswordHasher:
+    def __init__(self, max_workers=None, max_pending=64, wait_timeout=5):
+        self._max_workers = max_workers or os.cpu_count() or 2
+        self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._wait_timeout = wait_timeout
+
+    def configure(self, max_workers=None, max_pending=None, wait_timeout=None):
+        if max_workers and max_workers != self._max_workers:
+            self._executor.shutdown(wait=False)
+            self._max_workers = max_workers
+            self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='password-hash')
+        if max_pending: self._slots = threading.BoundedSemaphore(max_pending)
+        if wait_timeout: self._wait_timeout = wait_timeout
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(timeout=self._wait_timeout):
+            raise HashingBusy()
+        try:
+            return self._executor.submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password)
+
+    def verify(self, stored_hash, password):
+        # Mật khẩu plaintext cũ đã được chuyển bằng `flask passwords migrate`, ở đây chỉ chấp nhận hash
+        if not is_hashed(stored_hash) or password is None: return False
+        return self._run(check_password_hash, stored_hash, password)
+
+    def map_hash(self, passwords):
+        """Băm song song một loạt mật khẩu (dùng cho migrate)"""
+        return list(self._executor.map(generate_password_hash, passwords))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+def is_hashed(value):
+    return isinstance(value, str) and value.startswith(HASH_PREFIXES) and value.count('$') == 2
+
+
+hasher = PasswordHasher()
+
+
+def migrate_plaintext_passwords(batch_size=200):
+    """Tìm mọi user còn lưu mật khẩu plaintext và băm lại theo từng batch, song song trên pool"""
+    query = {'password': {'$not': {'$regex': r'^(scrypt|pbkdf2):'}}}
+    migrated = 0
+    batch = []
+
+    def flush():
+        hashes = hasher.map_hash([u['password'] for u in batch])
+        # Điều kiện kèm password cũ: nếu user vừa đổi mật khẩu trong lúc migrate thì không ghi đè
+        ops = [
+            UpdateOne({'_id': u['_id'], 'password': u['password']}, {'$set': {'password': h}})
+            for u, h in zip(batch, hashes)
+        ]
+        return db.users.bulk_write(ops, ordered=False).modified_count
+
+    for user in db.users.find(query, {'password': 1}):
+        if not isinstance(user.get('password'), str): continue
+        batch.append(user)
+        if len(batch) >= batch_size:
+            migrated += flush()
+            batch = []
+    if batch:
+        migrated += flush()
+    return migrated
+
+
+passwords_cli = AppGroup('passwords', help='Quản lý mật khẩu người dùng')
+
+@passwords_cli.command('migrate')
+@click.option('--batch-size', default=200, show_default=True)
+def migrate_command(batch_size):
+    click.echo(f'Đã băm lại {migrate_plaintext_passwords(batch_size)} mật khẩu plaintext')
+
+
+def init_passwords(app):
+    """PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING trong app.config"""
+    app.cli.add_command(passwords_cli)
+    app.register_error_handler(
+        HashingBusy, lambda e: (jsonify({'message': 'Hệ thống đang bận, vui lòng thử lại'}), 503)
+    )
+    hasher.configure(
+        max_workers=app.config.get('PASSWORD_HASH_WORKERS'),
+        max_pending=app.config.get('PASSWORD_HASH_MAX_PENDING'),
+    )
@@ -0,0 +1,176 @@
+# --- FILE: backend/services/question_bank.py ---
+# Ngân hàng câu hỏi: mỗi câu là một document trong `questions`, đề thi chỉ giữ danh sách id
+# theo thứ tự nên một câu dùng lại được ở nhiều đề.
+#   questions: {_id, question, options, correct_index, creator_id, created_at}
+#   exams:     {..., question_ids: ['<id>', ...], question_count}
+# Đề cũ (mảng `questions` nhúng) vẫn đọc được; `flask questions migrate` chuyển sang ngân hàng.
+# Bản đề cho học sinh (không có correct_index, password) được dựng sẵn và cache theo (đề, version 'exams'):
+# sửa đề hay câu hỏi gọi bump_version('exams') nên mọi worker đọc lại trong vòng TTL của version_cache.
+from flask.cli import AppGroup
+from bson.objectid import ObjectId
+from database import get_db, get_async_db
+from services.cache import TTLCache
+from services.http_cache import bump_version, versioned_key, versioned_key_async
+import click
+import datetime
+
+db = get_db()
+adb = get_async_db()
+
+STUDENT_QUESTION_PROJECTION = {'question': 1, 'options': 1}
+EXAM_META_PROJECTION = {
+    'title': 1, 'description': 1, 'duration': 1, 'password': 1, 'creator_name': 1,
+    'question_ids': 1, 'questions.question': 1, 'questions.options': 1,
+}
+# 'exam_id:v<version>' -> {'password': ..., 'payload': {...}}
+student_exam_cache = TTLCache(maxsize=512, ttl=300)
+
+
+class QuestionError(ValueError):
+    """Dữ liệu câu hỏi client gửi lên không hợp lệ"""
+
+
+def clean_question(q):
+    question = str(q.get('question') or '').strip()
+    options = [str(o) for o in q.get('options') or []]
+    try:
+        correct_index = int(q.get('correct_index', 0))
+    except (TypeError, ValueError):
+        raise QuestionError('Đáp án đúng không hợp lệ')
+    if not question: raise QuestionError('Câu hỏi không được để trống')
+    if len(options) < 2: raise QuestionError('Mỗi câu hỏi cần tối thiểu 2 đáp án')
+    if not 0 <= correct_index < len(options): raise QuestionError('Đáp án đúng không hợp lệ')
+    return {'question': question, 'options': options, 'correct_index': correct_index}
+
+
+def save_exam_questions(items, creator_id, any_owner=False):
+    """
+    items: câu hỏi mới {question, options, correct_index} hoặc tham chiếu câu có sẵn {id}.
+    Chỉ tham chiếu được câu trong ngân hàng của creator_id (any_owner=True: admin dùng câu của mọi người).
+    Câu mới được ghi vào ngân hàng (một insert_many); trả về danh sách id theo đúng thứ tự.
+    """
+    now = datetime.datetime.now()
+    new_docs, refs, slots = [], [], []
+    for item in items:
+        if item.get('id') and not item.get('question'):
+            if not ObjectId.is_valid(item['id']): raise QuestionError('Id câu hỏi không hợp lệ')
+            refs.append(ObjectId(item['id']))
+            slots.append(('ref', item['id']))
+        else:
+            new_docs.append({**clean_question(item), 'creator_id': creator_id, 'created_at': now})
+            slots.append(('new', len(new_docs) - 1))
+    if refs:
+        query = {'_id': {'$in': list(set(refs))}}
+        if not any_owner: query['creator_id'] = creator_id
+        if db.questions.count_documents(query) != len(set(refs)):
+            raise QuestionError('Có câu hỏi không tồn tại trong ngân hàng của bạn')
+    new_ids = [str(i) for i in db.questions.insert_many(new_docs).inserted_ids] if new_docs else []
+    return [value if kind == 'ref' else new_ids[value] for kind, value in slots]
+
+
+def _ordered(ids, docs):
+    by_id = {str(d['_id']): d for d in docs}
+    return [by_id[i] for i in ids if i in by_id]
+
+
+def _question_query(exam):
+    return {'_id': {'$in': [ObjectId(i) for i in exam['question_ids']]}}
+
+
+def load_questions(exam, projection=None):
+    """Câu hỏi của đề theo thứ tự; đề cũ thì đọc mảng nhúng"""
+    if 'question_ids' not in exam: return exam.get('questions', [])
+    return _ordered(exam['question_ids'], db.questions.find(_question_query(exam), projection))
+
+
+async def load_questions_async(exam, projection=None):
+    if 'question_ids' not in exam: return exam.get('questions', [])
+    docs = await adb.questions.find(_question_query(exam), projection).to_list()
+    return _ordered(exam['question_ids'], docs)
+
+
+def _student_exam(exam, questions):
+    payload = {
+        '_id': str(exam['_id']),
+        'title': exam.get('title'),
+        'description': exam.get('description', ''),
+        'duration': exam.get('duration'),
+        'creator_name': exam.get('creator_name'),
+        'question_count': len(questions),
+        'questions': [
+            {**({'id': str(q['_id'])} if '_id' in q else {}), 'question': q.get('question'), 'options': q.get('options', [])}
+            for q in questions
+        ],
+    }
+    return {'password': exam.get('password') or '', 'payload': payload}
+
+
+def _load_student_exam(exam_id):
+    exam = db.exams.find_one({'_id': ObjectId(exam_id)}, EXAM_META_PROJECTION)
+    if not exam: return None
+    return _student_exam(exam, load_questions(exam, STUDENT_QUESTION_PROJECTION))
+
+
+def get_student_exam(exam_id):
+    """{'password', 'payload'} của đề (payload không có đáp án), None nếu đề không tồn tại"""
+    if not ObjectId.is_valid(exam_id): return None
+    return student_exam_cache.get_or_load(versioned_key('exams', exam_id), lambda: _load_student_exam(exam_id))
+
+
+async def get_student_exam_async(exam_id):
+    if not ObjectId.is_valid(exam_id): return None
+    key = await versioned_key_async('exams', exam_id)
+    entry = student_exam_cache.get(key)
+    if entry is None:
+        exam = await adb.exams.find_one({'_id': ObjectId(exam_id)}, EXAM_META_PROJECTION)
+        if not exam: return None
+        entry = _student_exam(exam, await load_questions_async(exam, STUDENT_QUESTION_PROJECTION))
+        student_exam_cache.set(key, entry)
+    return entry
+
+
+def page_questions(payload, offset=0, limit=None):
+    """Giao một phần câu hỏi (đề dài): limit=None thì trả về nguyên payload"""
+    if limit is None: return payload
+    offset = max(0, offset)
+    end = offset + limit
+    total = payload['question_count']
+    return {**payload, 'questions': payload['questions'][offset:end], 'offset': offset,
+            'next_offset': end if end < total else None}
+
+
+def exams_using(question_id):
+    """Id các đề đang dùng câu hỏi"""
+    return [str(e['_id']) for e in db.exams.find({'question_ids': str(question_id)}, {'_id': 1})]
+
+
+def migrate_exam(exam):
+    """Chuyển mảng questions nhúng của một đề sang ngân hàng câu hỏi"""
+    questions = exam.get('questions')
+    if questions is None or 'question_ids' in exam: return False
+    now = datetime.datetime.now()
+    docs = [{'question': q.get('question'), 'options': q.get('options', []), 'correct_index': q.get('correct_index'),
+             'creator_id': exam.get('creator_id'), 'created_at': now} for q in questions]
+    ids = [str(i) for i in db.questions.insert_many(docs).inserted_ids] if docs else []
+    result = db.exams.update_one(
+        {'_id': exam['_id'], 'questions': {'$exists': True}, 'question_ids': {'$exists': False}},
+        {'$set': {'question_ids': ids, 'question_count': len(ids)}, '$unset': {'questions': ''}}
+    )
+    if not result.modified_count:
+        # Tiến trình khác đã chuyển đề này trước -> bỏ các câu vừa ghi
+        if ids: db.questions.delete_many({'_id': {'$in': [ObjectId(i) for i in ids]}})
+        return False
+    bump_version('exams')
+    return True
+
+
+def migrate_all():
+    return sum(1 for exam in db.exams.find({'questions': {'$exists': True}, 'question_ids': {'$exists': False}})
+               if migrate_exam(exam))
+
+
+questions_cli = AppGroup('questions', help='Ngân hàng câu hỏi')
+
+@questions_cli.command('migrate')
+def migrate_command():
+    click.echo(f'Đã chuyển {migrate_all()} đề thi sang ngân hàng câu hỏi')
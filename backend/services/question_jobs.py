@@ -0,0 +1,217 @@
+# --- FILE: backend/services/question_jobs.py ---
+# Sinh câu hỏi từ PDF bằng AI chạy nền: request chỉ tạo job và trả về job id,
+# một pool thread giới hạn làm phần đọc PDF + gọi model, client hỏi trạng thái qua job id.
+# Trạng thái job lưu trong MongoDB (question_jobs) để mọi worker process đều đọc được.
+# PDF chỉ nằm trong bộ nhớ của worker nhận job nên job không chạy lại được sau khi worker tắt: job chưa chạy
+# bị hủy lúc tắt và job kẹt (worker chết giữa chừng) quá QUESTION_JOB_TIMEOUT được đánh dấu failed.
+from concurrent.futures import ThreadPoolExecutor
+from database import get_db
+from pymongo.errors import PyMongoError
+from pypdf import PdfReader
+import datetime
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import uuid
+
+db = get_db()
+logger = logging.getLogger(__name__)
+
+MAX_TEXT_CHARS = 10000  # Giới hạn ký tự để tránh lỗi token limit
+UNFINISHED = ['queued', 'extracting', 'generating']
+
+PROMPT_TEMPLATE = """
+        Bạn là giáo viên đang soạn đề thi trắc nghiệm dựa trên tài liệu học tập được cung cấp.
+        Dựa vào nội dung văn bản sau, hãy tạo ra đầy đủ câu hỏi trắc nghiệm tiếng Anh (hoặc tiếng Việt tùy nội dung).
+        Chú ý mỗi câu hỏi chỉ có 1 đáp án, đáp án có thể được đặt ở cuối tài liệu, phương án được highlight trong tài liệu.
+        Không tạo câu hỏi nếu không tìm thấy thông tin liên quan trong tài liệu.
+        Tạo 5 câu hỏi mẫu.
+        Không nhầm lẫn tạo câu hỏi từ tiêu đề của tài liệu, mục lục, hoặc các phần không liên quan.
+        Yêu cầu định dạng trả về là một chuỗi JSON thuần túy (không bọc trong Markdown code block), là một danh sách các object có cấu trúc:
+        [
+            {{
+                "question": "Nội dung câu hỏi?",
+                "options": ["Đáp án A", "Đáp án B", "Đáp án C", "Đáp án D"],
+                "correct_index": 0 (số nguyên 0-3 tương ứng A-D)
+            }}
+        ]
+        
+        Nội dung văn bản:
+        {text_content}
+        """
+
+
+# --- LLM client: thay được bằng QUESTION_LLM=stub để chạy offline ---
+class GeminiClient:
+    name = 'gemini-2.5-flash'
+
+    def __init__(self, api_key=None):
+        import google.generativeai as genai
+        genai.configure(api_key=api_key or os.getenv('GEMINI_API_KEY'))
+        self._model = genai.GenerativeModel(self.name)
+
+    def generate(self, prompt):
+        return self._model.generate_content(prompt).text
+
+
+class StubClient:
+    """Model giả trả về câu hỏi cố định lấy từ văn bản, dùng để test pipeline không cần mạng"""
+    name = 'stub'
+
+    def generate(self, prompt):
+        text = prompt.rsplit('Nội dung văn bản:', 1)[-1].strip()
+        first_line = (text.splitlines() or [''])[0][:80]
+        return json.dumps([{
+            'question': f'Nội dung chính của đoạn "{first_line}" là gì?',
+            'options': ['A', 'B', 'C', 'D'],
+            'correct_index': 0
+        }], ensure_ascii=False)
+
+
+LLM_CLIENTS = {'gemini': GeminiClient, 'stub': StubClient}
+
+
+class QuestionJobQueue:
+    def __init__(self, client=None, max_workers=2, max_pending=20):
+        self._client = client
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='question-job')
+        self._max_pending = max_pending
+        # Số job đang chờ/chạy của process này (giới hạn theo từng worker, không phải toàn hệ thống)
+        self._pending = 0
+        self._queued = set()  # job id đã submit vào pool nhưng chưa bắt đầu chạy
+        self._lock = threading.Lock()
+
+    def configure(self, client=None, max_workers=None, max_pending=None):
+        if client is not None: self._client = client
+        if max_workers:
+            self._executor.shutdown(wait=False)
+            self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='question-job')
+        if max_pending: self._max_pending = max_pending
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = LLM_CLIENTS[os.getenv('QUESTION_LLM', 'gemini')]()
+        return self._client
+
+    def submit(self, pdf_bytes, user_id):
+        """
+        Tạo job cho file PDF. Trả về document job, hoặc None nếu hàng đợi đã đầy.
+        Nếu cùng nội dung PDF đã từng được sinh câu hỏi thì job hoàn tất ngay từ cache.
+        """
+        content_hash = f'{self.client.name}:{hashlib.sha256(pdf_bytes).hexdigest()}'
+        job = {
+            '_id': uuid.uuid4().hex,
+            'user_id': user_id,
+            'content_hash': content_hash,
+            'status': 'queued',
+            'progress': 0,
+            'created_at': datetime.datetime.now(),
+        }
+        cached = db.question_cache.find_one({'_id': content_hash})
+        if cached:
+            job.update(status='done', progress=100, questions=cached['questions'], cached=True)
+            db.question_jobs.insert_one(job)
+            return job
+
+        with self._lock:
+            if self._pending >= self._max_pending:
+                return None
+            self._pending += 1
+            self._queued.add(job['_id'])
+        try:
+            db.question_jobs.insert_one(job)
+            self._executor.submit(self._run, job['_id'], pdf_bytes, content_hash)
+        except Exception:
+            # Job không được chạy (ghi lỗi, pool đã tắt) thì không giữ chỗ trong hàng đợi
+            with self._lock:
+                self._pending -= 1
+                self._queued.discard(job['_id'])
+            raise
+        return job
+
+    def _update(self, job_id, **fields):
+        db.question_jobs.update_one({'_id': job_id}, {'$set': fields})
+
+    def _run(self, job_id, pdf_bytes, content_hash):
+        with self._lock:
+            if job_id not in self._queued: return  # shutdown đã hủy và báo failed
+            self._queued.discard(job_id)
+        try:
+            self._update(job_id, status='extracting', progress=5)
+            reader = PdfReader(io.BytesIO(pdf_bytes))
+            parts = []
+            total_pages = len(reader.pages) or 1
+            length = 0
+            for i, page in enumerate(reader.pages):
+                text = page.extract_text() or ''
+                parts.append(text)
+                length += len(text) + 1
+                self._update(job_id, progress=5 + int(45 * (i + 1) / total_pages))
+                if length >= MAX_TEXT_CHARS: break
+            text_content = '\n'.join(parts)[:MAX_TEXT_CHARS]
+
+            self._update(job_id, status='generating', progress=50)
+            raw_text = self.client.generate(PROMPT_TEMPLATE.format(text_content=text_content))
+            clean_json_text = raw_text.replace("```json", "").replace("```", "").strip()
+            questions = json.loads(clean_json_text)
+
+            db.question_cache.update_one(
+                {'_id': content_hash},
+                {'$set': {'questions': questions, 'created_at': datetime.datetime.now()}},
+                upsert=True
+            )
+            self._update(job_id, status='done', progress=100, questions=questions)
+        except Exception as e:
+            logger.exception('Sinh câu hỏi cho job %s lỗi', job_id)
+            self._update(job_id, status='failed', error=str(e))
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def get(self, job_id):
+        return db.question_jobs.find_one({'_id': job_id})
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        # Job bị hủy trước khi chạy không còn ai cập nhật: báo failed để client không chờ mãi ở 'queued'
+        with self._lock:
+            cancelled, self._queued = list(self._queued), set()
+            self._pending -= len(cancelled)
+        if cancelled:
+            db.question_jobs.update_many({'_id': {'$in': cancelled}, 'status': 'queued'},
+                                         {'$set': {'status': 'failed', 'error': 'Server khởi động lại, vui lòng thử lại'}})
+
+
+def fail_stale_jobs(timeout):
+    """Job chưa xong sau `timeout` giây (worker tắt/chết khi đang chờ hoặc đang chạy) -> failed; trả về số job"""
+    cutoff = datetime.datetime.now() - datetime.timedelta(seconds=timeout)
+    return db.question_jobs.update_many(
+        {'status': {'$in': UNFINISHED}, 'created_at': {'$lt': cutoff}},
+        {'$set': {'status': 'failed', 'error': 'Job bị gián đoạn, vui lòng thử lại'}}
+    ).modified_count
+
+
+question_jobs = QuestionJobQueue()
+
+
+def init_question_jobs(app):
+    """QUESTION_LLM (gemini|stub), QUESTION_WORKERS, QUESTION_MAX_PENDING, QUESTION_JOB_TIMEOUT trong app.config"""
+    llm = app.config.get('QUESTION_LLM')
+    question_jobs.configure(
+        client=LLM_CLIENTS[llm]() if llm else None,
+        max_workers=app.config.get('QUESTION_WORKERS'),
+        max_pending=app.config.get('QUESTION_MAX_PENDING'),
+    )
+    timeout = app.config.get('QUESTION_JOB_TIMEOUT', 1800)
+    if not timeout: return
+    try:
+        stale = fail_stale_jobs(timeout)
+    except PyMongoError as e:
+        # MongoDB chưa sẵn sàng không làm sập app; worker khởi động sau sẽ dọn
+        app.logger.warning('Không dọn được job sinh câu hỏi bị gián đoạn: %s', e)
+        return
+    if stale: app.logger.warning('Đánh dấu failed %d job sinh câu hỏi bị gián đoạn', stale)
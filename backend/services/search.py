@@ -0,0 +1,116 @@
+# --- FILE: backend/services/search.py ---
+# Tìm kiếm chung cho khóa học, blog, đề thi và bộ thẻ.
+# Mỗi đối tượng có một document trong `search_index` với title/body đã chuẩn hóa
+# (chữ thường, bỏ dấu tiếng Việt, đ -> d) và một text index (default_language 'none':
+# không stemming tiếng Anh, không bỏ stop word) -> "ngu phap", "ngữ pháp", "Ngữ Pháp" đều khớp.
+# Các handler ghi gọi index_document / remove_document để giữ chỉ mục đồng bộ.
+from flask.cli import AppGroup
+from pymongo import ReplaceOne
+from database import get_db
+import click
+import re
+import unicodedata
+
+db = get_db()
+
+SEARCH_TYPES = ('course', 'blog', 'exam', 'flashcard')
+SNIPPET_LENGTH = 200
+MAX_PAGE = 50
+
+
+def normalize(text):
+    """Bỏ dấu tiếng Việt và đưa về chữ thường: 'Ngữ pháp Đặc biệt' -> 'ngu phap dac biet'"""
+    if not text: return ''
+    text = str(text).replace('đ', 'd').replace('Đ', 'D')
+    text = unicodedata.normalize('NFD', text)
+    text = ''.join(ch for ch in text if unicodedata.category(ch) != 'Mn')
+    return re.sub(r'\s+', ' ', text.lower()).strip()
+
+
+# type -> (collection, hàm lấy (title, body) từ document)
+SOURCES = {
+    'course': ('courses', lambda d: (d.get('title'), ' '.join(
+        str(d.get(f) or '') for f in ('description', 'level', 'instructor_name')))),
+    'blog': ('blogs', lambda d: (d.get('title'), f"{d.get('content') or ''} {d.get('author') or ''}")),
+    'exam': ('exams', lambda d: (d.get('title'), f"{d.get('description') or ''} {d.get('creator_name') or ''}")),
+    'flashcard': ('flashcards', lambda d: (d.get('title'), '')),
+}
+SOURCE_PROJECTIONS = {
+    'course': {'title': 1, 'description': 1, 'level': 1, 'instructor_name': 1},
+    'blog': {'title': 1, 'content': 1, 'author': 1, 'created_at': 1},
+    'exam': {'title': 1, 'description': 1, 'creator_name': 1},
+    'flashcard': {'title': 1},
+}
+
+
+def _entry(doc_type, doc):
+    title, body = SOURCES[doc_type][1](doc)
+    return {
+        '_id': f"{doc_type}:{doc['_id']}",
+        'type': doc_type,
+        'ref_id': str(doc['_id']),
+        'title': title or '',
+        'snippet': (body or '').strip()[:SNIPPET_LENGTH],
+        'title_norm': normalize(title),
+        'body_norm': normalize(body),
+    }
+
+
+def index_document(doc_type, doc):
+    """Thêm / cập nhật chỉ mục cho một document (doc phải có _id và các trường nguồn)"""
+    entry = _entry(doc_type, doc)
+    db.search_index.replace_one({'_id': entry['_id']}, entry, upsert=True)
+
+
+def remove_document(doc_type, doc_id):
+    db.search_index.delete_one({'_id': f'{doc_type}:{doc_id}'})
+
+
+def remove_documents(doc_type, doc_ids):
+    if doc_ids: db.search_index.delete_many({'_id': {'$in': [f'{doc_type}:{i}' for i in doc_ids]}})
+
+
+def search(query, types=None, page=1, limit=20):
+    """Trả về {'items': [...], 'page': n, 'has_more': bool}, xếp theo textScore"""
+    terms = normalize(query)
+    if not terms: return {'items': [], 'page': page, 'has_more': False}
+    mongo_query = {'$text': {'$search': terms}}
+    if types: mongo_query['type'] = {'$in': list(types)}
+    page = max(1, min(page, MAX_PAGE))
+    cursor = db.search_index.find(
+        mongo_query,
+        {'score': {'$meta': 'textScore'}, 'type': 1, 'ref_id': 1, 'title': 1, 'snippet': 1}
+    ).sort([('score', {'$meta': 'textScore'})]).skip((page - 1) * limit).limit(limit + 1)
+    items = [
+        {'type': d['type'], 'id': d['ref_id'], 'title': d['title'], 'snippet': d['snippet'],
+         'score': round(d['score'], 3)}
+        for d in cursor
+    ]
+    return {'items': items[:limit], 'page': page, 'has_more': len(items) > limit}
+
+
+def reindex(batch_size=1000):
+    """Dựng lại toàn bộ search_index từ các collection nguồn"""
+    counts = {}
+    for doc_type, (collection, _) in SOURCES.items():
+        ops = []
+        counts[doc_type] = 0
+        for doc in db[collection].find({}, SOURCE_PROJECTIONS[doc_type]):
+            entry = _entry(doc_type, doc)
+            ops.append(ReplaceOne({'_id': entry['_id']}, entry, upsert=True))
+            if len(ops) >= batch_size:
+                db.search_index.bulk_write(ops, ordered=False)
+                counts[doc_type] += len(ops)
+                ops = []
+        if ops:
+            db.search_index.bulk_write(ops, ordered=False)
+            counts[doc_type] += len(ops)
+    return counts
+
+
+search_cli = AppGroup('search', help='Chỉ mục tìm kiếm')
+
+@search_cli.command('reindex')
+def reindex_command():
+    for doc_type, count in reindex().items():
+        click.echo(f'{doc_type}: {count}')
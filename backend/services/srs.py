@@ -0,0 +1,147 @@
+# --- FILE: backend/services/srs.py ---
+# Ôn tập ngắt quãng kiểu SM-2. Trạng thái ôn của từng (user, thẻ) nằm trong `flashcard_reviews`:
+#   {_id: 'user_id:card_id', user_id, card_id, deck_id, ease, interval, repetitions, due_at, reviewed_at}
+# Index (user_id, due_at) nên "20 thẻ đến hạn tiếp theo" là một range query trên index.
+from bson.objectid import ObjectId
+from pymongo import UpdateOne, InsertOne, ASCENDING
+from pymongo.errors import BulkWriteError
+from database import get_db
+import datetime
+
+db = get_db()
+
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+BATCH_SIZE = 1000
+
+
+class ReviewError(ValueError):
+    """Kết quả ôn tập client gửi lên không hợp lệ"""
+
+
+def sm2(state, quality, now):
+    """
+    quality: 0-5 (0 = quên hẳn, 5 = nhớ ngay). Trả về các trường trạng thái mới.
+    Dưới 3 coi như quên: học lại từ đầu, ôn lại sau 1 ngày.
+    """
+    ease = state.get('ease', DEFAULT_EASE)
+    repetitions = state.get('repetitions', 0)
+    interval = state.get('interval', 0)
+    if quality < 3:
+        repetitions = 0
+        interval = 1
+    else:
+        repetitions += 1
+        if repetitions == 1: interval = 1
+        elif repetitions == 2: interval = 6
+        else: interval = round(interval * ease)
+    ease = max(MIN_EASE, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    return {
+        'ease': round(ease, 3),
+        'repetitions': repetitions,
+        'interval': interval,
+        'due_at': now + datetime.timedelta(days=interval),
+        'reviewed_at': now,
+    }
+
+
+def start_deck(user_id, deck_id):
+    """Đưa mọi thẻ của bộ thẻ vào hàng đợi ôn của user (đến hạn ngay), thẻ đã có thì giữ nguyên"""
+    now = datetime.datetime.now()
+    added = 0
+    ops = []
+
+    def flush():
+        try:
+            return db.flashcard_reviews.bulk_write(ops, ordered=False).inserted_count
+        except BulkWriteError as e:
+            # Trùng _id = thẻ đã có trong hàng đợi, bỏ qua
+            return e.details.get('nInserted', 0)
+
+    for card in db.flashcard_cards.find({'deck_id': deck_id}, {'_id': 1}).sort('position', ASCENDING):
+        ops.append(InsertOne({
+            '_id': f"{user_id}:{card['_id']}",
+            'user_id': user_id,
+            'card_id': str(card['_id']),
+            'deck_id': deck_id,
+            'ease': DEFAULT_EASE,
+            'repetitions': 0,
+            'interval': 0,
+            'due_at': now,
+        }))
+        if len(ops) >= BATCH_SIZE:
+            added += flush()
+            ops = []
+    if ops:
+        added += flush()
+    return added
+
+
+def due_cards(user_id, limit=20, deck_id=None, now=None):
+    """Các thẻ đến hạn sớm nhất của user, kèm nội dung thẻ"""
+    query = {'user_id': user_id, 'due_at': {'$lte': now or datetime.datetime.now()}}
+    if deck_id: query['deck_id'] = deck_id
+    states = list(db.flashcard_reviews.find(query).sort('due_at', ASCENDING).limit(limit))
+    card_ids = [ObjectId(s['card_id']) for s in states]
+    cards = {str(c['_id']): c for c in db.flashcard_cards.find({'_id': {'$in': card_ids}})}
+    items = []
+    for s in states:
+        card = cards.get(s['card_id'])
+        if not card: continue
+        items.append({
+            'card_id': s['card_id'],
+            'deck_id': s['deck_id'],
+            'front': card.get('front'),
+            'back': card.get('back'),
+            'example': card.get('example'),
+            'due_at': s['due_at'].isoformat(),
+            'repetitions': s.get('repetitions', 0),
+        })
+    return items
+
+
+def clean_grades(grades):
+    """[{'card_id': str, 'quality': int 0-5}, ...] hợp lệ; ReviewError nếu sai"""
+    cleaned = []
+    for g in grades:
+        if not isinstance(g, dict) or not ObjectId.is_valid(str(g.get('card_id'))):
+            raise ReviewError('Thẻ không hợp lệ')
+        try:
+            quality = int(g.get('quality'))
+        except (TypeError, ValueError):
+            raise ReviewError('Mức nhớ không hợp lệ')
+        if not 0 <= quality <= 5: raise ReviewError('Mức nhớ phải từ 0 đến 5')
+        cleaned.append({'card_id': str(g['card_id']), 'quality': quality})
+    return cleaned
+
+
+def record_reviews(user_id, grades):
+    """
+    grades: [{'card_id': ..., 'quality': 0-5}, ...] (ReviewError nếu sai). Đọc trạng thái hiện tại bằng
+    một query $in, tính SM-2 rồi ghi tất cả bằng một bulk_write. Trả về số thẻ đã cập nhật.
+    """
+    now = datetime.datetime.now()
+    grades = clean_grades(grades)
+    keys = [f"{user_id}:{g['card_id']}" for g in grades]
+    states = {s['_id']: s for s in db.flashcard_reviews.find({'_id': {'$in': keys}})}
+    missing = [ObjectId(g['card_id']) for key, g in zip(keys, grades) if key not in states]
+    deck_of = {}
+    if missing:
+        # Thẻ chưa có trong hàng đợi (ôn lẻ): cần deck_id để lưu trạng thái
+        for c in db.flashcard_cards.find({'_id': {'$in': missing}}, {'deck_id': 1}):
+            deck_of[str(c['_id'])] = c['deck_id']
+
+    ops = []
+    for key, g in zip(keys, grades):
+        state = states.get(key)
+        deck_id = state['deck_id'] if state else deck_of.get(str(g['card_id']))
+        if not deck_id: continue
+        new_state = sm2(state or {}, g['quality'], now)
+        ops.append(UpdateOne(
+            {'_id': key},
+            {'$set': {**new_state, 'user_id': user_id, 'card_id': str(g['card_id']), 'deck_id': deck_id}},
+            upsert=True
+        ))
+    if not ops: return 0
+    db.flashcard_reviews.bulk_write(ops, ordered=False)
+    return len(ops)
@@ -0,0 +1,156 @@
+# --- FILE: backend/services/stats.py ---
+# Bộ đếm thống kê được duy trì sẵn trong collection `stats`:
+#   {_id: 'totals', users, courses, flashcards, blogs, exams}
+#   {_id: 'daily:YYYY-MM-DD', date: 'YYYY-MM-DD', users: +n, ...}   (tăng trưởng ròng theo ngày)
+#   {_id: 'lease:reconcile', owner, until}                           (process đang chạy reconciler nền)
+# Các handler tạo/xóa gọi bump(); reconciler chạy nền sửa sai lệch bằng số đếm thật. Mỗi process đều có
+# thread reconciler nhưng chỉ process giữ lease mới đếm, nên cả cụm chỉ đếm một lần mỗi chu kỳ.
+from flask.cli import AppGroup
+from pymongo.errors import DuplicateKeyError
+from database import get_db, get_async_db
+import asyncio
+import click
+import datetime
+import os
+import socket
+import threading
+
+db = get_db()
+adb = get_async_db()
+
+COUNTED_COLLECTIONS = ['users', 'courses', 'flashcards', 'blogs', 'exams']
+TOTALS_ID = 'totals'
+LEASE_ID = 'lease:reconcile'
+# Số lần đếm lại khi bump() đổi totals trong lúc đang đếm
+RECONCILE_RETRIES = 3
+
+
+def bump(collection, delta=1):
+    """Cập nhật bộ đếm khi một handler tạo (+) hoặc xóa (-) document"""
+    if not delta: return
+    today = datetime.date.today().isoformat()
+    db.stats.update_one({'_id': TOTALS_ID}, {'$inc': {collection: delta}}, upsert=True)
+    db.stats.update_one(
+        {'_id': f'daily:{today}'},
+        {'$inc': {collection: delta}, '$setOnInsert': {'date': today}},
+        upsert=True
+    )
+
+
+def reconcile():
+    """
+    Đếm chính xác từng collection và ghi đè bộ đếm tổng (sửa sai lệch tích lũy).
+    Ghi kiểu compare-and-set theo giá trị đọc trước khi đếm: bump() chen vào giữa thì đếm lại,
+    để không ghi đè mất lần tăng/giảm đó. Hết số lần thử thì để lần reconcile sau.
+    """
+    for _ in range(RECONCILE_RETRIES):
+        before = db.stats.find_one({'_id': TOTALS_ID}) or {}
+        counts = {name: db[name].count_documents({}) for name in COUNTED_COLLECTIONS}
+        try:
+            result = db.stats.update_one(
+                {'_id': TOTALS_ID, **{name: before.get(name) for name in COUNTED_COLLECTIONS}},
+                {'$set': {**counts, 'reconciled_at': datetime.datetime.now()}},
+                upsert=not before
+            )
+        except DuplicateKeyError:
+            continue  # totals vừa được tạo bởi bump()
+        if result.matched_count or result.upserted_id: break
+    return counts
+
+
+def get_counts(mode='materialized'):
+    """
+    mode='materialized': đọc một document `totals` (mặc định, O(1))
+    mode='estimated': estimated_document_count, dùng metadata của collection, không quét
+    mode='exact': count_documents({}), quét toàn bộ như trước đây
+    """
+    if mode == 'estimated':
+        return {name: db[name].estimated_document_count() for name in COUNTED_COLLECTIONS}
+    if mode == 'exact':
+        return {name: db[name].count_documents({}) for name in COUNTED_COLLECTIONS}
+    totals = db.stats.find_one({'_id': TOTALS_ID})
+    if not totals:
+        return reconcile()
+    return {name: max(0, totals.get(name, 0)) for name in COUNTED_COLLECTIONS}
+
+
+async def get_counts_async(mode='materialized'):
+    """Như get_counts; với estimated/exact, năm lệnh đếm chạy song song"""
+    if mode == 'estimated':
+        values = await asyncio.gather(*(adb[name].estimated_document_count() for name in COUNTED_COLLECTIONS))
+        return dict(zip(COUNTED_COLLECTIONS, values))
+    if mode == 'exact':
+        values = await asyncio.gather(*(adb[name].count_documents({}) for name in COUNTED_COLLECTIONS))
+        return dict(zip(COUNTED_COLLECTIONS, values))
+    totals = await adb.stats.find_one({'_id': TOTALS_ID})
+    if not totals:
+        return await asyncio.to_thread(reconcile)
+    return {name: max(0, totals.get(name, 0)) for name in COUNTED_COLLECTIONS}
+
+
+def _growth_query(days):
+    since = (datetime.date.today() - datetime.timedelta(days=days - 1)).isoformat()
+    return {'_id': {'$gte': f'daily:{since}', '$lt': 'daily;'}}
+
+
+def _growth_point(doc):
+    return {'date': doc['date'], **{name: doc.get(name, 0) for name in COUNTED_COLLECTIONS}}
+
+
+def get_growth(days=30):
+    """Chuỗi tăng trưởng ròng theo ngày trong `days` ngày gần nhất, đọc từ các document daily"""
+    return [_growth_point(doc) for doc in db.stats.find(_growth_query(days)).sort('_id', 1)]
+
+
+async def get_growth_async(days=30):
+    return [_growth_point(doc) async for doc in adb.stats.find(_growth_query(days)).sort('_id', 1)]
+
+
+def _hold_lease(owner, seconds):
+    """Nhận hoặc gia hạn lease của reconciler; False nếu process khác đang giữ và chưa hết hạn"""
+    now = datetime.datetime.now()
+    try:
+        db.stats.update_one(
+            {'_id': LEASE_ID, '$or': [{'owner': owner}, {'until': {'$lt': now}}]},
+            {'$set': {'owner': owner, 'until': now + datetime.timedelta(seconds=seconds)}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        return False
+    return True
+
+
+def _reconcile_loop(app, interval, stop_event):
+    owner = f'{socket.gethostname()}:{os.getpid()}'
+    while not stop_event.wait(interval):
+        try:
+            # Lease dài hai chu kỳ: process giữ lease gia hạn mỗi chu kỳ, chết thì process khác nhận sau đó
+            if _hold_lease(owner, interval * 2): reconcile()
+        except Exception as e:
+            app.logger.warning('Stats reconcile lỗi: %s', e)
+
+
+stats_cli = AppGroup('stats', help='Bộ đếm thống kê cho trang admin')
+
+@stats_cli.command('reconcile')
+def reconcile_command():
+    for name, count in reconcile().items():
+        click.echo(f'{name}: {count}')
+
+
+def init_stats(app):
+    """Đăng ký CLI và chạy reconciler nền (STATS_RECONCILE_INTERVAL giây, 0 để tắt và chỉ chạy qua CLI)"""
+    app.cli.add_command(stats_cli)
+    interval = app.config.get('STATS_RECONCILE_INTERVAL', 600)
+    if interval:
+        stop_event = threading.Event()
+        thread = threading.Thread(
+            target=_reconcile_loop, args=(app, interval, stop_event), name='stats-reconciler', daemon=True
+        )
+        thread.start()
+        app.extensions['stats_reconciler'] = stop_event
+
+
+def stop_stats(app):
+    stop_event = app.extensions.pop('stats_reconciler', None)
+    if stop_event: stop_event.set()
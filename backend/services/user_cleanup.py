@@ -0,0 +1,220 @@
+# --- FILE: backend/services/user_cleanup.py ---
+# Dọn dữ liệu phụ thuộc của tài khoản đã xóa, chạy nền để thao tác xóa của admin trả về ngay:
+#   user_cleanup: {_id: user_id, username, status: pending|running|done|failed, attempts,
+#                  created_at, started_at, finished_at, removed: {bước: số bản ghi}, exam_ids, error}
+# Job nằm trong MongoDB nên worker của process nào cũng nhận được (claim bằng find_one_and_update);
+# mỗi bước xóa theo lô CLEANUP_BATCH_SIZE và chạy lại được (idempotent) nếu worker chết giữa chừng.
+from flask.cli import AppGroup
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+from gridfs.errors import NoFile
+from database import get_db
+from services.analytics import rebuild as rebuild_analytics
+from services.enrollments import remove_user as remove_enrollments
+from services.materials import get_bucket, MATERIALS_BUCKET
+from services.search import remove_documents
+from services.stats import bump as bump_stats
+from services.http_cache import bump_version
+import click
+import datetime
+import logging
+import re
+import threading
+
+db = get_db()
+logger = logging.getLogger(__name__)
+
+CLEANUP_BATCH_SIZE = 1000
+MAX_ATTEMPTS = 3
+# Job 'running' quá lâu coi như worker đã chết -> cho worker khác nhận lại
+STALE_AFTER = datetime.timedelta(minutes=15)
+
+_wake = threading.Event()
+
+
+def enqueue(users):
+    """users: [(user_id, username)] vừa bị xóa. Trả về số job mới"""
+    now = datetime.datetime.now()
+    jobs = [{'_id': str(uid), 'username': name, 'status': 'pending', 'attempts': 0, 'created_at': now}
+            for uid, name in users]
+    if not jobs: return 0
+    try:
+        created = len(db.user_cleanup.insert_many(jobs, ordered=False).inserted_ids)
+    except BulkWriteError as e:
+        created = e.details.get('nInserted', 0)  # job của user này đã có
+    _wake.set()
+    return created
+
+
+def _delete_batched(collection, query, on_batch=None):
+    """Xóa theo lô _id để không giữ khóa/ghi oplog một lần quá lớn; trả về số bản ghi đã xóa"""
+    total = 0
+    while True:
+        batch = list(collection.find(query, {'_id': 1}).limit(CLEANUP_BATCH_SIZE))
+        if not batch: return total
+        ids = [d['_id'] for d in batch]
+        if on_batch: on_batch(ids)
+        total += collection.delete_many({'_id': {'$in': ids}}).deleted_count
+
+
+def _cleanup_results(user_id):
+    # Thống kê đề thi tính từ results -> danh sách đề user đã làm được lưu vào job trước khi xóa
+    # để bước 'exam_stats' (kể cả khi chạy lại sau lỗi, lúc results đã xóa hết) vẫn dựng lại đủ
+    exam_ids = db.results.distinct('exam_id', {'user_id': user_id})
+    if exam_ids: db.user_cleanup.update_one({'_id': user_id}, {'$addToSet': {'exam_ids': {'$each': exam_ids}}})
+    removed = _delete_batched(db.results, {'user_id': user_id})
+    # _id của bộ đếm là 'user_id:exam_id' -> regex tiền tố chạy trên index _id
+    db.attempt_counters.delete_many({'_id': {'$regex': '^' + re.escape(f'{user_id}:')}})
+    return removed
+
+
+def _rebuild_exam_stats(user_id):
+    job = db.user_cleanup.find_one({'_id': user_id}, {'exam_ids': 1}) or {}
+    exam_ids = job.get('exam_ids') or []
+    for exam_id in exam_ids:
+        rebuild_analytics(exam_id)
+    return len(exam_ids)
+
+
+def _cleanup_blogs(user_id):
+    removed = _delete_batched(db.blogs, {'author_id': user_id},
+                              lambda ids: remove_documents('blog', [str(i) for i in ids]))
+    bump_stats('blogs', -removed)
+    if removed: bump_version('blogs')
+    return removed
+
+
+def _cleanup_comments(user_id):
+    result = db.blogs.update_many({'comments.user_id': user_id}, {'$pull': {'comments': {'user_id': user_id}}})
+    return result.modified_count
+
+
+def _cleanup_materials(user_id):
+    bucket = get_bucket()
+    files = db[f'{MATERIALS_BUCKET}.files']
+    file_ids = []
+    query = {'metadata.uploader_id': user_id}
+    while batch := [f['_id'] for f in files.find(query, {'_id': 1}).limit(CLEANUP_BATCH_SIZE)]:
+        for file_id in batch:
+            try:
+                bucket.delete(file_id)  # xóa cả các chunk
+            except NoFile:
+                pass
+        file_ids.extend(str(i) for i in batch)
+    # File cũ chưa chuyển sang GridFS
+    _delete_batched(db.course_files, {'uploader_id': user_id}, lambda ids: file_ids.extend(str(i) for i in ids))
+    if file_ids:
+        # Bỏ tham chiếu materials[] trỏ tới file đã xóa
+        db.courses.update_many({'materials.file_id': {'$in': file_ids}},
+                               {'$pull': {'materials': {'file_id': {'$in': file_ids}}}})
+    return len(file_ids)
+
+
+def _cleanup_enrollments(user_id):
+    removed = remove_enrollments(user_id)
+    if removed: bump_version('courses')
+    return removed
+
+
+# (tên bước, hàm(user_id) -> số bản ghi đã xóa/sửa)
+STEPS = [
+    ('results', _cleanup_results),
+    ('exam_stats', _rebuild_exam_stats),
+    ('blogs', _cleanup_blogs),
+    ('comments', _cleanup_comments),
+    ('materials', _cleanup_materials),
+    ('enrollments', _cleanup_enrollments),
+    ('flashcard_reviews', lambda uid: _delete_batched(db.flashcard_reviews, {'user_id': uid})),
+    ('exam_attempts', lambda uid: db.exam_attempts.delete_many({'user_id': uid}).deleted_count),
+    ('question_jobs', lambda uid: db.question_jobs.delete_many({'user_id': uid}).deleted_count),
+]
+
+
+def _claim(skip=()):
+    now = datetime.datetime.now()
+    return db.user_cleanup.find_one_and_update(
+        {'$or': [{'status': 'pending'}, {'status': 'running', 'started_at': {'$lt': now - STALE_AFTER}}],
+         '_id': {'$nin': list(skip)}},
+        {'$set': {'status': 'running', 'started_at': now}, '$inc': {'attempts': 1}},
+        sort=[('created_at', 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def run_job(job):
+    user_id = job['_id']
+    removed = dict(job.get('removed') or {})  # lần thử trước đã xóa được một phần
+    try:
+        for name, step in STEPS:
+            removed[name] = removed.get(name, 0) + step(user_id)
+    except Exception as e:
+        logger.exception('Dọn dữ liệu của user %s lỗi', user_id)
+        status = 'failed' if job.get('attempts', 1) >= MAX_ATTEMPTS else 'pending'
+        db.user_cleanup.update_one({'_id': user_id}, {'$set': {'status': status, 'error': str(e), 'removed': removed}})
+        return False
+    db.user_cleanup.update_one({'_id': user_id}, {'$set': {
+        'status': 'done', 'removed': removed, 'finished_at': datetime.datetime.now()
+    }, '$unset': {'error': ''}})
+    return True
+
+
+def run_pending(limit=None):
+    """Chạy các job đang chờ (tối đa `limit`), trả về số job đã xong"""
+    done = 0
+    tried = set()  # job lỗi được thử lại ở lượt sau, không lặp ngay trong lượt này
+    while limit is None or done < limit:
+        job = _claim(tried)
+        if not job: break
+        tried.add(job['_id'])
+        if run_job(job): done += 1
+    return done
+
+
+def get_status():
+    """Số job theo trạng thái và vài job thất bại gần nhất (cho trang admin)"""
+    pipeline = [{'$group': {'_id': '$status', 'count': {'$sum': 1}}}]
+    counts = {d['_id']: d['count'] for d in db.user_cleanup.aggregate(pipeline)}
+    failed = db.user_cleanup.find({'status': 'failed'}, {'username': 1, 'error': 1}).sort('created_at', -1).limit(20)
+    return {'counts': counts,
+            'failed': [{'user_id': f['_id'], 'username': f.get('username'), 'error': f.get('error')} for f in failed]}
+
+
+def _cleanup_loop(app, interval, stop_event):
+    while not stop_event.is_set():
+        try:
+            run_pending()
+        except Exception as e:
+            app.logger.warning('Dọn dữ liệu user lỗi: %s', e)
+        # Job mới trong process này đánh thức ngay; job từ process khác được nhận sau tối đa `interval` giây
+        _wake.wait(interval)
+        _wake.clear()
+
+
+user_cleanup_cli = AppGroup('users', help='Tài khoản người dùng')
+
+@user_cleanup_cli.command('cleanup')
+@click.option('--retry-failed', is_flag=True, help='Chạy lại cả các job đã thất bại')
+def cleanup_command(retry_failed):
+    if retry_failed:
+        db.user_cleanup.update_many({'status': 'failed'}, {'$set': {'status': 'pending', 'attempts': 0}})
+    click.echo(f'Đã dọn dữ liệu của {run_pending()} tài khoản')
+
+
+def init_user_cleanup(app):
+    """Đăng ký CLI và chạy worker nền (USER_CLEANUP_INTERVAL giây, 0 để tắt và chạy bằng `flask users cleanup`)"""
+    app.cli.add_command(user_cleanup_cli)
+    interval = app.config.get('USER_CLEANUP_INTERVAL', 30)
+    if interval:
+        stop_event = threading.Event()
+        thread = threading.Thread(
+            target=_cleanup_loop, args=(app, interval, stop_event), name='user-cleanup', daemon=True
+        )
+        thread.start()
+        app.extensions['user_cleanup'] = stop_event
+
+
+def stop_user_cleanup(app):
+    stop_event = app.extensions.pop('user_cleanup', None)
+    if stop_event:
+        stop_event.set()
+        _wake.set()
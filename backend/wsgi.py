@@ -0,0 +1,6 @@
+# Entry point cho môi trường production:
+#   gunicorn -c gunicorn.conf.py wsgi:app
+# Mỗi worker process import file này sau khi fork nên có MongoClient và thread nền riêng.
+from app import create_app
+
+app = create_app('production')
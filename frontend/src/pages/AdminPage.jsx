@@ -10,6 +10,7 @@ export const AdminPage = ({ user, handleLogout, setCurrentPage }) => {
     const [activeTab, setActiveTab] = useState("dashboard");
     const [stats, setStats] = useState({ users: 0, courses: 0, flashcards: 0, blogs: 0, exams: 0 });
     const [dataList, setDataList] = useState([]);
+    const [usersCursor, setUsersCursor] = useState(null);
     const [loading, setLoading] = useState(false);
     const [isModalOpen, setIsModalOpen] = useState(false);
     const [formData, setFormData] = useState({});
@@ -30,7 +31,12 @@ export const AdminPage = ({ user, handleLogout, setCurrentPage }) => {
         setLoading(true);
         try {
             let data = [];
-            if (tab === "users") data = await adminService.getAllUsers();
+            if (tab === "users") {
+                // Danh sách user phân trang, tải thêm bằng nút "Xem thêm"
+                const page = await adminService.getUsers();
+                data = page.items;
+                setUsersCursor(page.next_cursor);
+            }
             if (tab === "courses") data = await courseService.getAll();
             if (tab === "flashcards") data = await flashcardService.getAll();
             if (tab === "blogs") data = await blogService.getAll();
@@ -40,6 +46,14 @@ export const AdminPage = ({ user, handleLogout, setCurrentPage }) => {
         finally { setLoading(false); }
     };
 
+    const loadMoreUsers = async () => {
+        try {
+            const page = await adminService.getUsers({ cursor: usersCursor });
+            setDataList(prev => [...prev, ...page.items]);
+            setUsersCursor(page.next_cursor);
+        } catch (err) { alert(err.message); }
+    };
+
     const handleDelete = async (id) => {
         if (!window.confirm("Bạn chắc chắn muốn xóa mục này?")) return;
         try {
@@ -279,7 +293,7 @@ export const AdminPage = ({ user, handleLogout, setCurrentPage }) => {
                                                 {activeTab === "courses" && `${item.price}đ - ${item.level} (GV: ${item.instructor_name || 'Admin'})`}
                                                 {activeTab === "exams" && `${item.duration}p - ${item.questions?.length} câu`}
                                                 {activeTab === "blogs" && `Tác giả: ${item.author}`}
-                                                {activeTab === "flashcards" && `${item.cards?.length || 0} thẻ`}
+                                                {activeTab === "flashcards" && `${item.card_count ?? item.cards?.length ?? 0} thẻ`}
                                             </td>
                                             <td className="p-4 text-right">
                                                 <button onClick={() => handleDelete(item._id)} className="text-red-500 hover:bg-red-50 p-2 rounded"><Trash2 size={18} /></button>
@@ -289,6 +303,9 @@ export const AdminPage = ({ user, handleLogout, setCurrentPage }) => {
                                     {dataList.length === 0 && <tr><td colSpan="3" className="p-6 text-center text-gray-400">Không có dữ liệu</td></tr>}
                                 </tbody>
                             </table>
+                            {activeTab === "users" && usersCursor && (
+                                <div className="p-4 text-center"><button onClick={loadMoreUsers} className="text-blue-600 font-bold hover:underline">Xem thêm</button></div>
+                            )}
                         </div>
                     )
                 )}
@@ -14,6 +14,9 @@ export const CourseDetailPage = ({ user, courseId, onBack }) => {
     const [materialTitle, setMaterialTitle] = useState("");
     const [selectedFile, setSelectedFile] = useState(null);
     const [isUploading, setIsUploading] = useState(false);
+    // Chi tiết khóa học chỉ kèm vài thông báo mới nhất; thông báo cũ hơn tải thêm theo trang
+    const [olderAnnouncements, setOlderAnnouncements] = useState([]);
+    const [announcementCursor, setAnnouncementCursor] = useState(null);
 
     useEffect(() => {
         if (courseId) fetchDetail();
@@ -25,10 +28,20 @@ export const CourseDetailPage = ({ user, courseId, onBack }) => {
             const data = await courseService.getDetail(courseId);
             setCourse(data.course);
             setHasAccess(data.access);
+            setOlderAnnouncements([]);
+            setAnnouncementCursor(data.course.announcements_cursor || null);
         } catch (err) { alert(err.message); } 
         finally { setLoading(false); }
     };
 
+    const loadOlderAnnouncements = async () => {
+        try {
+            const page = await courseService.getAnnouncements(courseId, announcementCursor);
+            setOlderAnnouncements(prev => [...prev, ...page.items]);
+            setAnnouncementCursor(page.next_cursor);
+        } catch (err) { alert(err.message); }
+    };
+
     const isOwner = user && course && (user.role === 'admin' || user.id === course.instructor_id);
 
     const handleAddAnnouncement = async (e) => {
@@ -119,12 +132,15 @@ export const CourseDetailPage = ({ user, courseId, onBack }) => {
                             )}
                             <div className="space-y-4">
                                 {(!course.announcements || course.announcements.length === 0) && <p className="text-gray-500 text-center">Chưa có thông báo nào.</p>}
-                                {course.announcements?.slice().reverse().map((msg, idx) => (
+                                {[...(course.announcements || []).slice().reverse(), ...olderAnnouncements].map((msg, idx) => (
                                     <div key={idx} className="bg-white p-5 rounded-xl shadow-sm border border-l-4 border-l-blue-500">
                                         <div className="flex justify-between items-center mb-2"><span className="font-bold text-blue-900 flex items-center gap-2"><Bell size={16}/> {msg.sender || "Giáo viên"}</span><span className="text-xs text-gray-400">{new Date(msg.date).toLocaleString()}</span></div>
                                         <p className="text-gray-700">{msg.content}</p>
                                     </div>
                                 ))}
+                                {announcementCursor && (
+                                    <div className="text-center"><button onClick={loadOlderAnnouncements} className="text-blue-600 font-bold hover:underline">Xem thông báo cũ hơn</button></div>
+                                )}
                             </div>
                         </div>
                     )
@@ -1,5 +1,5 @@
 // --- FILE: frontend/src/pages/ExamsPage.jsx ---
-import React, { useState, useEffect } from "react";
+import React, { useState, useEffect, useRef } from "react";
 import { Clock, CheckCircle, FileText, Lock, List, Grid } from "lucide-react";
 import { examService } from "../services/api";
 
@@ -14,6 +14,11 @@ export const ExamsPage = ({ user }) => {
     const [currentPage, setCurrentPage] = useState(0);
     const [timeRemaining, setTimeRemaining] = useState(0);
     const [resultData, setResultData] = useState(null);
+    const [leaderboard, setLeaderboard] = useState(null);
+    // Các câu đã chọn nhưng chưa autosave (gửi gộp sau AUTOSAVE_DELAY ms không thao tác)
+    const unsavedRef = useRef({});
+    const saveTimerRef = useRef(null);
+    const AUTOSAVE_DELAY = 1500;
 
     // [RESTORED] Config phân trang
     const questionsPerPage = 1; // Đổi thành 1 câu/trang để tập trung hơn (hoặc giữ 2 tùy bạn)
@@ -45,8 +50,10 @@ export const ExamsPage = ({ user }) => {
         try {
             const detail = await examService.startExam(exam._id, password);
             setCurrentExam(detail);
-            setTimeRemaining(detail.duration * 60);
-            setAnswers({});
+            // Server giữ giờ làm bài và đáp án đã lưu: tải lại trang vẫn làm tiếp được
+            setTimeRemaining(detail.attempt ? detail.attempt.remaining_seconds : detail.duration * 60);
+            setAnswers(detail.attempt?.answers || {});
+            unsavedRef.current = {};
             setCurrentPage(0);
             setView("taking");
         } catch (err) {
@@ -54,13 +61,35 @@ export const ExamsPage = ({ user }) => {
         }
     };
 
+    const saveProgress = async () => {
+        const pending = unsavedRef.current;
+        if (!currentExam || Object.keys(pending).length === 0) return;
+        unsavedRef.current = {};
+        try {
+            const res = await examService.saveProgress(currentExam._id, pending);
+            setTimeRemaining(res.remaining_seconds); // đồng bộ lại đồng hồ theo server
+        } catch (err) {
+            unsavedRef.current = { ...pending, ...unsavedRef.current }; // lần sau gửi lại
+        }
+    };
+
+    const chooseAnswer = (index, optIdx) => {
+        setAnswers({...answers, [index]: optIdx});
+        unsavedRef.current[index] = optIdx;
+        clearTimeout(saveTimerRef.current);
+        saveTimerRef.current = setTimeout(saveProgress, AUTOSAVE_DELAY);
+    };
+
     const finishExam = async () => {
+        clearTimeout(saveTimerRef.current);
+        unsavedRef.current = {}; // bài nộp đã gồm mọi đáp án
         try {
             const durationTaken = (currentExam.duration * 60) - timeRemaining;
             const res = await examService.submit(currentExam._id, answers, durationTaken);
             setResultData(res);
             setView("result");
             fetchExams();
+            examService.getLeaderboard(currentExam._id).then(setLeaderboard).catch(() => setLeaderboard(null));
         } catch (err) { alert(err.message); }
     };
 
@@ -154,7 +183,7 @@ export const ExamsPage = ({ user }) => {
                                         {q.options.map((opt, optIdx) => (
                                             <div 
                                                 key={optIdx} 
-                                                onClick={() => setAnswers({...answers, [realIndex]: optIdx})} 
+                                                onClick={() => chooseAnswer(realIndex, optIdx)} 
                                                 className={`p-4 border rounded-lg cursor-pointer flex items-center gap-3 transition-all ${
                                                     answers[realIndex] === optIdx 
                                                     ? 'bg-indigo-50 border-indigo-500 text-indigo-700 shadow-sm ring-1 ring-indigo-500' 
@@ -270,8 +299,29 @@ export const ExamsPage = ({ user }) => {
                         </div>
                     </div>
 
+                    {leaderboard && leaderboard.top.length > 0 && (
+                        <div className="mb-8 text-left">
+                            <h3 className="font-bold text-lg mb-3">Bảng xếp hạng ({leaderboard.players} người)</h3>
+                            <table className="w-full text-sm">
+                                <tbody>
+                                    {leaderboard.top.map((row) => (
+                                        <tr key={row.user_id} className={`border-b ${leaderboard.me && row.user_id === leaderboard.me.user_id ? 'bg-indigo-50 font-bold' : ''}`}>
+                                            <td className="py-2 w-12">#{row.rank}</td>
+                                            <td className="py-2">{row.username}</td>
+                                            <td className="py-2 text-right">{row.best_score} điểm</td>
+                                            <td className="py-2 text-right text-gray-500">{row.best_duration != null ? formatTime(row.best_duration) : '--'}</td>
+                                        </tr>
+                                    ))}
+                                </tbody>
+                            </table>
+                            {leaderboard.me && !leaderboard.top.some(r => r.user_id === leaderboard.me.user_id) && (
+                                <p className="mt-3 text-indigo-700 font-bold">Hạng của bạn: #{leaderboard.me.rank} ({leaderboard.me.best_score} điểm)</p>
+                            )}
+                        </div>
+                    )}
+
                     <button 
-                        onClick={() => { setView("list"); setResultData(null); }}
+                        onClick={() => { setView("list"); setResultData(null); setLeaderboard(null); }}
                         className="bg-gray-800 text-white px-8 py-3 rounded-full font-bold hover:bg-gray-900 transition"
                     >
                         Quay lại danh sách
@@ -43,8 +43,14 @@ export const authService = {
 export const adminService = {
     getStats: () => request("/admin/stats"),
     getAllUsers: () => request("/admin/users"),
+    // params: { role, q, sort, order, created_from, created_to, limit, cursor } -> { items, next_cursor }
+    getUsers: (params = {}) => request(`/admin/users?${new URLSearchParams({ limit: 50, ...params })}`),
     createUser: (data) => request("/admin/users", "POST", data),
+    bulkCreateUsers: (users) => request("/admin/users/bulk", "POST", { users }),
     deleteUser: (id) => request(`/admin/users/${id}`, "DELETE"),
+    bulkDeleteUsers: (ids) => request("/admin/users/bulk-delete", "POST", { ids }),
+    getCleanupStatus: () => request("/admin/users/cleanup"),
+    updateRole: (id, role) => request(`/admin/users/${id}/role`, "PUT", { role }),
 };
 
 export const courseService = {
@@ -55,14 +61,33 @@ export const courseService = {
     create: (data) => request("/courses", "POST", data),
     delete: (id) => request(`/courses/${id}`, "DELETE"),
     addAnnouncement: (id, content) => request(`/courses/${id}/announcements`, "POST", { content }),
+    getStudents: (id, after, limit = 50) => request(`/courses/${id}/students?limit=${limit}${after ? `&after=${after}` : ""}`),
+    importStudents: (id, formData) => request(`/courses/${id}/students/import`, "POST", formData),
+    removeStudent: (id, userId) => request(`/courses/${id}/students/${userId}`, "DELETE"),
+    getAnnouncements: (id, cursor, limit = 20) => request(`/courses/${id}/announcements?cursor=${cursor}&limit=${limit}`),
     addMaterial: (id, data) => request(`/courses/${id}/materials`, "POST", data),
     getDownloadLink: (fileId) => `${API_BASE_URL}/courses/materials/${fileId}/download?token=${localStorage.getItem("token")}`
 };
 
 export const flashcardService = {
     getAll: () => request("/flashcards"),
+    getCards: (id, after = -1, limit = 100) => request(`/flashcards/${id}/cards?after=${after}&limit=${limit}`),
     create: (data) => request("/flashcards", "POST", data),
     delete: (id) => request(`/flashcards/${id}`, "DELETE"),
+    importDeck: (formData) => request("/flashcards/import", "POST", formData),
+    importCards: (id, formData) => request(`/flashcards/${id}/import`, "POST", formData),
+    // Xuất cần đăng nhập nên tải qua fetch kèm token, trả về Blob để tạo link tải
+    exportDeck: async (id, format = "csv") => {
+        const token = localStorage.getItem("token");
+        const response = await fetch(`${API_BASE_URL}/flashcards/${id}/export?format=${format}`, {
+            headers: token ? { Authorization: `Bearer ${token}` } : {},
+        });
+        if (!response.ok) throw new Error((await response.json()).message || "Lỗi server");
+        return response.blob();
+    },
+    startReview: (id) => request(`/flashcards/${id}/review/start`, "POST"),
+    getDueCards: (limit = 20) => request(`/flashcards/review/due?limit=${limit}`),
+    submitReviews: (grades) => request("/flashcards/review", "POST", { grades }),
 };
 
 export const blogService = {
@@ -73,14 +98,38 @@ export const blogService = {
     delete: (id) => request(`/blogs/${id}`, "DELETE"),
 };
 
+export const searchService = {
+    // type: "course,blog,exam,flashcard" (bỏ trống = tất cả)
+    search: (q, type = "", page = 1) =>
+        request(`/search?q=${encodeURIComponent(q)}&type=${type}&page=${page}`),
+};
+
 export const examService = {
     getAll: () => request("/exams"),
     startExam: (id, password) => request(`/exams/${id}/start`, "POST", { password }),
+    getQuestions: (id, password, offset, limit = 20) => request(`/exams/${id}/questions?offset=${offset}&limit=${limit}`, "POST", { password }),
     create: (data) => request("/exams", "POST", data),
+    update: (id, data) => request(`/exams/${id}`, "PUT", data),
+    getQuestionBank: (after) => request(`/exams/questions${after ? `?after=${after}` : ""}`),
+    updateQuestion: (id, data) => request(`/exams/questions/${id}`, "PUT", data),
     delete: (id) => request(`/exams/${id}`, "DELETE"),
+    // Autosave trong lúc làm bài: chỉ gửi các câu vừa đổi
+    saveProgress: (id, answers) => request(`/exams/${id}/progress`, "PUT", { answers }),
     submit: (id, answers, duration) => request(`/exams/${id}/submit`, "POST", { answers, duration_taken: duration }),
     getHistory: () => request("/exams/history"),
     getTeacherResults: () => request("/exams/teacher-results"),
+    getAnalytics: () => request("/exams/analytics"),
+    getExamAnalytics: (id) => request(`/exams/${id}/analytics`),
+    getLeaderboard: (id, limit = 10) => request(`/exams/${id}/leaderboard?limit=${limit}`),
     // [NEW] API Tạo câu hỏi từ PDF (nhận FormData chứa file)
-    generateQuestionsFromPDF: (formData) => request("/exams/generate-questions", "POST", formData),
+    // Server xử lý nền: nhận job_id rồi hỏi trạng thái tới khi xong
+    generateQuestionsFromPDF: async (formData) => {
+        let job = await request("/exams/generate-questions", "POST", formData);
+        while (job.status !== "done" && job.status !== "failed") {
+            await new Promise((resolve) => setTimeout(resolve, 1500));
+            job = await request(`/exams/generate-questions/${job.job_id}`);
+        }
+        if (job.status === "failed") throw new Error(job.error || "Lỗi xử lý AI");
+        return job;
+    },
 };
\ No newline at end of file